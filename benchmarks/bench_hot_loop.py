@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+取得したメッセージを日ごとのバケットにするまでのループ（iter_day_messages → add_to_bucket）のマイクロベンチマーク。
+Slack API と同じ形のメッセージ（blocks 付き）を数十万件作り、変更前の実装（メッセージを dict で保持し、
+ts ごとに pytz で日付に変換して strptime で評価年度を出す）と現在の実装（SlackMessage と JstDayTable）を比べる。
+API は呼ばない（ユーザー名はダミーの一覧から引く）。
+
+  python benchmarks/bench_hot_loop.py [--messages 100000] [--days 100] [--repeat 3] [--json]
+
+  records: 取り込み・日の範囲での絞り込み・並べ替え
+  dates:   ts → 日付・評価年度（スレッドの返信とエクスポートの取り込みでメッセージごとに行う）
+  loop:    records + dates + 日報の解析とバケットへの追加
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from operator import attrgetter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# sync_daily_reports は読み込み時に設定を確かめるので、ダミーの値を入れておく（通信はしない）
+for _key, _value in {"SLACK_BOT_TOKEN": "xoxb-bench", "SLACK_CHANNEL_ID": "CBENCH", "NOTION_TOKEN": "bench",
+                     "NOTION_DB_ID": "db-bench", "LOG_LEVEL": "info"}.items():
+    os.environ.setdefault(_key, _value)
+os.environ.setdefault("SYNC_CACHE_DIR", tempfile.mkdtemp(prefix="bench_hot_loop_"))
+
+import sync_daily_reports as sync
+from report_parser import message_text
+
+WORDS = ["設計レビュー", "API実装", "テスト追加", "顧客MTG", "資料作成", "バグ修正", "デプロイ", "PR対応", "調査"]
+USERS = [f"U{i:05d}" for i in range(200)]
+HISTORY_PAGE = 200  # conversations.history の1ページの件数
+
+# ====== 変更前の実装 ======
+def legacy_slim_message(msg: dict) -> dict:
+    return {
+        "ts": msg["ts"],
+        "edited_ts": (msg.get("edited") or {}).get("ts", ""),
+        "thread_ts": msg["thread_ts"] if msg.get("thread_ts", msg["ts"]) != msg["ts"]
+                     and msg.get("subtype") != "thread_broadcast" else "",
+        "user": msg.get("user") or msg.get("bot_id") or "unknown",
+        "text": message_text(msg),
+        "reply_count": msg.get("reply_count", 0),
+        "latest_reply": msg.get("latest_reply", ""),
+    }
+
+def legacy_date(ts: str) -> tuple[str, int]:
+    sec = float(ts.split(".")[0])
+    date_str = datetime.fromtimestamp(sec, tz=timezone.utc).astimezone(sync.JST).strftime("%Y-%m-%d")
+    return date_str, sync.get_evaluation_year(datetime.strptime(date_str, "%Y-%m-%d"))
+
+def legacy_add_to_bucket(day_bucket: dict, msg: dict, date_str: str, index: int, channel_id: str) -> bool:
+    text = msg["text"].strip()
+    if not text:
+        return False
+    report = sync.REPORT_PARSER.parse(text)
+    if report.template is None:
+        sync.debug("   ❌ 「やったこと」セクションが見つかりません")
+        return False
+    sync.debug(f"   ✅ 「やったこと」セクションを抽出: {report.template.name} テンプレート")
+    user_id = msg["user"]
+    person = sync.get_user_name(user_id if user_id.startswith("U") else "unknown")
+    sync.debug(f"   ユーザー名: {person}")
+    sync.debug(f"   日付: {date_str}")
+    evaluation_year = sync.get_evaluation_year(datetime.strptime(date_str, "%Y-%m-%d"))
+    sync.debug(f"   評価年度: {evaluation_year}年度 ({evaluation_year}.4.1〜{evaluation_year+1}.3.31)")
+    lines = report.items()
+    sync.debug(f"   箇条書き行数: {len(lines)}")
+    if not lines:
+        return False
+    day_bucket.setdefault((person, evaluation_year), []).append((channel_id, msg["ts"], msg["thread_ts"], lines))
+    sync.debug(f"   ✅ バケットに追加: {person} - {evaluation_year}年度 - {date_str}")
+    return True
+
+def legacy_records(days: list) -> list[tuple[str, list]]:
+    out = []
+    for date_str, start, end, pages in days:
+        day = []
+        for page in pages:
+            for msg in page:
+                ts = float(msg["ts"])
+                if start <= ts < end:
+                    day.append(legacy_slim_message(msg))
+        day.sort(key=lambda m: float(m["ts"]))
+        out.append((date_str, day))
+    return out
+
+def legacy_dates(records: list) -> None:
+    for _, day in records:
+        for msg in day:
+            legacy_date(msg["ts"])
+
+def legacy_loop(days: list) -> None:
+    records = legacy_records(days)
+    legacy_dates(records)
+    count = 0
+    for date_str, day in records:
+        bucket: dict = {}
+        for msg in day:
+            count += 1
+            legacy_add_to_bucket(bucket, msg, date_str, count, "CBENCH")
+
+# ====== 現在の実装 ======
+def current_records(days: list) -> list[tuple[str, list]]:
+    # iter_day_messages の1日分と同じ処理
+    out = []
+    for date_str, start, end, pages in days:
+        day = []
+        for page in pages:
+            for msg in page:
+                record = sync.slim_message(msg)
+                if start <= record.ts_sec < end:
+                    day.append(record)
+        day.sort(key=attrgetter("ts_sec"))
+        out.append((date_str, day))
+    return out
+
+def current_dates(records: list, table: sync.JstDayTable) -> None:
+    for _, day in records:
+        for msg in day:
+            sync.evaluation_year_of(table.date_of(msg.ts_sec))
+
+def current_loop(days: list, table: sync.JstDayTable) -> None:
+    records = current_records(days)
+    current_dates(records, table)
+    count = 0
+    for date_str, day in records:
+        bucket: dict = {}
+        for msg in day:
+            count += 1
+            sync.add_to_bucket(bucket, msg, date_str, count, "CBENCH")
+
+# ====== データと計測 ======
+def make_message(rng: random.Random, ts: float) -> dict:
+    items = [f"{rng.choice(WORDS)} {rng.randint(1, 999)}" for _ in range(rng.randint(1, 6))]
+    text = "やったこと\n" + "\n".join(f"・{item}" for item in items) + "\n次にやること\n・PR対応"
+    msg = {
+        "type": "message", "user": rng.choice(USERS), "ts": f"{ts:.6f}", "team": "TBENCH", "text": text,
+        "blocks": [{"type": "rich_text", "block_id": f"b{rng.randint(0, 1 << 30)}", "elements": [
+            {"type": "rich_text_section", "elements": [{"type": "text", "text": line}]} for line in text.split("\n")]}],
+    }
+    if rng.random() < 0.1:
+        msg["edited"] = {"user": msg["user"], "ts": f"{ts + 60:.6f}"}
+    return msg
+
+def make_days(rng: random.Random, messages: int, days: int, latest: float) -> tuple[list, float]:
+    """[(日付, 開始, 終了, 新しい順のページ)] を作る（Slack の conversations.history と同じ並び）"""
+    oldest = latest - days * 86400
+    windows = list(sync.jst_day_windows(oldest, latest))
+    per_day: dict[int, list[dict]] = {i: [] for i in range(len(windows))}
+    for _ in range(messages):
+        i = rng.randrange(len(windows))
+        _, start, end = windows[i]
+        per_day[i].append(make_message(rng, rng.uniform(start, end - 1)))
+    out = []
+    for i, (date_str, start, end) in enumerate(windows):
+        msgs = sorted(per_day[i], key=lambda m: -float(m["ts"]))
+        out.append((date_str, start, end, [msgs[j:j + HISTORY_PAGE] for j in range(0, len(msgs), HISTORY_PAGE)]))
+    return out, oldest
+
+def measure(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def retained_mb(fn) -> float:
+    """fn() の戻り値を保持したまま増えたメモリ（MB）"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = fn()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return size / 1e6
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--messages", type=int, default=100_000, help="メッセージ数")
+    ap.add_argument("--days", type=int, default=100, help="メッセージを散らす日数")
+    ap.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数（最速値を採用）")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    latest = sync.jst_day_start("2025-07-01")
+    days, oldest = make_days(rng, args.messages, args.days, latest)
+    sync.user_directory.seed([{"id": u, "name": u.lower(), "real_name": f"メンバー{u[1:]}"} for u in USERS])
+    table = sync.JstDayTable(oldest, latest)
+    legacy_recs, current_recs = legacy_records(days), current_records(days)
+
+    cases = [
+        ("records", lambda: legacy_records(days), lambda: current_records(days)),
+        ("dates", lambda: legacy_dates(legacy_recs), lambda: current_dates(current_recs, table)),
+        ("loop", lambda: legacy_loop(days), lambda: current_loop(days, table)),
+    ]
+    results = []
+    for name, legacy_fn, current_fn in cases:
+        legacy_sec, current_sec = measure(legacy_fn, args.repeat), measure(current_fn, args.repeat)
+        results.append({
+            "case": name,
+            "messages": args.messages,
+            "legacy_sec": round(legacy_sec, 4),
+            "current_sec": round(current_sec, 4),
+            "legacy_msgs_per_sec": round(args.messages / legacy_sec),
+            "current_msgs_per_sec": round(args.messages / current_sec),
+            "speedup": round(legacy_sec / current_sec, 2),
+        })
+    memory = {"legacy_records_mb": round(retained_mb(lambda: legacy_records(days)), 1),
+              "current_records_mb": round(retained_mb(lambda: current_records(days)), 1)}
+
+    if args.json:
+        print(json.dumps({"results": results, "memory": memory}, ensure_ascii=False, indent=2))
+        return
+    print(f"{'case':<8} {'messages':>9} {'legacy msg/s':>13} {'current msg/s':>14} {'speedup':>8}")
+    for r in results:
+        print(f"{r['case']:<8} {r['messages']:>9} {r['legacy_msgs_per_sec']:>13,} "
+              f"{r['current_msgs_per_sec']:>14,} {r['speedup']:>7}x")
+    print(f"保持するメッセージのメモリ: dict {memory['legacy_records_mb']} MB → "
+          f"SlackMessage {memory['current_records_mb']} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+日報パーサーのマイクロベンチマーク。
+テンプレートごとに合成した日報（text 版と rich_text blocks 版）を数千件作り、
+従来の正規表現実装と report_parser.ReportParser のスループットを比べる。
+
+  python benchmarks/bench_report_parser.py [--reports 5000] [--repeat 5] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_parser import DEFAULT_TEMPLATES, ReportParser, ReportTemplate, message_text
+
+BENCH_TEMPLATES = DEFAULT_TEMPLATES + [
+    ReportTemplate(
+        name="business",
+        sections={"done": ("本日の業務", "業務内容"), "next": ("明日の予定",), "comment": ("所感",)},
+    ),
+    ReportTemplate(
+        name="english",
+        sections={"done": ("Done", "What I did"), "next": ("Next",), "comment": ("Notes",)},
+    ),
+]
+
+WORDS = ["設計レビュー", "API実装", "テスト追加", "顧客MTG", "資料作成", "バグ修正", "デプロイ",
+         "refactor", "PR対応", "見積もり", "採用面接", "1on1", "調査", "ドキュメント整備"]
+DECORATIONS = ["{}", "*{}*", "【{}】", "■ {}", "{}：", "{}:"]
+
+def legacy_items(text: str) -> list[str]:
+    """変更前の実装（呼び出しごとに正規表現をコンパイルし、行は別の正規表現で分割）"""
+    pat = re.compile(
+        r"やったこと[\t 　]*\n([\s\S]*?)(?:\n(?:次にやること|ひとこと)\b|$)",
+        re.IGNORECASE
+    )
+    m = pat.search(text)
+    if not m:
+        return []
+    done = re.sub(r"\n{3,}", "\n\n", m.group(1).strip())
+    return [s.strip(" ・-　") for s in re.split(r"\n+", done) if s.strip()]
+
+def make_report(rng: random.Random, template: ReportTemplate) -> tuple[str, list[dict]]:
+    """(text, blocks) を1件作る"""
+    sections = []
+    elements = []
+    for key, aliases in template.sections.items():
+        header = rng.choice(DECORATIONS).format(rng.choice(aliases)) if template.name != "daily" else aliases[0]
+        items = [f"{rng.choice(WORDS)} {rng.randint(1, 999)}" for _ in range(rng.randint(1, 12))]
+        sections.append(header + "\n" + "\n".join(f"・{item}" for item in items))
+        elements.append({"type": "rich_text_section", "elements": [{"type": "text", "text": header + "\n"}]})
+        elements.append({
+            "type": "rich_text_list", "style": "bullet",
+            "elements": [{"type": "rich_text_section", "elements": [{"type": "text", "text": item}]}
+                         for item in items],
+        })
+    return "\n\n".join(sections), [{"type": "rich_text", "elements": elements}]
+
+def measure(fn, corpus, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for doc in corpus:
+            fn(doc)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--reports", type=int, default=5000, help="テンプレートごとの日報数")
+    ap.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数（最速値を採用）")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    parser = ReportParser(BENCH_TEMPLATES)
+    results = []
+    for template in BENCH_TEMPLATES:
+        corpus = [make_report(rng, template) for _ in range(args.reports)]
+        texts = [text for text, _ in corpus]
+        messages = [{"text": text, "blocks": blocks} for text, blocks in corpus]
+        size_mb = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+        cases = [("parser/text", lambda t: parser.parse(t).items(), texts),
+                 ("parser/blocks", lambda m: parser.parse(message_text(m)).items(), messages)]
+        if template.name == "daily":
+            cases.insert(0, ("legacy/text", legacy_items, texts))
+        for name, fn, docs in cases:
+            sec = measure(fn, docs, args.repeat)
+            results.append({
+                "template": template.name,
+                "case": name,
+                "reports": len(docs),
+                "seconds": round(sec, 4),
+                "reports_per_sec": round(len(docs) / sec),
+                "mb_per_sec": round(size_mb / sec, 2),
+            })
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    print(f"{'template':<10} {'case':<14} {'reports':>8} {'reports/s':>11} {'MB/s':>7}")
+    for r in results:
+        print(f"{r['template']:<10} {r['case']:<14} {r['reports']:>8} {r['reports_per_sec']:>11,} {r['mb_per_sec']:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+sync_daily_reports.py のオフライン E2E ベンチマーク。
+ローカルの Slack / Notion スタンドイン（fake_servers.py）に向けて同期を丸ごと実行し、
+規模ごとに API 呼び出し回数（エンドポイント別）、実行時間、ピークRSSを出す。
+
+  python benchmarks/bench_sync.py                          # 10/100/1000 人 × 初回・2回目
+  python benchmarks/bench_sync.py --scales 100 --latency-ms 50 --rate-limit-prob 0.05
+  python benchmarks/bench_sync.py --runs cold,warm,append          # append: 既存ページへの追記
+  python benchmarks/bench_sync.py --save-baseline benchmarks/baseline.json
+  python benchmarks/bench_sync.py --check benchmarks/baseline.json   # 呼び出し回数が増えたら exit 1
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_servers import FakeServers, FaultConfig, seed_workspace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子プロセスのピークRSSを自分で書き出してから終了させるラッパー。
+# wait4 の ru_maxrss は exec 前（fork 直後の親のコピー）の値も含んでしまうので使わない
+_RSS_WRAPPER = """
+import atexit, os, runpy, sys
+rss_path = sys.argv[1]
+def _dump_hwm():
+    with open("/proc/self/status") as f:
+        hwm = next(line.split()[1] for line in f if line.startswith("VmHWM:"))
+    with open(rss_path, "w") as f:
+        f.write(hwm)
+atexit.register(_dump_hwm)
+sys.argv = sys.argv[2:]
+sys.path.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])))
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+def run_sync(servers: FakeServers, cache_dir: str, args, extra_args: list[str]) -> dict:
+    """同期を子プロセスで1回実行し、呼び出し回数・時間・ピークRSSを返す"""
+    servers.slack_stats.reset()
+    servers.notion_stats.reset()
+    env = dict(
+        os.environ,
+        SLACK_BOT_TOKEN="xoxb-bench",
+        SLACK_CHANNEL_ID="CBENCH",
+        NOTION_TOKEN="secret-bench",
+        NOTION_DB_ID="db-bench",
+        SLACK_API_URL=servers.slack_url,
+        NOTION_API_URL=servers.notion_url,
+        SYNC_CACHE_DIR=cache_dir,
+        LOOKBACK_DAYS=str(args.days + 1),
+        NOTION_RATE_PER_SEC=str(args.notion_rate),
+        NOTION_WORKERS=str(args.workers),
+    )
+    log_path = os.path.join(cache_dir, "sync.log")
+    rss_path = os.path.join(cache_dir, "peak_rss_kb")
+    script = os.path.join(REPO_ROOT, "sync_daily_reports.py")
+    start = time.perf_counter()
+    with open(log_path, "ab") as log:
+        proc = subprocess.run([sys.executable, "-c", _RSS_WRAPPER, rss_path, script, *extra_args],
+                              env=env, stdout=log, stderr=subprocess.STDOUT, cwd=cache_dir)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        with open(log_path, encoding="utf-8", errors="replace") as f:
+            tail = "".join(f.readlines()[-20:])
+        raise RuntimeError(f"同期が失敗しました（ログ: {log_path}）\n{tail}")
+    with open(rss_path, encoding="utf-8") as f:
+        peak_rss_kb = int(f.read())
+    slack, notion = servers.slack_stats.snapshot(), servers.notion_stats.snapshot()
+    return {
+        "wall_sec": round(wall, 3),
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+        "slack_calls": sum(slack["calls"].values()),
+        "notion_calls": sum(notion["calls"].values()),
+        "rate_limited": sum(slack["rate_limited"].values()) + sum(notion["rate_limited"].values()),
+        "errors": sum(slack["errors"].values()) + sum(notion["errors"].values()),
+        "counters": _run_counters(cache_dir),
+        "slack": slack["calls"],
+        "notion": notion["calls"],
+    }
+
+def _run_counters(cache_dir: str) -> dict:
+    """同期側の実行レポートのカウンター（写しの差分問い合わせ・一覧の取り直しなど）"""
+    try:
+        with open(os.path.join(cache_dir, "run_report.json"), encoding="utf-8") as f:
+            return json.load(f)["counters"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def bench_scale(users: int, args) -> list[dict]:
+    slack_ws, notion_ws = seed_workspace(users, args.days, seed=args.seed)
+    faults = FaultConfig(latency_ms=args.latency_ms, rate_limit_prob=args.rate_limit_prob,
+                         error_prob=args.error_prob, retry_after_sec=args.retry_after)
+    servers = FakeServers(slack_ws, notion_ws, faults, faults).start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for run_name in args.runs:
+                if run_name == "append":
+                    # 全員が既存の日に1件ずつ追記した状態（既存ページ・既存トグルへの追記）
+                    now = time.time()
+                    for i in range(users):
+                        slack_ws.post("CBENCH", f"U{i:05d}", f"やったこと\n・追記 {i}", now - 60 + i * 1e-4)
+                extra = ["--full"] if run_name == "full" else []
+                r = run_sync(servers, cache_dir, args, extra)
+                results.append({"users": users, "run": run_name, **r})
+    finally:
+        servers.stop()
+    return results
+
+def check_regressions(results: list[dict], baseline_path: str, tolerance: float) -> list[str]:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["users"], r["run"]): r for r in json.load(f)}
+    problems = []
+    for r in results:
+        base = baseline.get((r["users"], r["run"]))
+        if base is None:
+            continue
+        for key in ("slack_calls", "notion_calls"):
+            if r[key] > base[key] * (1 + tolerance):
+                problems.append(f"{r['users']}人/{r['run']}: {key} {base[key]} → {r[key]}")
+    return problems
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", default="10,100,1000", help="ユーザー数（カンマ区切り）")
+    ap.add_argument("--days", type=int, default=15, help="シードする日数")
+    ap.add_argument("--runs", default="cold,warm",
+                    help="各規模で続けて実行する回: cold=初回, warm=2回目（差分）, full=--full, "
+                         "append=全員が1件ずつ追記してから差分")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="全リクエストに足す遅延")
+    ap.add_argument("--rate-limit-prob", type=float, default=0.0, help="Slack / Notion が 429 を返す確率")
+    ap.add_argument("--error-prob", type=float, default=0.0, help="Slack / Notion が 503 を返す確率")
+    ap.add_argument("--retry-after", type=int, default=1, help="429 の Retry-After（秒）")
+    ap.add_argument("--notion-rate", type=float, default=1000.0, help="同期側の NOTION_RATE_PER_SEC")
+    ap.add_argument("--workers", type=int, default=4, help="同期側の NOTION_WORKERS")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    ap.add_argument("--save-baseline", help="結果を基準値として保存するパス")
+    ap.add_argument("--check", help="基準値と比べて呼び出し回数が増えていたら exit 1")
+    ap.add_argument("--tolerance", type=float, default=0.05, help="--check の許容増加率")
+    args = ap.parse_args()
+    args.runs = [r.strip() for r in args.runs.split(",") if r.strip()]
+
+    results = []
+    for users in (int(s) for s in args.scales.split(",")):
+        results.extend(bench_scale(users, args))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'users':>6} {'run':<6} {'slack':>7} {'notion':>7} {'listed':>7} {'429':>5} {'5xx':>5} "
+              f"{'wall(s)':>8} {'rss(MB)':>8}")
+        for r in results:
+            print(f"{r['users']:>6} {r['run']:<6} {r['slack_calls']:>7} {r['notion_calls']:>7} "
+                  f"{r['counters'].get('pages_listed', 0):>7} {r['rate_limited']:>5} {r['errors']:>5} "
+                  f"{r['wall_sec']:>8} {r['peak_rss_mb']:>8}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.check:
+        problems = check_regressions(results, args.check, args.tolerance)
+        for p in problems:
+            print(f"❌ 呼び出し回数の増加: {p}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
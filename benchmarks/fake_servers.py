@@ -0,0 +1,525 @@
+"""
+ベンチマーク用のローカル Slack Web API / Notion API スタンドイン。
+シードしたチャンネル履歴とDB・ブロックツリーを返し、遅延と 429 / 503 を注入でき、
+エンドポイントごとの呼び出し回数を数える。
+
+  python benchmarks/fake_servers.py --users 100 --days 15   # 単体で起動して手で叩く用
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+WORDS = ["設計レビュー", "API実装", "テスト追加", "顧客MTG", "資料作成", "バグ修正", "デプロイ",
+         "PR対応", "見積もり", "1on1", "調査", "ドキュメント整備"]
+
+def _now_iso() -> str:
+    # Notion の last_edited_time / created_time は分単位に丸められる
+    return datetime.now(timezone.utc).replace(second=0, microsecond=0).isoformat().replace("+00:00", ".000Z")
+
+@dataclass
+class FaultConfig:
+    latency_ms: float = 0.0          # 全リクエストに足す遅延
+    rate_limit_prob: float = 0.0     # 429 を返す確率
+    error_prob: float = 0.0          # 503 を返す確率
+    lost_response_prob: float = 0.0  # 書き込みを反映したうえで 502 を返す確率（Notion のみ。応答が失われた場合の再現）
+    retry_after_sec: int = 1
+
+@dataclass
+class CallStats:
+    counts: Counter = field(default_factory=Counter)
+    rate_limited: Counter = field(default_factory=Counter)
+    errors: Counter = field(default_factory=Counter)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def hit(self, endpoint: str, limited: bool = False, errored: bool = False):
+        with self.lock:
+            self.counts[endpoint] += 1
+            if limited:
+                self.rate_limited[endpoint] += 1
+            if errored:
+                self.errors[endpoint] += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"calls": dict(self.counts), "rate_limited": dict(self.rate_limited), "errors": dict(self.errors)}
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+            self.rate_limited.clear()
+            self.errors.clear()
+
+# ====== Slack ======
+class SlackWorkspace:
+    def __init__(self):
+        self.users: dict[str, dict] = {}
+        self.channels: dict[str, list[dict]] = {}   # channel_id → メッセージ（ts 昇順）
+        self.replies: dict[tuple[str, str], list[dict]] = {}  # (channel_id, thread_ts) → 返信
+        self.lock = threading.Lock()
+
+    def add_user(self, user_id: str, name: str):
+        self.users[user_id] = {"id": user_id, "name": name, "real_name": name,
+                               "profile": {"display_name_normalized": name}}
+
+    def post(self, channel_id: str, user_id: str, text: str, ts: float, thread_ts: str | None = None) -> dict:
+        msg = {"type": "message", "user": user_id, "text": text, "ts": f"{ts:.6f}"}
+        with self.lock:
+            if thread_ts:
+                msg["thread_ts"] = thread_ts
+                self.replies.setdefault((channel_id, thread_ts), []).append(msg)
+                parent = next(m for m in self.channels[channel_id] if m["ts"] == thread_ts)
+                parent["thread_ts"] = thread_ts
+                parent["reply_count"] = parent.get("reply_count", 0) + 1
+                parent["latest_reply"] = msg["ts"]
+            else:
+                self.channels.setdefault(channel_id, []).append(msg)
+                self.channels[channel_id].sort(key=lambda m: float(m["ts"]))
+        return msg
+
+def _in_range(ts: float, oldest, latest, inclusive: bool) -> bool:
+    if oldest is not None and (ts < oldest or (ts == oldest and not inclusive)):
+        return False
+    if latest is not None and (ts > latest or (ts == latest and not inclusive)):
+        return False
+    return True
+
+def _page(items: list, cursor: str | None, limit: int) -> tuple[list, str]:
+    start = int(cursor or 0)
+    end = start + limit
+    return items[start:end], (str(end) if end < len(items) else "")
+
+def _slack_handler(ws: SlackWorkspace, stats: CallStats, faults: FaultConfig):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _params(self) -> dict:
+            parsed = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                body = self.rfile.read(length).decode("utf-8")
+                if "json" in (self.headers.get("Content-Type") or ""):
+                    params.update(json.loads(body))
+                else:
+                    params.update({k: v[0] for k, v in parse_qs(body).items()})
+            return params
+
+        def _send(self, status: int, body: dict, headers: dict | None = None):
+            raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            self._handle()
+
+        def do_POST(self):
+            self._handle()
+
+        def _handle(self):
+            method = urlparse(self.path).path.rsplit("/", 1)[-1]
+            params = self._params()
+            if faults.latency_ms:
+                time.sleep(faults.latency_ms / 1000)
+            if faults.rate_limit_prob and random.random() < faults.rate_limit_prob:
+                stats.hit(method, limited=True)
+                return self._send(429, {"ok": False, "error": "ratelimited"},
+                                  {"Retry-After": str(faults.retry_after_sec)})
+            if faults.error_prob and random.random() < faults.error_prob:
+                stats.hit(method, errored=True)
+                return self._send(503, {"ok": False, "error": "service_unavailable"})
+            stats.hit(method)
+            fn = getattr(self, "api_" + method.replace(".", "_"), None)
+            if fn is None:
+                return self._send(200, {"ok": False, "error": "unknown_method"})
+            self._send(200, fn(params))
+
+        def api_auth_test(self, p):
+            return {"ok": True, "user": "bench-bot", "user_id": "UBOT", "team": "bench", "team_id": "T1"}
+
+        def api_users_list(self, p):
+            members, nxt = _page(sorted(ws.users.values(), key=lambda u: u["id"]), p.get("cursor"),
+                                 int(p.get("limit", 200)))
+            return {"ok": True, "members": members, "response_metadata": {"next_cursor": nxt}}
+
+        def api_users_info(self, p):
+            u = ws.users.get(p.get("user"))
+            return {"ok": True, "user": u} if u else {"ok": False, "error": "user_not_found"}
+
+        def api_conversations_info(self, p):
+            if p.get("channel") not in ws.channels:
+                return {"ok": False, "error": "channel_not_found"}
+            return {"ok": True, "channel": {"id": p["channel"], "name": "daily-report", "is_member": True,
+                                            "num_members": len(ws.users)}}
+
+        def api_conversations_members(self, p):
+            return {"ok": True, "members": ["UBOT", *ws.users], "response_metadata": {"next_cursor": ""}}
+
+        def api_conversations_history(self, p):
+            if p.get("channel") not in ws.channels:
+                return {"ok": False, "error": "channel_not_found"}
+            oldest = float(p["oldest"]) if p.get("oldest") else None
+            latest = float(p["latest"]) if p.get("latest") else None
+            inclusive = str(p.get("inclusive", "")).lower() in ("1", "true")
+            with ws.lock:
+                msgs = [m for m in reversed(ws.channels[p["channel"]])
+                        if _in_range(float(m["ts"]), oldest, latest, inclusive)]
+            page, nxt = _page(msgs, p.get("cursor"), min(int(p.get("limit", 100)), 999))
+            return {"ok": True, "messages": page, "has_more": bool(nxt),
+                    "response_metadata": {"next_cursor": nxt}}
+
+        def api_conversations_replies(self, p):
+            key = (p.get("channel"), p.get("ts"))
+            with ws.lock:
+                parent = next((m for m in ws.channels.get(key[0], []) if m["ts"] == key[1]), None)
+                if parent is None:
+                    return {"ok": False, "error": "thread_not_found"}
+                oldest = float(p["oldest"]) if p.get("oldest") else None
+                inclusive = str(p.get("inclusive", "")).lower() in ("1", "true")
+                msgs = [parent] + [m for m in ws.replies.get(key, [])
+                                   if _in_range(float(m["ts"]), oldest, None, inclusive)]
+            page, nxt = _page(msgs, p.get("cursor"), min(int(p.get("limit", 100)), 999))
+            return {"ok": True, "messages": page, "has_more": bool(nxt),
+                    "response_metadata": {"next_cursor": nxt}}
+
+    return Handler
+
+# ====== Notion ======
+class NotionWorkspace:
+    def __init__(self):
+        self.databases: dict[str, dict] = {}
+        self.pages: dict[str, dict] = {}
+        self.blocks: dict[str, dict] = {}
+        self.children: dict[str, list[str]] = {}
+        self.lock = threading.Lock()
+
+    def add_database(self, db_id: str):
+        self.databases[db_id] = {
+            "object": "database", "id": db_id,
+            "title": [{"type": "text", "plain_text": "日報", "text": {"content": "日報"}}],
+            "properties": {
+                "メンバー名": {"id": "title", "name": "メンバー名", "type": "title", "title": {}},
+                "評価年度": {"id": "year", "name": "評価年度", "type": "select", "select": {"options": []}},
+            },
+        }
+
+    @staticmethod
+    def _rich(items: list[dict]) -> list[dict]:
+        out = []
+        for rt in items or []:
+            content = rt.get("text", {}).get("content", "")
+            if len(content) > 2000:
+                raise ValueError("body.children[].rich_text[].text.content.length should be ≤ `2000`")
+            out.append({"type": "text", "text": {"content": content, "link": None},
+                        "plain_text": content, "annotations": {}, "href": None})
+        if len(out) > 100:
+            raise ValueError("rich_text.length should be ≤ `100`")
+        return out
+
+    def _touch(self, obj_id: str):
+        now = _now_iso()
+        target = self.pages.get(obj_id) or self.blocks.get(obj_id)
+        while target is not None:
+            target["last_edited_time"] = now
+            parent = target.get("parent", {})
+            parent_id = parent.get("page_id") or parent.get("block_id")
+            target = self.pages.get(parent_id) or self.blocks.get(parent_id) if parent_id else None
+
+    def create_page(self, body: dict) -> dict:
+        page_id = str(uuid.uuid4())
+        props = {}
+        for name, value in body.get("properties", {}).items():
+            if "title" in value:
+                props[name] = {"id": "title", "type": "title", "title": self._rich(value["title"])}
+            elif "select" in value:
+                props[name] = {"id": "year", "type": "select", "select": {"name": value["select"]["name"]}}
+        now = _now_iso()
+        page = {"object": "page", "id": page_id, "created_time": now, "last_edited_time": now,
+                "archived": False, "parent": body.get("parent", {}), "properties": props}
+        self.pages[page_id] = page
+        self.children[page_id] = []
+        for child in body.get("children", []):
+            self._create_block(page_id, child, depth=1)
+        return page
+
+    def _create_block(self, parent_id: str, spec: dict, depth: int) -> dict:
+        if depth > 3:
+            raise ValueError("children nesting exceeds 2 levels")
+        kind = spec["type"]
+        content = spec.get(kind, {})
+        now = _now_iso()
+        block_id = str(uuid.uuid4())
+        parent = {"type": "page_id", "page_id": parent_id} if parent_id in self.pages \
+            else {"type": "block_id", "block_id": parent_id}
+        block = {"object": "block", "id": block_id, "type": kind, "created_time": now, "last_edited_time": now,
+                 "archived": False, "has_children": False, "parent": parent,
+                 kind: {"rich_text": self._rich(content.get("rich_text", []))}}
+        self.blocks[block_id] = block
+        self.children[block_id] = []
+        self.children[parent_id].append(block_id)
+        kids = content.get("children") or []
+        if len(kids) > 100:
+            raise ValueError("body.children.length should be ≤ `100`")
+        for kid in kids:
+            self._create_block(block_id, kid, depth + 1)
+        block["has_children"] = bool(kids)
+        return block
+
+    def append(self, parent_id: str, body: dict) -> list[dict]:
+        if parent_id not in self.children:
+            raise KeyError(parent_id)
+        kids = body.get("children", [])
+        if len(kids) > 100:
+            raise ValueError("body.children.length should be ≤ `100`")
+        created = [self._create_block(parent_id, kid, depth=1) for kid in kids]
+        if body.get("after"):
+            # 作成したブロックを after の直後へ移す
+            order = self.children[parent_id]
+            new_ids = [b["id"] for b in created]
+            rest = [i for i in order if i not in new_ids]
+            pos = rest.index(body["after"]) + 1
+            self.children[parent_id] = rest[:pos] + new_ids + rest[pos:]
+        if parent_id in self.blocks:
+            self.blocks[parent_id]["has_children"] = True
+        self._touch(parent_id)
+        return created
+
+    def list_children(self, parent_id: str) -> list[dict]:
+        return [self.blocks[i] for i in self.children.get(parent_id, []) if not self.blocks[i]["archived"]]
+
+def _match_filter(page: dict, flt: dict | None) -> bool:
+    if not flt:
+        return True
+    if "and" in flt:
+        return all(_match_filter(page, f) for f in flt["and"])
+    if "or" in flt:
+        return any(_match_filter(page, f) for f in flt["or"])
+    if flt.get("timestamp") == "last_edited_time":
+        cond = flt["last_edited_time"]
+        if "on_or_after" in cond:
+            return page["last_edited_time"] >= cond["on_or_after"]
+        if "after" in cond:
+            return page["last_edited_time"] > cond["after"]
+        return True
+    prop = page["properties"].get(flt.get("property"), {})
+    if "title" in flt:
+        text = "".join(t["plain_text"] for t in prop.get("title", []))
+        return text == flt["title"].get("equals")
+    if "select" in flt:
+        return (prop.get("select") or {}).get("name") == flt["select"].get("equals")
+    return True
+
+def _notion_handler(ws: NotionWorkspace, stats: CallStats, faults: FaultConfig):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: dict, headers: dict | None = None):
+            raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def _error(self, status: int, code: str, message: str):
+            self._send(status, {"object": "error", "status": status, "code": code, "message": message})
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def do_PATCH(self):
+            self._handle("PATCH")
+
+        def do_DELETE(self):
+            self._handle("DELETE")
+
+        def _handle(self, method: str):
+            parsed = urlparse(self.path)
+            parts = parsed.path.strip("/").split("/")[1:]   # "v1" を除く
+            query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+            # 呼び出し回数はIDを伏せたエンドポイント名で数える（例: PATCH blocks/{id}/children）
+            endpoint = method + " " + "/".join("{id}" if i % 2 else p for i, p in enumerate(parts))
+            if faults.latency_ms:
+                time.sleep(faults.latency_ms / 1000)
+            if faults.rate_limit_prob and random.random() < faults.rate_limit_prob:
+                stats.hit(endpoint, limited=True)
+                return self._send(429, {"object": "error", "status": 429, "code": "rate_limited",
+                                        "message": "You have been rate limited."},
+                                  {"Retry-After": str(faults.retry_after_sec)})
+            if faults.error_prob and random.random() < faults.error_prob:
+                stats.hit(endpoint, errored=True)
+                return self._send(503, {"object": "error", "status": 503, "code": "service_unavailable",
+                                        "message": "Notion is unavailable, please try again later."})
+            stats.hit(endpoint)
+            if length > 500_000:
+                return self._error(413, "payload_too_large", "Request body too large")
+            try:
+                with ws.lock:
+                    result = self._route(method, parts, query, body)
+            except KeyError:
+                return self._error(404, "object_not_found", "Could not find object")
+            except ValueError as e:
+                return self._error(400, "validation_error", str(e))
+            if result is None:
+                return self._error(400, "invalid_request_url", "Invalid request URL.")
+            if method != "GET" and faults.lost_response_prob and random.random() < faults.lost_response_prob:
+                return self._error(502, "bad_gateway", "Bad gateway.")
+            self._send(200, result)
+
+        def _route(self, method, parts, query, body):
+            if parts[0] == "databases" and len(parts) == 2 and method == "GET":
+                return ws.databases[parts[1]]
+            if parts[0] == "databases" and len(parts) == 3 and parts[2] == "query":
+                db_id = parts[1]
+                if db_id not in ws.databases:
+                    raise KeyError(db_id)
+                pages = [p for p in ws.pages.values()
+                         if p["parent"].get("database_id") == db_id and not p["archived"]
+                         and _match_filter(p, body.get("filter"))]
+                for s in body.get("sorts", []):
+                    if s.get("timestamp"):
+                        pages.sort(key=lambda p: p[s["timestamp"]], reverse=s.get("direction") == "descending")
+                results, nxt = _page(pages, body.get("start_cursor"), min(int(body.get("page_size", 100)), 100))
+                return {"object": "list", "results": results, "has_more": bool(nxt), "next_cursor": nxt or None}
+            if parts[0] == "pages" and len(parts) == 1 and method == "POST":
+                return ws.create_page(body)
+            if parts[0] == "pages" and len(parts) == 2:
+                page = ws.pages[parts[1]]
+                if method == "PATCH":
+                    if "archived" in body:
+                        page["archived"] = body["archived"]
+                    ws._touch(page["id"])
+                return page
+            if parts[0] == "blocks" and len(parts) == 3 and parts[2] == "children":
+                if method == "GET":
+                    results, nxt = _page(ws.list_children(parts[1]), query.get("start_cursor"),
+                                         min(int(query.get("page_size", 100)), 100))
+                    return {"object": "list", "results": results, "has_more": bool(nxt), "next_cursor": nxt or None}
+                if method == "PATCH":
+                    return {"object": "list", "results": ws.append(parts[1], body)}
+            if parts[0] == "blocks" and len(parts) == 2:
+                block = ws.blocks[parts[1]]
+                if method == "DELETE":
+                    block["archived"] = True
+                    ws._touch(block["id"])
+                elif method == "PATCH":
+                    if "archived" in body:
+                        block["archived"] = body["archived"]
+                    kind = block["type"]
+                    if kind in body:
+                        block[kind]["rich_text"] = ws._rich(body[kind].get("rich_text", []))
+                    ws._touch(block["id"])
+                return block
+            return None
+
+    return Handler
+
+# ====== 起動 ======
+class FakeServers:
+    """Slack / Notion のスタンドインをバックグラウンドスレッドで起動する"""
+
+    def __init__(self, slack_ws: SlackWorkspace, notion_ws: NotionWorkspace,
+                 slack_faults: FaultConfig | None = None, notion_faults: FaultConfig | None = None):
+        self.slack_ws, self.notion_ws = slack_ws, notion_ws
+        self.slack_stats, self.notion_stats = CallStats(), CallStats()
+        self.slack_faults = slack_faults or FaultConfig()
+        self.notion_faults = notion_faults or FaultConfig()
+        self._servers = [
+            ThreadingHTTPServer(("127.0.0.1", 0), _slack_handler(slack_ws, self.slack_stats, self.slack_faults)),
+            ThreadingHTTPServer(("127.0.0.1", 0), _notion_handler(notion_ws, self.notion_stats, self.notion_faults)),
+        ]
+        for srv in self._servers:
+            srv.daemon_threads = True
+
+    @property
+    def slack_url(self) -> str:
+        return f"http://127.0.0.1:{self._servers[0].server_address[1]}/api/"
+
+    @property
+    def notion_url(self) -> str:
+        return f"http://127.0.0.1:{self._servers[1].server_address[1]}"
+
+    def start(self):
+        for srv in self._servers:
+            threading.Thread(target=srv.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        for srv in self._servers:
+            srv.shutdown()
+            srv.server_close()
+
+def make_report(rng: random.Random) -> str:
+    done = "\n".join(f"・{rng.choice(WORDS)} {rng.randint(1, 999)}" for _ in range(rng.randint(1, 6)))
+    nxt = "\n".join(f"・{rng.choice(WORDS)}" for _ in range(rng.randint(1, 3)))
+    return f"やったこと\n{done}\n次にやること\n{nxt}\nひとこと\nおつかれさまでした"
+
+def seed_workspace(users: int, days: int, channel_id: str = "CBENCH", db_id: str = "db-bench",
+                   chatter_ratio: float = 0.3, seed: int = 42, now: float | None = None):
+    """users 人が days 日間、毎日1件ずつ日報を投稿したチャンネルと空のDBを作る"""
+    rng = random.Random(seed)
+    now = now or time.time()
+    slack_ws, notion_ws = SlackWorkspace(), NotionWorkspace()
+    slack_ws.channels[channel_id] = []
+    notion_ws.add_database(db_id)
+    for i in range(users):
+        slack_ws.add_user(f"U{i:05d}", f"メンバー{i:05d}")
+    counter = itertools.count()
+    for day in range(days, 0, -1):
+        for i in range(users):
+            ts = now - day * 86400 + rng.uniform(0, 80000) + next(counter) * 1e-6
+            slack_ws.post(channel_id, f"U{i:05d}", make_report(rng), ts)
+            if rng.random() < chatter_ratio:
+                slack_ws.post(channel_id, f"U{i:05d}", "おはようございます", ts + 1)
+    return slack_ws, notion_ws
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=10)
+    ap.add_argument("--days", type=int, default=15)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--rate-limit-prob", type=float, default=0.0)
+    ap.add_argument("--error-prob", type=float, default=0.0)
+    ap.add_argument("--lost-response-prob", type=float, default=0.0)
+    args = ap.parse_args()
+
+    slack_ws, notion_ws = seed_workspace(args.users, args.days)
+    faults = FaultConfig(latency_ms=args.latency_ms, rate_limit_prob=args.rate_limit_prob, error_prob=args.error_prob,
+                         lost_response_prob=args.lost_response_prob)
+    servers = FakeServers(slack_ws, notion_ws, faults, faults).start()
+    print(f"SLACK_API_URL={servers.slack_url}")
+    print(f"NOTION_API_URL={servers.notion_url}")
+    print("SLACK_CHANNEL_ID=CBENCH NOTION_DB_ID=db-bench  （Ctrl-C で終了）")
+    try:
+        while True:
+            time.sleep(5)
+            print(json.dumps({"slack": servers.slack_stats.snapshot(), "notion": servers.notion_stats.snapshot()},
+                             ensure_ascii=False))
+    except KeyboardInterrupt:
+        servers.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# sync_daily_reports は読み込み時に設定を読むので、テストではダミーの値を入れておく（通信はしない）
+for _key, _value in {"SLACK_BOT_TOKEN": "xoxb-test", "SLACK_CHANNEL_ID": "CTEST", "NOTION_TOKEN": "test",
+                     "NOTION_DB_ID": "db-test", "LOG_LEVEL": "info"}.items():
+    os.environ.setdefault(_key, _value)
+os.environ.setdefault("SYNC_CACHE_DIR", tempfile.mkdtemp(prefix="sync_test_"))
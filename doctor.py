@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+同期前の設定チェック（doctor）。
+Slack（認証・スコープ・チャンネル参加・履歴の読み取り）と Notion（データベースのプロパティ・ページ作成）の
+確認をまとめて並列に実行し、エンドポイントごとの所要時間と観測したレート制限のヘッダーを出す。
+失敗したチェックがあれば exit 1 で終わる。
+
+  python doctor.py               # 結果を表で表示
+  python doctor.py --json        # CI 用に JSON で出力
+  python doctor.py --no-write    # ページ作成の確認（作ってすぐアーカイブする）を省く
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+import sync_daily_reports as sync
+from http_client import HttpClient, RetryPolicy, notion_idempotent
+from sync_metrics import RunMetrics, endpoint_name
+
+# ====== 環境変数（sync_daily_reports.py と同じもの。チャンネルと書き込み先DBの対応は sync.CHANNEL_DB_MAP） ======
+SLACK_BOT_TOKEN   = os.getenv("SLACK_BOT_TOKEN")
+NOTION_TOKEN      = os.getenv("NOTION_TOKEN")
+SLACK_API_URL     = os.getenv("SLACK_API_URL", "https://slack.com/api/")
+NOTION_API_URL    = os.getenv("NOTION_API_URL", "https://api.notion.com")
+DOCTOR_WORKERS    = int(os.getenv("DOCTOR_WORKERS", "8"))  # 並列に実行するチェック数
+
+NOTION_VERSION = "2022-06-28"
+# 同期に必要な Bot Token Scopes（channels:read / groups:read は参加状況の確認にだけ使う）
+REQUIRED_SLACK_SCOPES = ("users:read",)
+# 履歴の読み取りに必要なスコープ（パブリック / プライベートチャンネル）
+HISTORY_SCOPES = {False: "channels:history", True: "groups:history"}
+# 同期が前提にしているデータベースのプロパティ
+TITLE_PROPERTY = "メンバー名"
+YEAR_PROPERTY = "評価年度"
+
+# Slack API のエラーごとの対処
+SLACK_ERROR_HINTS = {
+    "invalid_auth": "Bot Token が無効です",
+    "token_revoked": "Bot Token が取り消されています",
+    "channel_not_found": "チャンネルIDを確認してください（プライベートチャンネルならBotの招待も必要です）",
+    "not_in_channel": "Botをチャンネルに招待してください: /invite @ボット名",
+    "missing_scope": "Botの権限が不足しています",
+}
+
+def _rate_limit_headers(headers) -> dict[str, str]:
+    """Retry-After と X-RateLimit-* 系のヘッダー"""
+    return {k: v for k, v in headers.items()
+            if k.lower() == "retry-after" or "ratelimit" in k.lower() or "rate-limit" in k.lower()}
+
+@dataclass
+class CheckResult:
+    """チェック1件の結果。status は ok / warn / fail / skip（warn は exit code に影響しない）"""
+    name: str
+    status: str = "ok"
+    detail: str = ""
+    latency_ms: float = 0.0
+    calls: list[dict] = field(default_factory=list)  # {"endpoint", "status", "ms", "rate_limit_headers"}
+
+    def fail(self, detail: str) -> "CheckResult":
+        self.status, self.detail = "fail", detail
+        return self
+
+    def warn(self, detail: str) -> "CheckResult":
+        self.status, self.detail = "warn", detail
+        return self
+
+class Doctor:
+    """
+    Slack / Notion の確認。チェックは (名前, 関数) の一覧で作り、run() でまとめて並列に実行する。
+    リクエストは同期処理と同じHTTP層を通し、エンドポイントごとの所要時間を RunMetrics に集める。
+    """
+
+    def __init__(self, slack_token: str | None, notion_token: str | None,
+                 slack_api_url: str = SLACK_API_URL, notion_api_url: str = NOTION_API_URL):
+        self.slack_token = slack_token
+        self.notion_token = notion_token
+        self.slack_api_url = slack_api_url.rstrip("/") + "/"
+        self.notion_api_url = notion_api_url.rstrip("/")
+        self.metrics = RunMetrics()
+        # 429 / 5xx の再試行は少なめにして、問題があればすぐ結果に出す
+        self.http = HttpClient(RetryPolicy(max_retries=2), metrics=self.metrics, on_response=self._observe)
+        self.lock = threading.Lock()
+        self.rate_limit_headers: dict[str, dict[str, str]] = {}  # サービス → 観測したヘッダー（最後の値）
+        self.slack_scopes: set[str] | None = None
+
+    def _observe(self, service: str, resp):
+        """再試行された応答（429 の Retry-After など）も含めてレート制限のヘッダーを集める"""
+        observed = _rate_limit_headers(resp.headers)
+        if observed:
+            with self.lock:
+                self.rate_limit_headers.setdefault(service, {}).update(observed)
+
+    def _call(self, result: CheckResult, service: str, endpoint: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        resp = self.http.request(method, url, service=service, endpoint=endpoint, **kwargs)
+        ms = round((time.perf_counter() - start) * 1000, 1)
+        observed = _rate_limit_headers(resp.headers)
+        result.latency_ms = round(result.latency_ms + ms, 1)
+        result.calls.append({"endpoint": endpoint, "status": resp.status_code, "ms": ms,
+                             "rate_limit_headers": observed})
+        return resp
+
+    def slack(self, result: CheckResult, api_method: str, **params) -> dict:
+        resp = self._call(result, "slack", api_method, "GET", self.slack_api_url + api_method, params=params,
+                          headers={"Authorization": f"Bearer {self.slack_token}"})
+        # スコープはどの応答のヘッダーにも付くので、並列に動くチャンネルのチェックでも auth.test を待たずに使える
+        if "X-OAuth-Scopes" in resp.headers:
+            self.slack_scopes = {s.strip() for s in resp.headers["X-OAuth-Scopes"].split(",") if s.strip()}
+        try:
+            return resp.json()
+        except ValueError:
+            return {"ok": False, "error": f"HTTP {resp.status_code}"}
+
+    def notion(self, result: CheckResult, method: str, path: str, body: dict | None = None):
+        # ページの作成は同期処理と同じく 5xx やタイムアウトで送り直さない（確認用ページが二重にできるため）
+        return self._call(result, "notion", endpoint_name(method, path), method, f"{self.notion_api_url}/v1/{path}",
+                          json=body, headers={"Authorization": f"Bearer {self.notion_token}",
+                                              "Notion-Version": NOTION_VERSION},
+                          idempotent=notion_idempotent(method, path))
+
+    # ====== Slack ======
+    def check_slack_auth(self, result: CheckResult) -> CheckResult:
+        data = self.slack(result, "auth.test")
+        if not data.get("ok"):
+            return result.fail(_slack_error(data))
+        result.detail = f"bot={data.get('user')} team={data.get('team')}"
+        if self.slack_scopes is None:
+            result.detail += "（スコープはヘッダーがないため未確認）"
+        elif missing := [s for s in REQUIRED_SLACK_SCOPES if s not in self.slack_scopes]:
+            return result.fail(f"Bot Token Scopes が不足しています: {', '.join(missing)}")
+        elif not self.slack_scopes & set(HISTORY_SCOPES.values()):
+            # どちらが要るかはチャンネルごと（パブリック / プライベート）に確認する
+            return result.fail("Bot Token Scopes が不足しています: channels:history（プライベートチャンネルは groups:history）")
+        return result
+
+    def check_slack_channel(self, result: CheckResult, channel_id: str) -> CheckResult:
+        data = self.slack(result, "conversations.info", channel=channel_id)
+        if not data.get("ok"):
+            if data.get("error") == "missing_scope":
+                # 参加状況の確認には channels:read（プライベートチャンネルは groups:read）が要る。同期自体は履歴のチェックで判断する
+                return result.warn(f"{data.get('needed') or 'channels:read'} がないため参加状況を確認できません")
+            return result.fail(_slack_error(data))
+        channel = data["channel"]
+        history_scope = HISTORY_SCOPES[bool(channel.get("is_private"))]
+        if self.slack_scopes is not None and history_scope not in self.slack_scopes:
+            return result.fail(f"Bot Token Scopes が不足しています: {history_scope}")
+        if channel.get("is_archived"):
+            return result.fail(f"#{channel.get('name')} はアーカイブされています")
+        if channel.get("is_member") is False:
+            return result.fail(f"Botが #{channel.get('name')} に参加していません: /invite @ボット名")
+        result.detail = f"#{channel.get('name')}（メンバー {channel.get('num_members', '不明')} 人）"
+        return result
+
+    def check_slack_history(self, result: CheckResult, channel_id: str) -> CheckResult:
+        data = self.slack(result, "conversations.history", channel=channel_id, limit=1)
+        if not data.get("ok"):
+            return result.fail(_slack_error(data))
+        result.detail = f"履歴を読み取れます（最新 {len(data.get('messages', []))} 件を取得）"
+        return result
+
+    # ====== Notion ======
+    def check_notion_schema(self, result: CheckResult, db_id: str) -> CheckResult:
+        resp = self.notion(result, "GET", f"databases/{db_id}")
+        if resp.status_code != 200:
+            return result.fail(_notion_error(resp))
+        properties = resp.json().get("properties", {})
+        title = next((name for name, prop in properties.items() if prop.get("type") == "title"), None)
+        if title != TITLE_PROPERTY:
+            return result.fail(f"Titleプロパティ名が '{title}' です（'{TITLE_PROPERTY}' にしてください）")
+        year = properties.get(YEAR_PROPERTY)
+        if year is None:
+            return result.fail(f"'{YEAR_PROPERTY}' プロパティ（セレクト）がありません")
+        if year.get("type") != "select":
+            return result.fail(f"'{YEAR_PROPERTY}' プロパティの種類が {year.get('type')} です（セレクトにしてください）")
+        result.detail = f"'{TITLE_PROPERTY}'（タイトル）と '{YEAR_PROPERTY}'（セレクト）があります"
+        return result
+
+    def check_notion_write(self, result: CheckResult, db_id: str) -> CheckResult:
+        """確認用のページを作ってすぐアーカイブする（評価年度を付けないので同期の検索には出ない）"""
+        resp = self.notion(result, "POST", "pages", {
+            "parent": {"database_id": db_id},
+            "properties": {TITLE_PROPERTY: {"title": [{"text": {"content": "doctor: 書き込み確認"}}]}},
+        })
+        if resp.status_code != 200:
+            detail = f"ページを作成できません: {_notion_error(resp)}"
+            if resp.status_code >= 500:
+                detail += "（作成されている場合は 'doctor: 書き込み確認' のページを手動で削除してください）"
+            return result.fail(detail)
+        page_id = resp.json()["id"]
+        resp = self.notion(result, "PATCH", f"pages/{page_id}", {"archived": True})
+        if resp.status_code != 200:
+            return result.warn(f"確認用ページ {page_id} のアーカイブに失敗しました（手動で削除してください）")
+        result.detail = "ページを作成・アーカイブできます"
+        return result
+
+    # ====== 実行 ======
+    def checks(self, channel_db_map: dict[str, str | None], write: bool = True) -> list[tuple[str, object]]:
+        checks = [("slack.auth", self.check_slack_auth)]
+        for channel_id in channel_db_map:
+            checks.append((f"slack.channel {channel_id}", lambda r, c=channel_id: self.check_slack_channel(r, c)))
+            checks.append((f"slack.history {channel_id}", lambda r, c=channel_id: self.check_slack_history(r, c)))
+        for db_id in sorted({db_id for db_id in channel_db_map.values() if db_id}):
+            checks.append((f"notion.schema {db_id}", lambda r, d=db_id: self.check_notion_schema(r, d)))
+            if write:
+                checks.append((f"notion.write {db_id}", lambda r, d=db_id: self.check_notion_write(r, d)))
+        return checks
+
+    def run(self, checks: list[tuple[str, object]], workers: int = DOCTOR_WORKERS) -> list[CheckResult]:
+        """チェックを並列に実行し、定義順の結果を返す（例外はそのチェックの失敗にする）"""
+        def run_one(name, check):
+            result = CheckResult(name)
+            try:
+                return check(result)
+            except Exception as e:
+                return result.fail(f"{type(e).__name__}: {e}")
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(run_one, name, check) for name, check in checks]
+            return [future.result() for future in futures]
+
+    def report(self, results: list[CheckResult], wall_sec: float) -> dict:
+        services = self.metrics.report()["services"]
+        return {
+            "ok": not any(r.status == "fail" for r in results),
+            "wall_sec": round(wall_sec, 3),
+            "checks": [asdict(r) for r in results],
+            "endpoints": {
+                service: {endpoint: {k: h[k] for k in ("count", "errors", "p50_ms", "max_ms")}
+                          for endpoint, h in info["endpoints"].items()}
+                for service, info in services.items()
+            },
+            "rate_limited": {service: info["rate_limited"] for service, info in services.items()},
+            "rate_limit_headers": self.rate_limit_headers,
+        }
+
+    def close(self):
+        self.http.close()
+
+def _slack_error(data: dict) -> str:
+    error = data.get("error", "unknown_error")
+    hint = SLACK_ERROR_HINTS.get(error)
+    if error == "missing_scope" and data.get("needed"):
+        hint = f"{hint}（必要: {data['needed']}）"
+    return f"{error}: {hint}" if hint else error
+
+def _notion_error(resp) -> str:
+    try:
+        body = resp.json()
+        return f"{resp.status_code} {body.get('code')}: {body.get('message')}"
+    except ValueError:
+        return f"{resp.status_code}"
+
+STATUS_ICONS = {"ok": "✅", "warn": "⚠️ ", "fail": "❌", "skip": "⏭️ "}
+
+def print_report(report: dict):
+    checks = report["checks"]
+    width = max(len(c["name"]) for c in checks)
+    print(f"🩺 設定チェック: {len(checks)} 件（並列実行 {report['wall_sec']:.2f}秒）")
+    for c in checks:
+        print(f"{STATUS_ICONS[c['status']]} {c['name']:<{width}} {c['latency_ms']:>8.1f}ms  {c['detail']}")
+    if report["endpoints"]:
+        print("\n⏱️  エンドポイントごとの所要時間")
+        for service, endpoints in report["endpoints"].items():
+            for endpoint, h in endpoints.items():
+                print(f"   {service:<7} {endpoint:<32} {h['count']:>3} 回  p50 {h['p50_ms']:>7.1f}ms  "
+                      f"max {h['max_ms']:>7.1f}ms")
+    for service, n in report["rate_limited"].items():
+        if n:
+            print(f"⏳ {service}: 429 を {n} 回受けました")
+    for service, headers in report["rate_limit_headers"].items():
+        print(f"📎 {service} のレート制限ヘッダー: " + ", ".join(f"{k}={v}" for k, v in headers.items()))
+    print("\n🎉 すべてのチェックに通りました" if report["ok"] else "\n❌ 失敗したチェックがあります")
+
+def main():
+    parser = argparse.ArgumentParser(description="Slack / Notion の設定を並列にチェックします")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    parser.add_argument("--no-write", action="store_true", help="ページ作成の確認を省く")
+    args = parser.parse_args()
+
+    channel_db_map = sync.CHANNEL_DB_MAP
+    missing = [name for name, value in (("SLACK_BOT_TOKEN", SLACK_BOT_TOKEN), ("NOTION_TOKEN", NOTION_TOKEN),
+                                        ("SLACK_CHANNEL_ID（または SLACK_CHANNEL_IDS）", channel_db_map))
+               if not value]
+    if channel_db_map and not all(channel_db_map.values()):
+        missing.append("NOTION_DB_ID")
+
+    start = time.perf_counter()
+    doctor = Doctor(SLACK_BOT_TOKEN, NOTION_TOKEN)
+    try:
+        env = CheckResult("env", detail=f"チャンネル {len(channel_db_map)} 件")
+        if missing:
+            # 環境変数が足りなければAPIは呼ばない
+            results = [env.fail(f"環境変数が足りません: {', '.join(missing)}")]
+            results += [CheckResult(name, "skip", "環境変数が足りないため省略")
+                        for name, _ in doctor.checks(channel_db_map, write=not args.no_write)]
+        else:
+            results = [env] + doctor.run(doctor.checks(channel_db_map, write=not args.no_write))
+        report = doctor.report(results, time.perf_counter() - start)
+    finally:
+        doctor.close()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    sys.exit(0 if report["ok"] else 1)
+
+if __name__ == "__main__":
+    main()
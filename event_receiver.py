@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Slack Events API の受信サーバー（常駐モード）。
+日報チャンネルの message / message_changed / message_deleted イベントを受け取り、数秒以内にNotionへ反映する。
+編集されたメッセージはその段落だけを書き換え、削除されたメッセージの段落はアーカイブする。
+解析と書き込みは sync_daily_reports と同じもの（ReportParser・NotionWriter・台帳）を使う。
+
+  python event_receiver.py serve --port 3000                 # Request URL: http://<host>:3000/slack/events
+  python event_receiver.py replay events.jsonl --url http://localhost:3000/slack/events
+
+replay は JSONL（1行に1件、Events API のペイロードかイベント本体）を署名付きで送り直す。
+動作確認や、取りこぼしたイベントの再投入に使う。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from slack_sdk.signature import SignatureVerifier
+
+import sync_daily_reports as sync
+from http_client import HttpClient, RetryPolicy
+
+SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET")
+EVENT_PATH = "/slack/events"
+EVENT_BATCH_SEC = float(os.getenv("EVENT_BATCH_SEC", "2"))  # 同じページ宛てのイベントをまとめる待ち時間
+
+class EventDeduper:
+    """Slack の再送（X-Slack-Retry-Num）で同じ event_id が複数回届くので、直近の分を覚えて捨てる"""
+
+    def __init__(self, size: int = 10000):
+        self.size = size
+        self.seen: OrderedDict[str, None] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def first_time(self, event_id: str) -> bool:
+        with self.lock:
+            if event_id in self.seen:
+                return False
+            self.seen[event_id] = None
+            if len(self.seen) > self.size:
+                self.seen.popitem(last=False)
+            return True
+
+def event_message(event: dict) -> tuple[str, dict] | None:
+    """取り込むイベントなら (チャンネル, メッセージ) を返す。削除は {"ts": ..., "deleted": True}"""
+    if event.get("type") != "message" or event.get("channel") not in sync.CHANNEL_DB_MAP:
+        return None
+    subtype = event.get("subtype")
+    if subtype == "message_deleted":
+        if not event.get("deleted_ts"):
+            return None
+        return event["channel"], {"ts": event["deleted_ts"], "deleted": True}
+    if subtype == "message_changed":
+        msg = dict(event.get("message") or {})
+    elif subtype == "message_replied":
+        # 親メッセージの返信数が変わった通知（本文は変わらない。返信そのものは別のイベントで届く）
+        return None
+    else:
+        # 定期同期と同じく subtype では絞らない（ファイル付き（file_share）やボットの日報も取り込み、
+        # 参加・退出などは日報として解析できないので取り込まれない）
+        msg = event
+    if "ts" not in msg:
+        return None
+    thread_ts = msg.get("thread_ts")
+    if thread_ts and thread_ts != msg["ts"] and subtype != "thread_broadcast" and not sync.INCLUDE_THREADS:
+        return None
+    return event["channel"], msg
+
+class EventProcessor:
+    """
+    受け取ったイベントをキューに積み、EVENT_BATCH_SEC の間に届いた分をまとめて1回で反映する。
+    同じ人・同じ日のメッセージは1つのバケットになり、NotionWriter がページごとにまとめて書き込む。
+    定期同期も同じDBに書くので、NotionWriter（ページ・トグルの索引）はバッチごとに作り直し、
+    写し（NotionMirror）と差分の問い合わせでほかのプロセスが作ったページ・トグルを拾う。
+    """
+
+    def __init__(self):
+        self.queue: queue.Queue = queue.Queue()
+        self.checkpoint = sync.CheckpointStore(os.path.join(sync.CACHE_DIR, "checkpoint.json"))
+        self.thread = threading.Thread(target=self._loop, name="event-processor", daemon=True)
+        self.processed = 0
+
+    def start(self):
+        self.thread.start()
+
+    def put(self, channel_id: str, msg: dict):
+        self.queue.put((channel_id, msg))
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+        sync.user_directory.save()
+
+    def _loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + EVENT_BATCH_SEC
+            stopping = False
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self.process(batch)
+            except Exception as e:
+                print(f"❌ イベントの処理中に予期しないエラー: {e}")
+            if stopping:
+                return
+
+    def process(self, batch: list[tuple[str, dict]]):
+        # 同じメッセージの編集・削除が続けて届いたら最後の版だけを使う
+        latest: dict[tuple[str, str], sync.SlackMessage | None] = {}  # 削除されたメッセージは None
+        for channel_id, msg in batch:
+            latest[(channel_id, msg["ts"])] = None if msg.get("deleted") else sync.slim_message(msg)
+
+        # (DB, 日付) → バケット。チャンネルが違っても同じDBの同じ人・同じ日は1つにまとめる
+        buckets: dict[tuple[str, str], dict] = {}
+        retracts: list[tuple[str, str]] = []
+        for (channel_id, ts), msg in sorted(latest.items(), key=lambda kv: float(kv[0][1])):
+            if msg is None:
+                retracts.append((channel_id, ts))
+                continue
+            if self.checkpoint.is_unchanged(channel_id, ts, msg.edited_ts):
+                continue
+            date_str = sync.jst_date_str_from_ts(ts)
+            day_bucket = {}
+            self.processed += 1
+            if not sync.add_to_bucket(day_bucket, msg, date_str, self.processed, channel_id):
+                # 編集で日報でなくなったメッセージ
+                retracts.append((channel_id, ts))
+                continue
+            merged = buckets.setdefault((sync.CHANNEL_DB_MAP[channel_id], date_str), {})
+            for key, segments in day_bucket.items():
+                merged.setdefault(key, []).extend(segments)
+
+        failed: set[tuple[str, str]] = set()
+        if buckets or retracts:
+            writer = sync.NotionWriter(sync.notion_db_ids())
+            try:
+                years = {year for merged in buckets.values() for _, year in merged}
+                if years:
+                    writer.start(years)
+                for (db_id, date_str), merged in sorted(buckets.items(), key=lambda kv: kv[0][1]):
+                    writer.submit_day(db_id, date_str, merged)
+                for channel_id, ts in retracts:
+                    writer.retract(channel_id, ts)
+                failed = writer.flush()
+            finally:
+                writer.close()
+
+        # 反映できたメッセージだけ記録する（失敗分は定期同期で拾い直す）。同期位置（latest_ts）は動かさず、
+        # 遡及期間より古い記録だけを捨てる（保存時に定期同期の変更と突き合わせる）
+        for (channel_id, ts), msg in latest.items():
+            if (channel_id, ts) in failed:
+                continue
+            if msg is None:
+                self.checkpoint.forget(channel_id, ts)
+            else:
+                self.checkpoint.record(channel_id, ts, msg.edited_ts)
+        keep_since = time.time() - sync.LOOKBACK_DAYS * 86400
+        for channel_id in {channel_id for channel_id, _ in latest}:
+            self.checkpoint.advance(channel_id, None, keep_since)
+        self.checkpoint.save()
+        sync.user_directory.save()
+        if failed:
+            print(f"⚠️  {len(failed)} 件のメッセージの反映に失敗しました（次回の定期同期で再処理されます）")
+        print(f"⚡ {len(batch)} 件のイベントを処理しました（キュー残り {self.queue.qsize()} 件）")
+
+def make_handler(processor: EventProcessor, verifier: SignatureVerifier, deduper: EventDeduper):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            sync.debug(f"🌐 {self.address_string()} {format % args}")
+
+        def _send(self, status: int, payload: dict | None = None):
+            raw = json.dumps(payload or {}, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                return self._send(200, {"ok": True, "queued": processor.queue.qsize(), "processed": processor.processed})
+            self._send(404)
+
+        def do_POST(self):
+            if self.path != EVENT_PATH:
+                return self._send(404)
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if not verifier.is_valid(body, self.headers.get("X-Slack-Request-Timestamp", ""),
+                                     self.headers.get("X-Slack-Signature", "")):
+                return self._send(401, {"error": "invalid_signature"})
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return self._send(400, {"error": "invalid_json"})
+
+            if payload.get("type") == "url_verification":
+                return self._send(200, {"challenge": payload.get("challenge")})
+            # Slack は3秒以内の応答を求めるので、ここではキューに積むだけ
+            self._send(200)
+            if payload.get("type") != "event_callback":
+                return
+            if payload.get("event_id") and not deduper.first_time(payload["event_id"]):
+                return
+            event = payload.get("event") or {}
+            if event.get("type") == "user_change":
+                # 表示名の変更は次の参照時に users.info で取り直す
+                sync.user_directory.invalidate((event.get("user") or {}).get("id", ""))
+                return
+            picked = event_message(event)
+            if picked is not None:
+                processor.put(*picked)
+
+    return Handler
+
+def serve(port: int):
+    sync.require_config()
+    if not SLACK_SIGNING_SECRET:
+        raise SystemExit("❌ SLACK_SIGNING_SECRET を設定してください")
+    processor = EventProcessor()
+    processor.start()
+    server = ThreadingHTTPServer(("0.0.0.0", port), make_handler(
+        processor, SignatureVerifier(SLACK_SIGNING_SECRET), EventDeduper()))
+    print(f"📡 Slackイベントを待ち受けています: http://0.0.0.0:{port}{EVENT_PATH}"
+          f"（チャンネル: {', '.join(sync.CHANNEL_DB_MAP)}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 停止します。キューに残ったイベントを反映しています...")
+    finally:
+        server.server_close()
+        processor.stop()
+
+def replay(path: str, url: str, delay: float):
+    """JSONL のイベントを署名付きで送る。イベント本体だけの行は event_callback に包む"""
+    if not SLACK_SIGNING_SECRET:
+        raise SystemExit("❌ SLACK_SIGNING_SECRET を設定してください")
+    verifier = SignatureVerifier(SLACK_SIGNING_SECRET)
+    http = HttpClient(RetryPolicy(max_retries=3))
+    sent = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            payload = json.loads(line)
+            if "type" in payload and payload["type"] not in ("event_callback", "url_verification"):
+                event_id = "Ev" + hashlib.sha1(line.encode("utf-8")).hexdigest()[:16]
+                payload = {"type": "event_callback", "event_id": event_id, "event": payload}
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            timestamp = str(int(time.time()))
+            resp = http.request("POST", url, service="receiver", data=body, headers={
+                "Content-Type": "application/json",
+                "X-Slack-Request-Timestamp": timestamp,
+                "X-Slack-Signature": verifier.generate_signature(timestamp=timestamp, body=body),
+            })
+            if resp.status_code != 200:
+                print(f"❌ {resp.status_code}: {resp.text}")
+            sent += 1
+            if delay:
+                time.sleep(delay)
+    print(f"📤 {sent} 件のイベントを送信しました")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Slack Events API を受けて日報をNotionへ即時反映します")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    p_serve = subparsers.add_parser("serve", help="イベント受信サーバーを起動する")
+    p_serve.add_argument("--port", type=int, default=int(os.getenv("EVENT_PORT", "3000")))
+    p_replay = subparsers.add_parser("replay", help="JSONL のイベントを受信サーバーに送り直す")
+    p_replay.add_argument("path")
+    p_replay.add_argument("--url", default=f"http://localhost:{os.getenv('EVENT_PORT', '3000')}{EVENT_PATH}")
+    p_replay.add_argument("--delay", type=float, default=0.0, help="1件ごとの間隔（秒）")
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.port)
+    else:
+        replay(args.path, args.url, args.delay)
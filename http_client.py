@@ -0,0 +1,266 @@
+"""
+Slack / Notion / セットアップ時のチェックで共有するHTTPの層。
+  - ホストごとの keep-alive 接続プール（requests.Session）と同時接続数の上限
+  - 429 / 5xx / 接続エラーの再試行（指数バックオフ＋ジッター、Retry-After を優先）
+    冪等でないリクエスト（Notion のページ作成・子ブロックの追記）は、届いていないと分かる場合
+    （429 と接続の確立前のエラー）だけ再試行する
+  - 429 を受けたらそのサービスへのリクエストを全スレッドで Retry-After まで止める
+WebClient と NotionClient にはそれぞれアダプター（SlackWebClient / NotionTransport）経由で差し込む。
+"""
+
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from urllib.parse import urlencode, urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from slack_sdk.web import WebClient
+
+from sync_metrics import endpoint_name
+
+# 再試行するステータス（429 はレート制限、5xx は一時的なサーバーエラー）
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class RateLimiter:
+    """スレッド間で共有するトークンバケット"""
+
+    def __init__(self, rate_per_sec: float, burst: float | None = None):
+        self.rate = rate_per_sec
+        self.capacity = burst if burst is not None else max(1.0, rate_per_sec)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """トークンを1つ取得する（待った秒数を返す）"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class RetryPolicy:
+    """
+    再試行の間隔。Retry-After があればそれに従い、なければ base_delay * 2^attempt（上限 max_delay）を
+    0.5〜1倍のジッターで散らす（同時に失敗したスレッドが一斉に再試行しないように）。
+    """
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def _retry_after(resp: requests.Response) -> float | None:
+    try:
+        return float(resp.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _not_sent(exc: Exception) -> bool:
+    """接続を確立する前のエラーか（サーバーにはリクエストが届いていない）"""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], "reason", None) if exc.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class HttpClient:
+    """
+    共有のHTTPクライアント。request() の service はレート制限と計測の単位（"slack" / "notion" など）。
+    metrics には sync_metrics.RunMetrics（record_call / record_rate_limit / count を持つもの）を渡せる。
+    on_response(service, response) は再試行分を含むすべての応答で呼ばれる（ヘッダーの観測用）。
+    """
+
+    def __init__(self, retry: RetryPolicy | None = None, max_per_host: int = 8, timeout: float = 60.0,
+                 limiters: dict[str, RateLimiter] | None = None, metrics=None, on_response=None):
+        self.retry = retry or RetryPolicy()
+        self.max_per_host = max(1, max_per_host)
+        self.timeout = timeout
+        self.limiters = limiters or {}
+        self.metrics = metrics
+        self.on_response = on_response
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_per_host)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.lock = threading.Lock()
+        self.host_slots: dict[str, threading.BoundedSemaphore] = {}
+        self.paused_until: dict[str, float] = {}  # サービス → Retry-After で止める期限（monotonic）
+
+    def _slot(self, host: str) -> threading.BoundedSemaphore:
+        with self.lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self.host_slots[host]
+
+    def _wait_turn(self, service: str) -> float:
+        """Retry-After による一時停止とトークンバケットを待つ（待った秒数を返す）"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                delay = self.paused_until.get(service, 0.0) - time.monotonic()
+            if delay <= 0:
+                break
+            time.sleep(delay)
+            waited += delay
+        limiter = self.limiters.get(service)
+        if limiter is not None:
+            waited += limiter.acquire()
+        return waited
+
+    def _pause(self, service: str, seconds: float):
+        with self.lock:
+            until = time.monotonic() + seconds
+            self.paused_until[service] = max(self.paused_until.get(service, 0.0), until)
+
+    def request(self, method: str, url: str, *, service: str, endpoint: str | None = None,
+                idempotent: bool = True, **kwargs) -> requests.Response:
+        """
+        リクエストを送り、429 / 5xx / 接続エラーは再試行する。
+        idempotent=False（同じリクエストを2回送ると結果が変わる）の場合は、429 と接続の確立前のエラーだけ
+        再試行する（5xx や読み取りのタイムアウトは書き込まれた可能性があるので、そのまま返して呼び出し側に任せる）。
+        再試行し尽くした場合は最後のレスポンスを返す（接続エラーは例外をそのまま投げる）。
+        """
+        endpoint = endpoint or f"{method.upper()} {urlparse(url).path}"
+        kwargs.setdefault("timeout", self.timeout)
+        slot = self._slot(urlparse(url).netloc)
+        attempt = 0
+        while True:
+            slept = self._wait_turn(service)
+            if self.metrics is not None and slept:
+                self.metrics.record_rate_limit(service, slept=slept)
+            start = time.perf_counter()
+            try:
+                with slot:
+                    resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if self.metrics is not None:
+                    self.metrics.record_call(service, endpoint, time.perf_counter() - start, ok=False)
+                if attempt >= self.retry.max_retries or not (idempotent or _not_sent(exc)):
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            if self.metrics is not None:
+                self.metrics.record_call(service, endpoint, time.perf_counter() - start, ok=resp.status_code < 400)
+            if self.on_response is not None:
+                self.on_response(service, resp)
+            if resp.status_code not in RETRYABLE_STATUS or attempt >= self.retry.max_retries:
+                return resp
+            if resp.status_code != 429 and not idempotent:
+                return resp
+            if resp.status_code == 429:
+                wait = self.retry.delay(attempt, _retry_after(resp) or 1.0)
+                print(f"   ⏳ {service} のレート制限に達しました。{wait:.0f}秒待って再試行します")
+                self._pause(service, wait)
+                if self.metrics is not None:
+                    self.metrics.record_rate_limit(service, hit=True)
+            else:
+                if self.metrics is not None:
+                    self.metrics.count(f"{service}_retries")
+                time.sleep(self.retry.delay(attempt, _retry_after(resp)))
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+
+class SlackWebClient(WebClient):
+    """urllib の代わりに共有の HttpClient で送る WebClient（再試行も HttpClient が行う）"""
+
+    def __init__(self, http: HttpClient, **kwargs):
+        super().__init__(**kwargs)
+        self.http = http
+        self.retry_handlers = []
+
+    def _perform_urllib_http_request(self, *, url: str, args: dict) -> dict:
+        headers = dict(args["headers"])
+        if args["json"]:
+            body = json.dumps(args["json"]).encode("utf-8")
+            headers["Content-Type"] = "application/json;charset=utf-8"
+        elif args["data"]:
+            body, headers["Content-Type"] = _multipart(args["data"])
+        elif args["params"]:
+            body = urlencode(args["params"]).encode("utf-8")
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        else:
+            body = None
+        # Slack の Web API はどのメソッドも POST で受け付ける（slack_sdk と同じ）。
+        # 使っているのは読み取りのメソッドだけなので、POST でも再試行してよい
+        resp = self.http.request("POST", url, service="slack", endpoint=url.rsplit("/", 1)[-1],
+                                 idempotent=True, data=body, headers=headers, timeout=self.timeout)
+        return {"status": resp.status_code, "headers": dict(resp.headers), "body": resp.text}
+
+
+def _multipart(data: dict) -> tuple[bytes, str]:
+    """ファイル以外のフォーム項目を multipart/form-data にする"""
+    boundary = f"--------------{uuid.uuid4()}"
+    body = io.BytesIO()
+    for key, value in data.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n'.encode("utf-8"))
+        body.write(str(value).encode("utf-8") + b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode("utf-8"))
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+# requests が展開済みの本文を返すので、httpx 側で再度展開させないヘッダー
+_HOP_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding", "connection"})
+
+# 本文が読み取り・上書きで、同じリクエストを繰り返しても結果が変わらない Notion の POST / PATCH
+_IDEMPOTENT_WRITES = re.compile(r"^(?:POST databases/[^/]+/query|POST search|PATCH (?:blocks|pages)/[^/]+)$")
+
+
+def notion_idempotent(method: str, path: str) -> bool:
+    """
+    Notion API のリクエストを繰り返し送ってよいか。GET / DELETE とクエリ・検索・ブロックやページの更新は冪等、
+    ページの作成（POST pages）と子ブロックの追記（PATCH blocks/{id}/children）は送るたびに増えるので冪等でない。
+    """
+    method = method.upper()
+    if method in ("GET", "DELETE"):
+        return True
+    return bool(_IDEMPOTENT_WRITES.match(f"{method} {path.strip('/')}"))
+
+
+class NotionTransport(httpx.BaseTransport):
+    """NotionClient（httpx）のリクエストを共有の HttpClient で送るトランスポート"""
+
+    def __init__(self, http: HttpClient, service: str = "notion"):
+        self.http = http
+        self.service = service
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.split("/v1/", 1)[-1]
+        timeout = (request.extensions.get("timeout") or {}).get("read")
+        resp = self.http.request(
+            request.method, str(request.url), service=self.service,
+            endpoint=endpoint_name(request.method, path),
+            idempotent=notion_idempotent(request.method, path),
+            data=request.read() or None,
+            headers={k: v for k, v in request.headers.items() if k.lower() != "host"},
+            timeout=timeout or self.http.timeout,
+        )
+        headers = [(k, v) for k, v in resp.headers.items() if k.lower() not in _HOP_HEADERS]
+        return httpx.Response(resp.status_code, headers=headers, content=resp.content, request=request)
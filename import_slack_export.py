@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Slack のワークスペースエクスポート（ZIP）から日報を取り込む。Slack API は呼ばない。
+ZIP はメモリマップで開き、チャンネルごとの日別 JSON（<チャンネル名>/YYYY-MM-DD.json）を
+日付順に1ファイルずつ読んで、定期同期と同じ解析・バケット・NotionWriter に流す。
+展開はせず、保持するのは読んでいる日のファイルとまだ閉じていない日のメッセージだけ。
+
+  python import_slack_export.py export.zip
+  python import_slack_export.py export.zip --since 2024-04-01 --until 2025-03-31 --dry-run
+
+取り込むチャンネルと書き込み先は定期同期と同じ（SLACK_CHANNEL_ID / SLACK_CHANNEL_IDS）。
+ユーザー名はエクスポートの users.json から作り、users.json のキャッシュにも保存する。
+"""
+
+import argparse
+import json
+import mmap
+import posixpath
+import re
+import zipfile
+from datetime import datetime, timedelta
+from operator import attrgetter
+
+import sync_daily_reports as sync
+
+DAY_FILE = re.compile(r"^(?P<folder>[^/]+)/(?P<date>\d{4}-\d{2}-\d{2})\.json$")
+
+class _MappedFile(mmap.mmap):
+    """zipfile がシーク可能か確かめるので seekable() を足す（mmap に入るのは Python 3.13 から）"""
+
+    def seekable(self) -> bool:
+        return True
+
+class SlackExport:
+    """エクスポートの ZIP。中央ディレクトリだけを読み、メンバーは必要になったときに1つずつ開く"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.mm = _MappedFile(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.zip = zipfile.ZipFile(self.mm)
+        # ZIP によっては全体が1つのフォルダに入っている
+        top = min((name for name in self.zip.namelist() if posixpath.basename(name) == "channels.json"),
+                  key=lambda name: name.count("/"), default=None)
+        if top is None:
+            raise SystemExit(f"❌ {path} に channels.json がありません（Slackのワークスペースエクスポートを指定してください）")
+        self.root = top[:-len("channels.json")]
+
+    def read_json(self, name: str, default=None):
+        try:
+            with self.zip.open(self.root + name) as f:
+                return json.load(f)
+        except KeyError:
+            return default
+
+    def channel_folders(self) -> dict[str, str]:
+        """チャンネルID → フォルダ名（パブリックは channels.json、プライベートは groups.json）"""
+        folders = {}
+        for listing in ("channels.json", "groups.json"):
+            for channel in self.read_json(listing, []):
+                folders[channel["id"]] = channel["name"]
+        return folders
+
+    def day_files(self, folders: set[str]) -> dict[str, dict[str, str]]:
+        """フォルダ名 → {日付: ZIP内のパス}"""
+        files: dict[str, dict[str, str]] = {folder: {} for folder in folders}
+        for name in self.zip.namelist():
+            m = DAY_FILE.match(name[len(self.root):]) if name.startswith(self.root) else None
+            if m and m["folder"] in files:
+                files[m["folder"]][m["date"]] = name
+        return files
+
+    def close(self):
+        self.zip.close()
+        self.mm.close()
+        self.file.close()
+
+def is_target_message(msg: dict) -> bool:
+    """定期同期と同じく、スレッドの返信は INCLUDE_THREADS のときだけ取り込む"""
+    if "ts" not in msg:
+        return False
+    thread_ts = msg.get("thread_ts")
+    if thread_ts and thread_ts != msg["ts"] and msg.get("subtype") != "thread_broadcast":
+        return sync.INCLUDE_THREADS
+    return True
+
+def _shift(date_str: str, days: int) -> str:
+    return (datetime.strptime(date_str, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+
+def import_export(path: str, since: str | None = None, until: str | None = None, dry_run: bool = False):
+    sync.require_config()
+    print(f"🚀 Slackエクスポート {path} から日報を取り込みます（Slack APIは呼びません）...")
+    export = SlackExport(path)
+    try:
+        folders = export.channel_folders()
+        missing = [channel_id for channel_id in sync.CHANNEL_DB_MAP if channel_id not in folders]
+        if missing:
+            raise SystemExit(f"❌ エクスポートにないチャンネルがあります: {', '.join(missing)}")
+        channels = list(sync.CHANNEL_DB_MAP)
+        files = export.day_files({folders[c] for c in channels})
+        day_files = {c: files[folders[c]] for c in channels}
+
+        # 日別ファイルの日付はエクスポートのタイムゾーンなので、JSTの日付とは前後1日ずれうる
+        first, last = (_shift(since, -1) if since else "0000-00-00"), (_shift(until, 1) if until else "9999-99-99")
+        dates = sorted({d for per_channel in day_files.values() for d in per_channel if first <= d <= last})
+        if not dates:
+            print("❌ 対象期間の日別ファイルがありません")
+            return
+        print(f"📅 {dates[0]}〜{dates[-1]} の日別ファイル（{', '.join(f'#{folders[c]}' for c in channels)}）")
+
+        sync.user_directory.seed(export.read_json("users.json", []))
+        print(f"👥 エクスポートからユーザー一覧を作成しました: {len(sync.user_directory.names)} 名")
+
+        evaluation_years = {sync.evaluation_year_of(d) for d in (dates[0], dates[-1])}
+        evaluation_years = set(range(min(evaluation_years), max(evaluation_years) + 1))
+        writer = sync.NotionWriter(sync.notion_db_ids(), dry_run=dry_run)
+        merger = sync.DayMerger(sync.CHANNEL_DB_MAP, writer, evaluation_years)
+        pending: dict[str, dict[str, list[sync.SlackMessage]]] = {c: {} for c in channels}  # チャンネル → JSTの日付 → メッセージ
+        # ファイルの日付の前後1日までの JST の日付境界（メッセージごとに datetime を作らない）
+        days = sync.JstDayTable(sync.jst_day_start(_shift(dates[0], -1)), sync.jst_day_start(_shift(dates[-1], 2)))
+        count = files_read = 0
+
+        def close_days(cutoff: str):
+            # cutoff（JST）までの日はもう増えないので、日ごとに解析して merger へ渡す
+            nonlocal count
+            for channel_id in channels:
+                for date_str in sorted(d for d in pending[channel_id] if d <= cutoff):
+                    day_bucket: dict[tuple[str, int], list[sync.Segment]] = {}
+                    for msg in sorted(pending[channel_id].pop(date_str), key=attrgetter("ts_sec")):
+                        count += 1
+                        sync.add_to_bucket(day_bucket, msg, date_str, count, channel_id)
+                    merger.add(channel_id, date_str, day_bucket)
+                merger.add(channel_id, cutoff, {})
+
+        try:
+            for file_date in dates:
+                for channel_id in channels:
+                    name = day_files[channel_id].get(file_date)
+                    if name is None:
+                        continue
+                    files_read += 1
+                    with export.zip.open(name) as f:
+                        for msg in json.load(f):
+                            if not is_target_message(msg):
+                                continue
+                            record = sync.slim_message(msg)
+                            date_str = days.date_of(record.ts_sec)
+                            if (since and date_str < since) or (until and date_str > until):
+                                continue
+                            pending[channel_id].setdefault(date_str, []).append(record)
+                # 以降のファイルに入るのは JST で file_date 以降のメッセージだけ
+                close_days(_shift(file_date, -1))
+            close_days("9999-12-31")
+        finally:
+            for channel_id in channels:
+                merger.finish(channel_id)
+            writer.close()
+            sync.user_directory.save()
+    finally:
+        export.close()
+
+    sync.metrics.count("export_files_read", files_read)
+    sync.metrics.count("messages_fetched", count)
+    sync.metrics.count("buckets_submitted", writer.submitted)
+    print(f"\n📊 {files_read} 個の日別ファイル・{count} 件のメッセージから "
+          f"{writer.submitted} 件のユーザー・日付の組み合わせを反映しました（{writer.plan_summary()}）")
+    report = sync.metrics.write_report(sync.RUN_REPORT_PATH)
+    print(f"📈 実行レポート: {sync.RUN_REPORT_PATH}（{report['wall_sec']:.1f}秒）")
+    if dry_run:
+        print("   --dry-run のため、Notionへの書き込みは行っていません")
+    elif writer.failed_ts:
+        # 書き込み済みの行は台帳で重複を防ぐので、同じコマンドをもう一度実行すればよい
+        raise SystemExit(f"❌ {len(writer.failed_ts)} 件のメッセージの反映に失敗しました。もう一度実行してください")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Slackのワークスペースエクスポート（ZIP）から日報をNotionへ取り込みます")
+    parser.add_argument("path", help="エクスポートの ZIP ファイル")
+    parser.add_argument("--since", help="この日（JST, YYYY-MM-DD）以降だけ取り込む")
+    parser.add_argument("--until", help="この日（JST, YYYY-MM-DD）までだけ取り込む")
+    parser.add_argument("--dry-run", action="store_true", help="書き込み計画を表示するだけで、Notionには書き込まない")
+    args = parser.parse_args()
+    import_export(args.path, args.since, args.until, args.dry_run)
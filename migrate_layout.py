@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+ユーザーページのトグルの並べ方を flat（ページ直下に日付トグル）から month（月のトグル → 日付トグル）へ移行する。
+Notion API ではブロックを移動できないので、日付トグルを中身ごと月のトグルの中に作り直し、元のトグルをアーカイブする。
+
+  python migrate_layout.py --dry-run
+  python migrate_layout.py                 # 日報データベースの全ページ
+  python migrate_layout.py --year 2025     # 指定した評価年度のページだけ
+
+移行の前後・途中でも NOTION_LAYOUT=month で同期してよい（まだ移行していない日付トグルにはそのまま追記する）。
+移行が終わったページを .sync_cache/layout_migration.json に記録するので、途中で止まっても同じコマンドで続きから再開できる。
+作り直しの途中で止まった日付は、次の実行で作りかけのトグルを捨ててからやり直す。
+"""
+
+import argparse
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import sync_daily_reports as sync
+from sync_state import DedupLedger, LayoutMigrationProgress, NotionMirror
+
+PROGRESS_PATH = os.path.join(sync.CACHE_DIR, "layout_migration.json")
+DATE_TITLE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+MONTH_TITLE = re.compile(r"^\d{4}-\d{2}$")
+# 作り直すときに rich_text の要素から残すキー（plain_text / href は読み取り専用）
+RICH_TEXT_KEYS = ("type", "text", "mention", "equation", "annotations")
+
+def iter_person_pages(db_id: str, years: list[int]):
+    """DBのユーザーページを (メンバー名, 評価年度, ページID) で列挙（years が空なら全年度）"""
+    year_filters = [{"property": "評価年度", "select": {"equals": str(year)}} for year in years]
+    query = {"database_id": db_id, "page_size": 100}
+    if year_filters:
+        query["filter"] = {"or": year_filters}
+    cursor = None
+    while True:
+        res = sync.notion.databases.query(**query, start_cursor=cursor)
+        for page in res["results"]:
+            props = page.get("properties", {})
+            name = sync._plain_text(props.get("メンバー名", {}).get("title", []))
+            year = (props.get("評価年度", {}).get("select") or {}).get("name")
+            if name and year:
+                yield name, year, page["id"]
+        if not res.get("has_more"):
+            break
+        cursor = res.get("next_cursor")
+
+def list_children(block_id: str) -> list[dict]:
+    children = []
+    cursor = None
+    while True:
+        res = sync.notion.blocks.children.list(block_id=block_id, start_cursor=cursor)
+        children.extend(res["results"])
+        if not res.get("has_more"):
+            break
+        cursor = res.get("next_cursor")
+    return children
+
+def copy_block(block: dict) -> dict | None:
+    """作り直せるブロック（rich_text を持ち、子ブロックのないもの）を作成用の形にする。作り直せなければ None"""
+    kind = block.get("type")
+    content = block.get(kind)
+    if block.get("has_children") or not isinstance(content, dict) or "rich_text" not in content:
+        return None
+    rich_text = [{k: v for k, v in t.items() if k in RICH_TEXT_KEYS} for t in content["rich_text"]]
+    return {"object": "block", "type": kind, kind: dict(content, rich_text=rich_text)}
+
+def copy_batches(toggles: list[tuple[str, list[dict]]]):
+    """
+    作り直す日付トグルを追加リクエスト単位に分ける（plan_toggle_batches と同じ上限）。
+    各要素は (タイトル, 作成時に入れるブロック, 作成後に追記するブロック)
+    """
+    batch, blocks, size = [], 0, 0
+    for title, children in toggles:
+        inline_bytes, n = sync.block_bytes(sync.toggle_block(title, [])), 0
+        while n < min(len(children), sync.NOTION_MAX_CHILDREN):
+            child_bytes = sync.block_bytes(children[n])
+            if inline_bytes + child_bytes > sync.NOTION_PAYLOAD_BUDGET:
+                break
+            inline_bytes += child_bytes
+            n += 1
+        inline, overflow = children[:n], children[n:]
+        if batch and (len(batch) >= sync.NOTION_MAX_CHILDREN
+                      or blocks + 1 + len(inline) > sync.NOTION_MAX_BLOCKS_PER_REQUEST
+                      or size + inline_bytes > sync.NOTION_PAYLOAD_BUDGET):
+            yield batch
+            batch, blocks, size = [], 0, 0
+        batch.append((title, inline, overflow))
+        blocks += 1 + len(inline)
+        size += inline_bytes
+    if batch:
+        yield batch
+
+def month_anchors(titles: list[tuple[str, str]], missing: list[str]) -> list[tuple[str, list[str]]]:
+    """
+    作成する月のトグルを、ページの中で日付順になる位置に入れるための [(直後に入れるブロックID, [月, ...])]。
+    titles はページ直下の月・日付のトグル (タイトル, ブロックID) の並び順。月はそれより前のタイトルの最後のトグルの
+    直後に入れ、前に何もなければ（Notion は先頭に挿入できないので）その月の最初の日付トグル（移行後にアーカイブする）の直後に入れる
+    """
+    groups: list[tuple[str, list[str]]] = []
+    for month in sorted(missing):
+        before = [block_id for title, block_id in titles if title < month]
+        anchor = before[-1] if before else next(block_id for title, block_id in titles
+                                                if sync.month_title(title) == month)
+        if groups and groups[-1][0] == anchor:
+            groups[-1][1].append(month)
+        else:
+            groups.append((anchor, [month]))
+    return groups
+
+class LayoutMigration:
+    """ページごとに、ページ直下の日付トグルを月のトグルの中へ作り直す"""
+
+    def __init__(self, dry_run: bool = False):
+        self.dry_run = dry_run
+        self.ledger = DedupLedger(os.path.join(sync.CACHE_DIR, "sync_state.sqlite"))
+        self.mirror = NotionMirror(os.path.join(sync.CACHE_DIR, "sync_state.sqlite"))
+        self.lock = threading.Lock()
+        self.progress = LayoutMigrationProgress(PROGRESS_PATH)
+        self.moved = self.skipped = self.failed = 0
+
+    def migrate_page(self, person: str, year: str, page_id: str):
+        out = [f"\n👤 {person} ({year}年度)"]
+        try:
+            moved, skipped = self._migrate_page(page_id, out)
+            with self.lock:
+                self.moved += moved
+                self.skipped += skipped
+            if not self.dry_run and not skipped:
+                self.progress.mark_done(page_id)
+        except Exception as e:
+            out.append(f"   ❌ エラーが発生しました（もう一度実行すると続きから再開します）: {e}")
+            with self.lock:
+                self.failed += 1
+        finally:
+            print("\n".join(out))
+
+    def _migrate_page(self, page_id: str, out: list[str]) -> tuple[int, int]:
+        top = [b for b in list_children(page_id) if b.get("type") == "toggle"]
+        months: dict[str, str] = {}
+        by_month: dict[str, list[tuple[str, dict]]] = {}
+        titles: list[tuple[str, str]] = []  # 月・日付のトグルの並び順
+        for b in top:
+            title = sync._plain_text(b["toggle"].get("rich_text", []))
+            if MONTH_TITLE.match(title):
+                months.setdefault(title, b["id"])
+                titles.append((title, b["id"]))
+            elif DATE_TITLE.match(title):
+                by_month.setdefault(sync.month_title(title), []).append((title, b))
+                titles.append((title, b["id"]))
+        if not by_month:
+            out.append("   ⏭️  移行する日付トグルはありません")
+            return 0, 0
+        missing = sorted(set(by_month) - set(months))
+        if self.dry_run:
+            out.append(f"   📝 CreateMonth {len(missing)} 件 / MoveToggle {sum(map(len, by_month.values()))} 件")
+            return sum(map(len, by_month.values())), 0
+
+        # 写しのトグル一覧は古くなる（last_edited_time は分単位なので、同期の直後だと変化に気づけない）
+        self.mirror.forget_children(page_id)
+        if missing:
+            for anchor, group in month_anchors(titles, missing):
+                created = sync.append_children_chunked(page_id, [sync.toggle_block(m, []) for m in group], after=anchor)
+                months.update((m, b["id"]) for m, b in zip(group, created))
+            out.append(f"   🗓️  月のトグル {len(missing)} 件を作成")
+        moved = skipped = 0
+        for month in sorted(by_month):
+            m, s = self._migrate_month(page_id, months[month], by_month[month], month in missing, out)
+            moved, skipped = moved + m, skipped + s
+        out.append(f"   ✅ 日付トグル {moved} 件を月のトグルへ移動" + (f"（{skipped} 件は移行できません）" if skipped else ""))
+        return moved, skipped
+
+    def _migrate_month(self, page_id: str, month_id: str, dates: list[tuple[str, dict]], new_month: bool,
+                       out: list[str]) -> tuple[int, int]:
+        # 前回の実行で作りかけたトグル（元のトグルがまだある日付）は捨ててからやり直す
+        if not new_month:
+            for b in list_children(month_id):
+                title = sync._plain_text((b.get(b.get("type"), {}) or {}).get("rich_text", []))
+                if b.get("type") == "toggle" and any(title == date_str for date_str, _ in dates):
+                    sync.archive_block(b["id"])
+
+        toggles, originals, skipped = [], {}, 0
+        for date_str, b in dates:
+            children = [copy_block(c) for c in list_children(b["id"])] if b.get("has_children") else []
+            if any(c is None for c in children):
+                out.append(f"   ⚠️  {date_str}: 作り直せないブロック（画像・入れ子など）があるため移行しません")
+                skipped += 1
+                continue
+            toggles.append((date_str, children))
+            originals[date_str] = b["id"]
+
+        moved = 0
+        for batch in copy_batches(toggles):
+            res = sync.notion.blocks.children.append(
+                block_id=month_id,
+                children=[{"object": "block", "type": "toggle",
+                           "toggle": {"rich_text": [{"type": "text", "text": {"content": title}}], "children": inline}}
+                          for title, inline, _ in batch],
+            )
+            for (date_str, inline, overflow), created in zip(batch, res["results"]):
+                if overflow:
+                    sync.append_children_chunked(created["id"], overflow)
+                # 台帳を新しいトグルに付け替えてから元のトグルをアーカイブする
+                texts = [sync._plain_text(c["paragraph"]["rich_text"]) for c in inline + overflow
+                         if c["type"] == "paragraph"]
+                self.ledger.move_toggle(page_id, date_str, created["id"], texts)
+                sync.archive_block(originals[date_str])
+                sync.metrics.count("layout_toggles_moved")
+                moved += 1
+        return moved, skipped
+
+    def close(self):
+        self.ledger.close()
+        self.mirror.close()
+
+def migrate(years: list[int], dry_run: bool = False):
+    sync.require_config(slack=False)
+    print(f"🚀 ユーザーページを月のトグルのレイアウトへ移行します{'（--dry-run: 書き込みません）' if dry_run else ''}...")
+    migration = LayoutMigration(dry_run)
+    pages, done = [], 0
+    for db_id in sync.notion_db_ids():
+        for person, year, page_id in iter_person_pages(db_id, years):
+            if migration.progress.is_done(page_id):
+                done += 1
+            else:
+                pages.append((person, year, page_id))
+    print(f"📄 対象 {len(pages)} ページ（移行済み {done} ページは読み飛ばします）")
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, sync.NOTION_WORKERS)) as executor:
+            list(executor.map(lambda page: migration.migrate_page(*page), pages))
+    finally:
+        migration.close()
+
+    print(f"\n📊 日付トグル {migration.moved} 件を{'移動する計画です' if dry_run else '移動しました'}"
+          f"（移行できない日付 {migration.skipped} 件、失敗したページ {migration.failed} 件）")
+    report = sync.metrics.write_report(sync.RUN_REPORT_PATH)
+    print(f"📈 実行レポート: {sync.RUN_REPORT_PATH}（{report['wall_sec']:.1f}秒）")
+    if migration.failed:
+        raise SystemExit("❌ 移行に失敗したページがあります。もう一度実行すると続きから再開します")
+    if not dry_run and sync.NOTION_LAYOUT != "month":
+        print("   同期でも月のトグルを使うには NOTION_LAYOUT=month を設定してください")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ユーザーページを月のトグル → 日付トグルのレイアウトへ移行します")
+    parser.add_argument("--year", type=int, action="append", default=[], help="移行する評価年度（複数指定可。省略時は全年度）")
+    parser.add_argument("--dry-run", action="store_true", help="移行する件数を表示するだけで、Notionには書き込まない")
+    args = parser.parse_args()
+    migrate(args.year, args.dry_run)
@@ -0,0 +1,211 @@
+"""
+日報本文のパーサー。
+テンプレート（セクション見出しの定義）の見出しを1本の正規表現に一度だけコンパイルし、
+本文を1行ずつ1回なめるだけで全セクションを取り出す。
+行頭の見出しで本文のセクションが見つからなければ、見出しで終わる行（例: 今日のやったこと）を見出しとみなしてもう一度なめる。
+"""
+
+import html
+import json
+import re
+from dataclasses import dataclass, field
+
+# 見出しの前に付きがちな装飾（Slackの太字、記号、括弧、絵文字、:white_check_mark: のような絵文字の表記）
+_DECORATION = "\\t 　*_~#■□●◆◇▼▶【\\[「(（\u2600-\u27bf\u2b00-\u2bff\U0001f000-\U0001faff\ufe0f\u200d"
+_HEADER_PREFIX = rf"[{_DECORATION}]*(?::[\w+-]+:[{_DECORATION}]*)*"
+_HEADER_SUFFIX = r"[\t 　*_~】\]」)）]*[:：]?[\t 　]*"
+
+# 箇条書きの行頭・行末から落とす文字
+BULLET_STRIP_CHARS = " ・-　"
+
+@dataclass(frozen=True)
+class ReportTemplate:
+    """
+    日報テンプレート。
+      sections: セクション名 → 見出しの候補
+      target:   Notionに書き込むセクション名
+    """
+    name: str
+    sections: dict[str, tuple[str, ...]]
+    target: str = "done"
+
+DEFAULT_TEMPLATES = [
+    ReportTemplate(
+        name="daily",
+        sections={
+            "done": ("やったこと", "今日やったこと", "本日やったこと"),
+            "next": ("次にやること",),
+            "comment": ("ひとこと",),
+        },
+    ),
+]
+
+def load_templates(path: str) -> list[ReportTemplate]:
+    """
+    JSONファイルからテンプレートを読み込む。形式:
+      [{"name": "...", "target": "done", "sections": {"done": ["..."], "next": ["..."]}}]
+    """
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    return [
+        ReportTemplate(
+            name=t["name"],
+            sections={key: tuple(aliases) for key, aliases in t["sections"].items()},
+            target=t.get("target", "done"),
+        )
+        for t in raw
+    ]
+
+@dataclass
+class ParsedReport:
+    template: ReportTemplate | None
+    sections: dict[str, list[str]] = field(default_factory=dict)  # セクション名 → 生の行
+
+    def text(self, section: str | None = None) -> str:
+        """セクション本文（前後の空白と3行以上の空行を整えたもの）"""
+        key = section or (self.template.target if self.template else None)
+        body = "\n".join(self.sections.get(key, [])).strip()
+        return re.sub(r"\n{3,}", "\n\n", body)
+
+    def items(self, section: str | None = None) -> list[str]:
+        """セクションを箇条書きの行に分割（・ / - / 全角スペースなどを落とす）"""
+        key = section or (self.template.target if self.template else None)
+        items = []
+        for line in self.sections.get(key, []):
+            if line.strip():
+                item = line.strip(BULLET_STRIP_CHARS)
+                if item:
+                    items.append(item)
+        return items
+
+class ReportParser:
+    """複数テンプレートの見出しをまとめてコンパイルした1パスのパーサー"""
+
+    def __init__(self, templates: list[ReportTemplate]):
+        self.templates = list(templates)
+        self._groups: dict[str, tuple[ReportTemplate, str]] = {}  # 正規表現グループ名 → (テンプレート, セクション)
+        seen: dict[str, str] = {}
+        alternatives = []
+        for t_i, template in enumerate(self.templates):
+            if template.target not in template.sections:
+                raise ValueError(f"テンプレート {template.name}: target '{template.target}' がセクションにありません")
+            for s_i, (section, aliases) in enumerate(template.sections.items()):
+                for alias in aliases:
+                    if alias in seen:
+                        raise ValueError(f"見出し '{alias}' が {seen[alias]} と {template.name} で重複しています")
+                    seen[alias] = template.name
+                group = f"t{t_i}s{s_i}"
+                self._groups[group] = (template, section)
+                # 長い候補から試す（「今日やったこと」と「やったこと」など）
+                ordered = sorted(aliases, key=len, reverse=True)
+                alternatives.append(f"(?P<{group}>{'|'.join(re.escape(a) for a in ordered)})")
+        # 見出しの直後が語の続き（例: ひとことメモ）なら見出しとみなさない
+        self._header = re.compile(
+            rf"{_HEADER_PREFIX}(?:{'|'.join(alternatives)})(?!\w){_HEADER_SUFFIX}"
+        )
+        # 行のどこにあってもよいが、行末で終わる見出し（変更前の実装と同じく「今日のやったこと」なども拾う）
+        self._loose_header = re.compile(rf"(?:{'|'.join(alternatives)}){_HEADER_SUFFIX}$")
+        # 見出しになり得る行頭の文字。これ以外で始まる行は正規表現にかけない（絵文字は範囲で判定する）
+        self._header_starts = frozenset(
+            "\t 　*_~#■□●◆◇▼▶【[「(（:" + "".join(a[0] for a in seen)
+        )
+
+    def parse(self, text: str) -> ParsedReport:
+        lines = text.split("\n")
+        report = self._parse(lines, self._match_header)
+        if report.template is None:
+            report = self._parse(lines, self._loose_header.search)
+        return report
+
+    def _match_header(self, line: str):
+        if not line:
+            return None
+        c = line[0]
+        if c in self._header_starts or "\u2600" <= c <= "\u2bff" or c >= "\U0001f000":
+            return self._header.match(line)
+        return None
+
+    def _parse(self, lines: list[str], match_header) -> ParsedReport:
+        report = ParsedReport(template=None)
+        current: list[str] | None = None
+        for line in lines:
+            m = match_header(line)
+            if m is None:
+                if current is not None:
+                    current.append(line)
+                continue
+            template, section = self._groups[m.lastgroup]
+            if report.template is None and section == template.target:
+                report.template = template
+            current = report.sections.setdefault(section, [])
+            # 見出しと同じ行に続く本文（例: 「ひとこと：眠い」）
+            rest = line[m.end():]
+            if rest.strip():
+                current.append(rest)
+        return report
+
+# Slack の text で使われる書式の記号（外側から順に付ける）
+_STYLE_MARKS = (("bold", "*"), ("italic", "_"), ("strike", "~"), ("code", "`"))
+
+def _render_text(el: dict) -> str:
+    # text と同じく &, <, > はエスケープし、書式は記号で囲む（書き込み済みの行と同じ表記にしてハッシュをそろえる）
+    text = html.escape(el.get("text", ""), quote=False)
+    style = el.get("style") or {}
+    if not text.strip():
+        return text
+    for key, mark in reversed(_STYLE_MARKS):
+        if style.get(key):
+            text = f"{mark}{text}{mark}"
+    return text
+
+def _render_elements(elements: list[dict]) -> str:
+    """rich_text の要素をSlackの text フォールバックと同じ表記に戻す"""
+    out = []
+    for el in elements:
+        t = el.get("type")
+        if t == "text":
+            out.append(_render_text(el))
+        elif t == "link":
+            url, label = el.get("url", ""), el.get("text")
+            out.append(f"<{url}|{label}>" if label else f"<{url}>")
+        elif t == "user":
+            out.append(f"<@{el.get('user_id', '')}>")
+        elif t == "channel":
+            out.append(f"<#{el.get('channel_id', '')}>")
+        elif t == "usergroup":
+            out.append(f"<!subteam^{el.get('usergroup_id', '')}>")
+        elif t == "broadcast":
+            out.append(f"<!{el.get('range', 'here')}>")
+        elif t == "emoji":
+            out.append(f":{el.get('name', '')}:")
+        elif t == "date":
+            out.append(el.get("fallback", ""))
+    return "".join(out)
+
+_LIST_BULLETS = ("• ", "◦ ", "▪︎ ")
+
+def text_from_blocks(blocks: list[dict]) -> str:
+    """Slackのリッチテキスト blocks を本文テキストに変換（rich_text がなければ空文字）"""
+    parts = []
+    for block in blocks or []:
+        if block.get("type") != "rich_text":
+            continue
+        for el in block.get("elements", []):
+            t = el.get("type")
+            if t == "rich_text_section":
+                parts.append(_render_elements(el.get("elements", [])))
+            elif t == "rich_text_list":
+                indent = el.get("indent", 0)
+                for n, item in enumerate(el.get("elements", []), start=el.get("offset", 0) + 1):
+                    marker = f"{n}. " if el.get("style") == "ordered" else _LIST_BULLETS[min(indent, 2)]
+                    parts.append("    " * indent + marker + _render_elements(item.get("elements", [])) + "\n")
+            elif t == "rich_text_preformatted":
+                parts.append("```" + _render_elements(el.get("elements", [])) + "```\n")
+            elif t == "rich_text_quote":
+                parts.append("> " + _render_elements(el.get("elements", [])).replace("\n", "\n> ") + "\n")
+    return "".join(parts).rstrip("\n")
+
+def message_text(msg: dict) -> str:
+    """メッセージ本文。リッチテキストの blocks があればそれを優先し、なければ text を使う"""
+    text = text_from_blocks(msg.get("blocks") or [])
+    return text if text.strip() else msg.get("text", "")
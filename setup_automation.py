@@ -7,9 +7,10 @@ import os
 import sys
 import subprocess
 import json
-import requests
 from pathlib import Path
 
+from doctor import STATUS_ICONS, TITLE_PROPERTY, YEAR_PROPERTY, Doctor
+
 # ====== 設定情報 ======
 GITHUB_TOKEN = None  # ユーザーが入力
 REPO_NAME = "slack-daily-reports-sync"
@@ -106,101 +107,30 @@ def setup_github_secrets():
     print("✅ 全てのSecrets設定完了")
     return True
 
+def _run_doctor_checks(prefix: str) -> bool:
+    """doctor.py のチェック（名前が prefix で始まるもの）を並列に実行して結果を表示する（失敗がなければ True）"""
+    doctor = Doctor(SLACK_BOT_TOKEN, NOTION_TOKEN)
+    try:
+        checks = [c for c in doctor.checks({SLACK_CHANNEL_ID: NOTION_DB_ID}) if c[0].startswith(prefix)]
+        results = doctor.run(checks)
+    finally:
+        doctor.close()
+    for r in results:
+        print(f"{STATUS_ICONS[r.status]} {r.name}: {r.detail}（{r.latency_ms:.0f}ms）")
+    return not any(r.status == "fail" for r in results)
+
 def check_notion_database():
-    """Notionデータベースの構造を確認"""
+    """Notionデータベースの構造（メンバー名・評価年度）とページ作成を確認"""
     print_step(3, "Notionデータベースの確認")
-    
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        # データベース情報を取得
-        response = requests.get(f"https://api.notion.com/v1/databases/{NOTION_DB_ID}", headers=headers)
-        
-        if response.status_code == 200:
-            db_info = response.json()
-            print("✅ Notionデータベースにアクセス成功")
-            
-            # プロパティを確認
-            properties = db_info.get("properties", {})
-            name_property = None
-            
-            for prop_name, prop_info in properties.items():
-                if prop_info.get("type") == "title":
-                    name_property = prop_name
-                    break
-            
-            if name_property:
-                print(f"✅ Titleプロパティ名: '{name_property}'")
-                if name_property != "Name":
-                    print(f"⚠️  注意: Titleプロパティ名が'Name'ではありません")
-                    print(f"   現在: '{name_property}' → コード修正が必要")
-            else:
-                print("❌ Titleプロパティが見つかりません")
-                return False
-                
-        else:
-            print(f"❌ Notionデータベースアクセス失敗: {response.status_code}")
-            print(f"   エラー: {response.text}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Notion API呼び出しエラー: {e}")
+    if not _run_doctor_checks("notion."):
+        print(f"   データベースに '{TITLE_PROPERTY}'（タイトル）と '{YEAR_PROPERTY}'（セレクト）のプロパティが必要です")
         return False
-    
     return True
 
 def check_slack_bot():
-    """Slack Botの権限を確認"""
+    """Slack Botの認証・権限・チャンネル参加を確認"""
     print_step(4, "Slack Botの確認")
-    
-    headers = {
-        "Authorization": f"Bearer {SLACK_BOT_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        # Bot情報を取得
-        response = requests.get("https://slack.com/api/auth.test", headers=headers)
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get("ok"):
-                print("✅ Slack Bot認証成功")
-                print(f"   ボット名: {result.get('user')}")
-                print(f"   チーム: {result.get('team')}")
-                
-                # チャンネル情報を取得
-                channel_response = requests.get(
-                    f"https://slack.com/api/conversations.info?channel={SLACK_CHANNEL_ID}",
-                    headers=headers
-                )
-                
-                if channel_response.status_code == 200:
-                    channel_result = channel_response.json()
-                    if channel_result.get("ok"):
-                        print(f"✅ チャンネルアクセス成功: {channel_result['channel']['name']}")
-                    else:
-                        print(f"❌ チャンネルアクセス失敗: {channel_result.get('error')}")
-                        print("   Botをチャンネルに招待してください: /invite @ボット名")
-                else:
-                    print("❌ チャンネル情報取得失敗")
-                    
-            else:
-                print(f"❌ Slack Bot認証失敗: {result.get('error')}")
-                return False
-        else:
-            print(f"❌ Slack API呼び出し失敗: {response.status_code}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Slack API呼び出しエラー: {e}")
-        return False
-    
-    return True
+    return _run_doctor_checks("slack.")
 
 def test_workflow():
     """GitHub Actionsワークフローをテスト実行"""
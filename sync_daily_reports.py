@@ -1,34 +1,132 @@
+import argparse
+import bisect
+import difflib
+import hashlib
+import json
 import os
-import re
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from operator import attrgetter
 
+import httpx
 import pytz
 from slack_sdk.web import WebClient
 from slack_sdk.errors import SlackApiError
 from notion_client import Client as NotionClient
 
+from http_client import HttpClient, NotionTransport, RateLimiter, RetryPolicy, SlackWebClient
+from report_parser import DEFAULT_TEMPLATES, ReportParser, load_templates, message_text
+from sync_metrics import RunMetrics
+from sync_state import (BackfillProgress, CheckpointStore, DedupLedger, NotionMirror, RunJournal, done_days,
+                        line_hash, utc_now_iso, write_json_atomic)
+
 # ====== 環境変数 ======
 SLACK_BOT_TOKEN  = os.getenv("SLACK_BOT_TOKEN")
 SLACK_CHANNEL_ID = os.getenv("SLACK_CHANNEL_ID")
 NOTION_TOKEN     = os.getenv("NOTION_TOKEN")
 NOTION_DB_ID     = os.getenv("NOTION_DB_ID")
+# APIの接続先（ベンチマークでローカルのスタンドインに向けるときだけ指定）
+SLACK_API_URL    = os.getenv("SLACK_API_URL", "https://slack.com/api/")
+NOTION_API_URL   = os.getenv("NOTION_API_URL", "https://api.notion.com")
+
+# 複数チャンネルを同期する場合: "C1,C2"（すべて NOTION_DB_ID へ）または "C1:<DB ID>,C2:<DB ID>"
+SLACK_CHANNEL_IDS = os.getenv("SLACK_CHANNEL_IDS")
+
+# ログの詳細度: info（デフォルト）/ debug（メッセージごとの解析ログも出す）
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").lower()
+
+def parse_channel_db_map(channel_ids: str | None, default_db_id: str | None) -> dict[str, str | None]:
+    """SLACK_CHANNEL_IDS / SLACK_CHANNEL_ID → {チャンネルID: 書き込み先のDB ID}（DBの指定がなければ default_db_id）"""
+    channel_db_map = {}
+    for entry in (channel_ids or "").split(","):
+        channel, _, db_id = entry.strip().partition(":")
+        if channel:
+            channel_db_map[channel] = db_id.strip() or default_db_id
+    return channel_db_map
+
+# チャンネルID → 書き込み先のNotionデータベースID（doctor.py も同じものを使う）
+CHANNEL_DB_MAP: dict[str, str] = parse_channel_db_map(SLACK_CHANNEL_IDS or SLACK_CHANNEL_ID, NOTION_DB_ID)
 
-if not all([SLACK_BOT_TOKEN, SLACK_CHANNEL_ID, NOTION_TOKEN, NOTION_DB_ID]):
-    raise RuntimeError("環境変数が足りません。SLACK_BOT_TOKEN, SLACK_CHANNEL_ID, NOTION_TOKEN, NOTION_DB_ID を設定してください。")
+def notion_db_ids() -> list[str]:
+    """書き込み先のNotionデータベース（チャンネルの指定がなければ NOTION_DB_ID）"""
+    return sorted(set(CHANNEL_DB_MAP.values()) if CHANNEL_DB_MAP else {NOTION_DB_ID} - {None})
+
+def require_config(slack: bool = True):
+    """
+    実行に必要な環境変数を確かめる（読み込み時には確かめないので、各コマンドの最初に呼ぶ）。
+    Notionだけを使うコマンド（migrate_layout.py）は slack=False
+    """
+    ok = NOTION_TOKEN and notion_db_ids() and all(CHANNEL_DB_MAP.values())
+    if slack:
+        ok = ok and SLACK_BOT_TOKEN and CHANNEL_DB_MAP
+    if not ok:
+        if slack:
+            raise RuntimeError("環境変数が足りません。SLACK_BOT_TOKEN, SLACK_CHANNEL_ID（または SLACK_CHANNEL_IDS）, NOTION_TOKEN, NOTION_DB_ID を設定してください。")
+        raise RuntimeError("環境変数が足りません。NOTION_TOKEN, NOTION_DB_ID（または SLACK_CHANNEL_IDS の書き込み先）を設定してください。")
 
 # ====== クライアント ======
-slack  = WebClient(token=SLACK_BOT_TOKEN)
-notion = NotionClient(auth=NOTION_TOKEN)
+NOTION_RATE_PER_SEC = float(os.getenv("NOTION_RATE_PER_SEC", "3"))  # Notion API の平均リクエスト上限
+# 429 / 5xx / 接続エラーの再試行回数（旧名 NOTION_MAX_RETRIES も読む）
+HTTP_MAX_RETRIES    = int(os.getenv("HTTP_MAX_RETRIES", os.getenv("NOTION_MAX_RETRIES", "5")))
+HTTP_MAX_PER_HOST   = int(os.getenv("HTTP_MAX_PER_HOST", "8"))      # ホストごとの同時接続数
+NOTION_WORKERS      = int(os.getenv("NOTION_WORKERS", "4"))         # 並列に処理するページ数
+NOTION_APPEND_PIPELINE = int(os.getenv("NOTION_APPEND_PIPELINE", "4"))  # 並列に進める、長い日の続きの追記の数
+SLACK_FETCH_WORKERS = int(os.getenv("SLACK_FETCH_WORKERS", "4"))    # 並列に履歴を取得するチャンネル数
+SLACK_REPLY_WORKERS = int(os.getenv("SLACK_REPLY_WORKERS", "4"))    # 並列に返信を取得するスレッド数
+
+# 実行1回分の計測（API呼び出し・レート制限の待ち・処理段階ごとの時間）
+metrics = RunMetrics()
+
+def debug(message: str):
+    if LOG_LEVEL == "debug":
+        print(message)
+
+# Slack / Notion とも共有のHTTP層（接続プール・再試行・Retry-After・ホストごとの同時接続数の上限）を通す
+http = HttpClient(
+    RetryPolicy(max_retries=HTTP_MAX_RETRIES),
+    max_per_host=HTTP_MAX_PER_HOST,
+    limiters={"notion": RateLimiter(NOTION_RATE_PER_SEC)},
+    metrics=metrics,
+)
+slack  = SlackWebClient(http, token=SLACK_BOT_TOKEN, base_url=SLACK_API_URL)
+notion = NotionClient(auth=NOTION_TOKEN, base_url=NOTION_API_URL, client=httpx.Client(transport=NotionTransport(http)))
 
 # ====== 設定 ======
 JST = pytz.timezone("Asia/Tokyo")
 LOOKBACK_DAYS = int(os.getenv("LOOKBACK_DAYS", "3"))  # 直近何日分見るか（保険）
+# スレッドの返信も日報として取り込むか（親が遡及期間内のスレッドのみ）
+INCLUDE_THREADS = os.getenv("INCLUDE_THREADS", "").lower() in ("1", "true", "yes")
+
+# 実行間で引き継ぐキャッシュ（GitHub Actions では actions/cache で保存）
+CACHE_DIR = os.getenv("SYNC_CACHE_DIR", ".sync_cache")
+USER_CACHE_TTL_HOURS = float(os.getenv("USER_CACHE_TTL_HOURS", "24"))  # ユーザー一覧キャッシュの有効期間
+# Notion DBの写しを差分ではなく全件で取り直す間隔（削除・アーカイブされたページを写しから消すため）
+NOTION_MIRROR_MAX_AGE_HOURS = float(os.getenv("NOTION_MIRROR_MAX_AGE_HOURS", "168"))
+# 実行レポート（JSON）の出力先
+RUN_REPORT_PATH = os.getenv("RUN_REPORT_PATH", os.path.join(CACHE_DIR, "run_report.json"))
 
 # 評価期間の設定
 EVALUATION_START_MONTH = 4  # 4月開始
 EVALUATION_START_DAY = 1    # 1日開始
 
+# ユーザーページ内のトグルの並べ方
+#   flat:  ページ直下に日付トグル（YYYY-MM-DD）を並べる
+#   month: ページ直下に月のトグル（YYYY-MM）を置き、その中に日付トグルを並べる（migrate_layout.py で移行）
+NOTION_LAYOUT = os.getenv("NOTION_LAYOUT", "flat").lower()
+if NOTION_LAYOUT not in ("flat", "month"):
+    raise RuntimeError(f"NOTION_LAYOUT は flat か month を指定してください（{NOTION_LAYOUT}）")
+
+# バックフィル（backfill --year）で並列に取得する時間窓の日数
+BACKFILL_WINDOW_DAYS = int(os.getenv("BACKFILL_WINDOW_DAYS", "7"))
+
+# 日報テンプレート（見出しの定義）。REPORT_TEMPLATES に JSON ファイルを指定すると差し替えられる
+REPORT_TEMPLATES = load_templates(os.environ["REPORT_TEMPLATES"]) if os.getenv("REPORT_TEMPLATES") else DEFAULT_TEMPLATES
+REPORT_PARSER = ReportParser(REPORT_TEMPLATES)
+
 # 必要なら Slack名→Notion名の手動マッピング（任意）
 NAME_ALIAS_MAP = {
     # "Ayumu Miyamoto": "宮本 渉 / Ayumu Miyamoto",
@@ -51,6 +149,18 @@ def get_evaluation_year(date: datetime) -> int:
     else:
         return year - 1
 
+@lru_cache(maxsize=None)
+def evaluation_year_of(date_str: str) -> int:
+    """YYYY-MM-DD の評価年度（get_evaluation_year と同じ。メッセージごとに datetime を作らない）"""
+    year, month = int(date_str[:4]), int(date_str[5:7])
+    return year if month >= EVALUATION_START_MONTH else year - 1
+
+def evaluation_year_range(evaluation_year: int) -> tuple[float, float]:
+    """評価年度の期間 [開始, 終了) を UNIX 秒で返す（例: 2025 → 2025-04-01 00:00 JST 〜 2026-04-01 00:00 JST）"""
+    start = JST.localize(datetime(evaluation_year, EVALUATION_START_MONTH, EVALUATION_START_DAY))
+    end = JST.localize(datetime(evaluation_year + 1, EVALUATION_START_MONTH, EVALUATION_START_DAY))
+    return start.timestamp(), end.timestamp()
+
 def jst_date_str_from_ts(ts: str) -> str:
     # Slack ts は "1733745342.123456" 形式の文字列
     sec = float(ts.split(".")[0])
@@ -58,37 +168,279 @@ def jst_date_str_from_ts(ts: str) -> str:
     dt_jst = dt_utc.astimezone(JST)
     return dt_jst.strftime("%Y-%m-%d")
 
+def jst_day_start(date_str: str) -> float:
+    """YYYY-MM-DD（JST）の0時の UNIX 秒"""
+    return JST.localize(datetime.strptime(date_str, "%Y-%m-%d")).timestamp()
+
+class JstDayTable:
+    """
+    [oldest, latest) の JST の日付境界の表。ts の日付を、メッセージごとに datetime を作らず二分探索で引く。
+    表の範囲外の ts は jst_date_str_from_ts と同じく変換する。
+    """
+
+    def __init__(self, oldest: float, latest: float):
+        self.oldest, self.latest = oldest, latest
+        self.starts: list[float] = []
+        self.dates: list[str] = []
+        for date_str, start, _ in jst_day_windows(oldest, latest):
+            self.starts.append(start)
+            self.dates.append(date_str)
+
+    def date_of(self, ts_sec: float) -> str:
+        if self.oldest <= ts_sec < self.latest:
+            return self.dates[bisect.bisect_right(self.starts, ts_sec) - 1]
+        return datetime.fromtimestamp(int(ts_sec), tz=JST).strftime("%Y-%m-%d")
+
 def extract_done_section(text: str) -> str:
     """
     本文から「やったこと」だけを抽出。
     パターン:
       やったこと\n...（ここを抽出）...\n次にやること|ひとこと|$ まで
+    見出しの定義は REPORT_TEMPLATES（report_parser.ReportParser）
     """
-    # 改行のゆらぎ/全角スペース等にやや強め
-    pat = re.compile(
-        r"やったこと[\t 　]*\n([\s\S]*?)(?:\n(?:次にやること|ひとこと)\b|$)",
-        re.IGNORECASE
-    )
-    m = pat.search(text)
-    if not m:
-        return ""
-    done = m.group(1).strip()
-    # 先頭・末尾の装飾ゴミ掃除
-    done = re.sub(r"\n{3,}", "\n\n", done)
-    return done
+    return REPORT_PARSER.parse(text).text()
 
-def get_user_name(user_id: str) -> str:
-    try:
-        u = slack.users_info(user=user_id)["user"]
+class UserDirectory:
+    """
+    Slackユーザー名のディレクトリ。
+    users.list をページングして一度だけ全件取得し、プロセス内でメモ化しつつ
+    ディスクにもTTL付きで保存する。NAME_ALIAS_MAP は構築時に一度だけ適用する。
+    複数チャンネルの取得スレッドから共有されるので、参照・更新はロックの中で行う。
+    """
+
+    def __init__(self, client: WebClient, cache_path: str, ttl_sec: float):
+        self.client = client
+        self.cache_path = cache_path
+        self.ttl_sec = ttl_sec
+        self.names: dict[str, str] = {}
+        self.fetched_at: dict[str, float] = {}  # user_id → 取得時刻（ユーザー単位の失効用）
+        self.loaded = False
+        self.dirty = False
+        self.offline = False  # True なら一覧にないユーザーも users.info で引かない（エクスポートの取り込み用）
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def _alias_key() -> str:
+        # エイリアス設定が変わったらキャッシュを作り直す
+        raw = json.dumps(NAME_ALIAS_MAP, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _display_name(u: dict) -> str:
         # display_name > real_name の順で使用
-        name = (u.get("profile", {}) or {}).get("display_name_normalized") or u.get("real_name") or user_id
+        name = (u.get("profile", {}) or {}).get("display_name_normalized") or u.get("real_name") or u.get("id")
         return NAME_ALIAS_MAP.get(name, name)
-    except SlackApiError:
-        return user_id
+
+    def _load_from_disk(self) -> bool:
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("alias_key") != self._alias_key():
+            return False
+        if time.time() - data.get("fetched_at", 0) > self.ttl_sec:
+            return False
+        for user_id, entry in data.get("users", {}).items():
+            self.names[user_id] = entry["name"]
+            self.fetched_at[user_id] = entry["fetched_at"]
+        return True
+
+    def _load_from_api(self):
+        now = time.time()
+        cursor = None
+        while True:
+            resp = self.client.users_list(limit=200, cursor=cursor)
+            for u in resp.get("members", []):
+                self.names[u["id"]] = self._display_name(u)
+                self.fetched_at[u["id"]] = now
+            cursor = (resp.get("response_metadata", {}) or {}).get("next_cursor")
+            if not cursor:
+                break
+        self.dirty = True
+
+    def load(self):
+        with self.lock:
+            self._load()
+
+    def _load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        if self._load_from_disk():
+            print(f"👥 ユーザー一覧をキャッシュから読み込みました: {len(self.names)} 名")
+            return
+        try:
+            self._load_from_api()
+            print(f"👥 ユーザー一覧を取得しました: {len(self.names)} 名")
+        except SlackApiError as e:
+            # users.list が使えなくても users.info で個別に引ける
+            print(f"⚠️  ユーザー一覧の取得に失敗しました: {e.response['error']}")
+
+    def seed(self, members: list[dict]):
+        """
+        users.list の代わりに、エクスポートの users.json などから一覧を作る。
+        以降は Slack API を呼ばない（一覧にないIDはIDのまま使う）
+        """
+        with self.lock:
+            now = time.time()
+            for u in members:
+                self.names[u["id"]] = self._display_name(u)
+                self.fetched_at[u["id"]] = now
+            self.loaded = True
+            self.offline = True
+            self.dirty = True
+
+    def invalidate(self, user_id: str):
+        """1ユーザー分のキャッシュを破棄（次回参照時に users.info で再取得）"""
+        with self.lock:
+            self.names.pop(user_id, None)
+            self.fetched_at.pop(user_id, None)
+            self.dirty = True
+
+    def name(self, user_id: str) -> str:
+        with self.lock:
+            return self._name(user_id)
+
+    def _name(self, user_id: str) -> str:
+        self._load()
+        fetched_at = self.fetched_at.get(user_id)
+        if fetched_at is not None and not self.offline and time.time() - fetched_at > self.ttl_sec:
+            self.invalidate(user_id)
+        if user_id in self.names:
+            return self.names[user_id]
+        if self.offline:
+            return user_id
+        # 一覧取得後に参加したユーザーなど
+        try:
+            u = self.client.users_info(user=user_id)["user"]
+        except SlackApiError:
+            # 存在しないIDは永続化せず、この実行中だけ覚えておく
+            self.names[user_id] = user_id
+            return user_id
+        self.names[user_id] = self._display_name(u)
+        self.fetched_at[user_id] = time.time()
+        self.dirty = True
+        return self.names[user_id]
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        if not self.dirty:
+            return
+        users = {
+            user_id: {"name": self.names[user_id], "fetched_at": fetched_at}
+            for user_id, fetched_at in self.fetched_at.items()
+            if user_id in self.names
+        }
+        data = {
+            "alias_key": self._alias_key(),
+            "fetched_at": min(self.fetched_at.values(), default=time.time()),
+            "users": users,
+        }
+        write_json_atomic(self.cache_path, data)
+        self.dirty = False
+
+user_directory = UserDirectory(slack, os.path.join(CACHE_DIR, "users.json"), USER_CACHE_TTL_HOURS * 3600)
+
+def get_user_name(user_id: str) -> str:
+    return user_directory.name(user_id)
 
 # ====== Notion Interactions ======
-def ensure_person_page(notion_db_id: str, person_name: str, evaluation_year: int) -> str:
-    """DB内に人のページがなければ作り、ページIDを返す（評価年度プロパティ付き）"""
+def _plain_text(rich: list[dict]) -> str:
+    return "".join([t.get("plain_text", "") for t in rich])
+
+class PersonPageIndex:
+    """
+    (メンバー名, 評価年度) → ページID の索引。
+    ローカルの写し（NotionMirror）を、前回の問い合わせ以降に編集されたページだけDBから取って更新して作る。
+    写しがない年度や NOTION_MIRROR_MAX_AGE_HOURS を過ぎた年度は全件を取り直す。実行中に作ったページも追加する。
+    作成の応答が失われた（作られたか分からない）ページは、次に引くときにDBへ問い合わせ直す。
+    """
+
+    def __init__(self, notion_db_id: str, mirror: NotionMirror):
+        self.notion_db_id = notion_db_id
+        self.mirror = mirror
+        self.pages: dict[tuple[str, int], str] = {}
+        self.years: set[int] = set()
+        self.created: set[str] = set()  # この実行で作成した（子ブロックが空の）ページ
+        self.unsure: set[tuple[str, int]] = set()  # 作成に失敗した（作られているかもしれない）ページ
+
+    def _query(self, evaluation_year: int, since: str | None) -> list[tuple[str, str, str | None]]:
+        year_filter = {"property": "評価年度", "select": {"equals": str(evaluation_year)}}
+        if since is not None:
+            # last_edited_time は分単位なので、前回の問い合わせ時刻の1分前から取る
+            since = (datetime.fromisoformat(since) - timedelta(minutes=1)).isoformat()
+            year_filter = {"and": [year_filter,
+                                   {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}]}
+        found = []
+        cursor = None
+        while True:
+            res = notion.databases.query(
+                **{
+                    "database_id": self.notion_db_id,
+                    "filter": year_filter,
+                    "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
+                    "start_cursor": cursor,
+                    "page_size": 100,
+                }
+            )
+            for page in res["results"]:
+                props = page.get("properties", {})
+                name = _plain_text(props.get("メンバー名", {}).get("title", []))
+                year = (props.get("評価年度", {}).get("select") or {}).get("name")
+                if name and year == str(evaluation_year):
+                    found.append((name, page["id"], page.get("last_edited_time")))
+            if not res.get("has_more"):
+                break
+            cursor = res.get("next_cursor")
+        return found
+
+    def load(self, evaluation_years):
+        years = sorted(set(evaluation_years) - self.years)
+        if not years:
+            return
+        for year in years:
+            started = utc_now_iso()
+            last = self.mirror.last_query(self.notion_db_id, year)
+            full = last is None or (
+                datetime.now(timezone.utc) - datetime.fromisoformat(last[1])
+            ).total_seconds() > NOTION_MIRROR_MAX_AGE_HOURS * 3600
+            found = self._query(year, None if full else last[0])
+            self.mirror.update_pages(self.notion_db_id, year, found, started, full)
+            metrics.count("mirror_full_queries" if full else "mirror_incremental_queries")
+            metrics.count("mirror_pages_changed", len(found))
+            mode = "全件" if full else "差分"
+            print(f"🗂️  ユーザーページ索引を更新（{year}年度・{mode}）: 変更 {len(found)} ページ")
+        self.pages.update(self.mirror.pages(self.notion_db_id, years))
+        self.years.update(years)
+        print(f"🗂️  ユーザーページ索引: {len(self.pages)} ページ（{', '.join(map(str, years))}年度）")
+
+    def get(self, person_name: str, evaluation_year: int) -> str | None:
+        return self.pages.get((person_name, evaluation_year))
+
+    def put(self, person_name: str, evaluation_year: int, page_id: str, last_edited_time: str | None = None):
+        self.pages[(person_name, evaluation_year)] = page_id
+        self.unsure.discard((person_name, evaluation_year))
+        self.mirror.put_page(self.notion_db_id, person_name, evaluation_year, page_id, last_edited_time)
+
+    def forget(self, person_name: str, evaluation_year: int):
+        """ページの作成が失敗したときに呼ぶ（応答が失われただけで作られている場合に、二重に作らないため）"""
+        self.pages.pop((person_name, evaluation_year), None)
+        self.unsure.add((person_name, evaluation_year))
+
+    def found(self, person_name: str, evaluation_year: int, page_id: str):
+        """問い合わせ直して見つかったページを登録する（子ブロックは一覧を取って確かめる）"""
+        self.pages[(person_name, evaluation_year)] = page_id
+        self.unsure.discard((person_name, evaluation_year))
+
+def find_person_page(notion_db_id: str, person_name: str, evaluation_year: int,
+                     index: PersonPageIndex | None = None) -> str | None:
+    """DB内の人のページIDを探す（なければ None）"""
+    if index is not None and evaluation_year in index.years and (person_name, evaluation_year) not in index.unsure:
+        return index.get(person_name, evaluation_year)
     res = notion.databases.query(
         **{
             "database_id": notion_db_id,
@@ -106,9 +458,22 @@ def ensure_person_page(notion_db_id: str, person_name: str, evaluation_year: int
             }
         }
     )
-    if res["results"]:
-        return res["results"][0]["id"]
+    page_id = res["results"][0]["id"] if res["results"] else None
+    if page_id and index is not None:
+        index.found(person_name, evaluation_year, page_id)
+    return page_id
+
+def ensure_person_page(notion_db_id: str, person_name: str, evaluation_year: int,
+                       index: PersonPageIndex | None = None) -> str:
+    """DB内に人のページがなければ作り、ページIDを返す（評価年度プロパティ付き）"""
+    page_id = find_person_page(notion_db_id, person_name, evaluation_year, index)
+    if page_id:
+        return page_id
+    return create_person_page(notion_db_id, person_name, evaluation_year, index)
 
+def create_person_page(notion_db_id: str, person_name: str, evaluation_year: int,
+                       index: PersonPageIndex | None = None) -> str:
+    """人のページを作成し、ページIDを返す（評価年度プロパティ付き）"""
     created = notion.pages.create(
         **{
             "parent": {"database_id": notion_db_id},
@@ -118,198 +483,1609 @@ def ensure_person_page(notion_db_id: str, person_name: str, evaluation_year: int
             }
         }
     )
+    if index is not None:
+        index.put(person_name, evaluation_year, created["id"], created.get("last_edited_time"))
+        index.created.add(created["id"])
     return created["id"]
 
 
 
-def find_toggle_block_by_title(page_id: str, title: str) -> str | None:
-    """ページ直下のトグルでタイトルが完全一致するものを探す"""
+def iter_toggle_blocks(page_id: str):
+    """ページ直下のトグルブロックを (タイトル, ブロック) で列挙"""
     cursor = None
     while True:
         children = notion.blocks.children.list(block_id=page_id, start_cursor=cursor)
         for b in children["results"]:
             if b.get("type") == "toggle":
-                rich = b["toggle"].get("rich_text", [])
-                txt = "".join([t.get("plain_text", "") for t in rich])
-                if txt == title:
-                    return b["id"]
+                yield _plain_text(b["toggle"].get("rich_text", [])), b
         if not children.get("has_more"):
             break
         cursor = children.get("next_cursor")
+
+class ToggleIndex:
+    """
+    ページID（または月のトグルID） → {タイトル → トグルブロックID}。
+    ページ・月のトグルごとに、写し（NotionMirror）が信用できればそれを使い、できなければ子ブロック一覧を一度だけ取得する。
+    実行中に作ったトグルも追加する。
+    """
+
+    def __init__(self, mirror: NotionMirror | None = None):
+        self.mirror = mirror
+        self.pages: dict[str, dict[str, str]] = {}
+        self.last_edited: dict[str, str] = {}  # トグルID → last_edited_time（台帳の鮮度判定用）
+        self.parents: dict[str, str] = {}  # 月のトグルID → ページID
+        self.containers: dict[str, set[str]] = {}  # ページID → この実行で一覧を確認した月のトグルID
+        self.stale: set[str] = set()  # 写しを使わずに一覧を取り直すページ・月のトグル
+
+    def _toggles(self, block_id: str) -> dict[str, str]:
+        if block_id not in self.pages:
+            page_id = self.parents.get(block_id)
+            if self.mirror is not None and block_id not in self.stale and self.mirror.is_trusted(block_id):
+                cached = self.mirror.toggles(block_id)
+                metrics.count("pages_from_mirror")
+            else:
+                synced_at = utc_now_iso()
+                cached: dict[str, tuple[str, str | None]] = {}
+                for title, b in iter_toggle_blocks(block_id):
+                    if title not in cached:  # 同名トグルは先頭を使う
+                        cached[title] = (b["id"], b.get("last_edited_time"))
+                if self.mirror is not None:
+                    self.mirror.replace_toggles(block_id, cached, synced_at, page_id)
+                self.stale.discard(block_id)
+                metrics.count("pages_listed")
+            for toggle_id, last_edited_time in cached.values():
+                self.last_edited[toggle_id] = last_edited_time
+            self.pages[block_id] = {title: toggle_id for title, (toggle_id, _) in cached.items()}
+            if page_id is not None:
+                self.containers.setdefault(page_id, set()).add(block_id)
+        return self.pages[block_id]
+
+    def get(self, page_id: str, title: str) -> str | None:
+        return self._toggles(page_id).get(title)
+
+    def last_edited_time(self, block_id: str) -> str | None:
+        return self.last_edited.get(block_id)
+
+    def put(self, page_id: str, title: str, block_id: str, last_edited_time: str | None = None):
+        self._toggles(page_id)[title] = block_id
+        self.last_edited[block_id] = last_edited_time
+        if self.mirror is not None:
+            self.mirror.put_toggle(page_id, title, block_id, last_edited_time)
+
+    def forget(self, block_id: str):
+        """書き込みの結果が分からないときに呼ぶ（次に引いたときに子ブロック一覧を取り直す）"""
+        self.pages.pop(block_id, None)
+        self.stale.add(block_id)
+
+    def add_container(self, page_id: str, toggle_id: str):
+        """月のトグルを、そのページの子として登録する（一覧は必要になったときに取る）"""
+        self.parents[toggle_id] = page_id
+
+    def add_empty_page(self, page_id: str):
+        """作成直後のページは一覧取得せずに空として扱う"""
+        self.pages.setdefault(page_id, {})
+
+    def add_empty_container(self, page_id: str, toggle_id: str):
+        """作成直後の月のトグルも一覧取得せずに空として扱う"""
+        self.parents[toggle_id] = page_id
+        self.pages.setdefault(toggle_id, {})
+        self.containers.setdefault(page_id, set()).add(toggle_id)
+        if self.mirror is not None:
+            self.mirror.replace_toggles(toggle_id, {}, utc_now_iso(), page_id)
+
+    def begin_write(self, block_id: str):
+        """トグルを作る直前に呼ぶ（mark_synced までは写しを信用しない）"""
+        if self.mirror is not None:
+            self.mirror.begin_write(block_id)
+
+    def remove(self, toggle_id: str):
+        """アーカイブしたトグルを索引から外す"""
+        for titles in self.pages.values():
+            for title in [t for t, block_id in titles.items() if block_id == toggle_id]:
+                del titles[title]
+        if self.mirror is not None:
+            self.mirror.remove_toggle(toggle_id)
+
+    def mark_synced(self, page_id: str):
+        """このページへの書き込みが終わったら呼ぶ（写しを現状と一致しているものとして扱う）"""
+        if self.mirror is not None:
+            self.mirror.mark_synced(page_id, self.containers.get(page_id, ()))
+
+def find_toggle_block_by_title(page_id: str, title: str, index: ToggleIndex | None = None) -> str | None:
+    """ページ（または月のトグル）直下のトグルでタイトルが完全一致するものを探す"""
+    if index is not None:
+        return index.get(page_id, title)
+    for txt, b in iter_toggle_blocks(page_id):
+        if txt == title:
+            return b["id"]
     return None
 
-def list_paragraph_texts(block_id: str) -> set[str]:
-    """トグル内の段落テキスト集合（重複防止用）"""
-    texts = set()
+def month_title(date_str: str) -> str:
+    """日付の入る月のトグルのタイトル（YYYY-MM）"""
+    return date_str[:7]
+
+def find_month_toggle(page_id: str, date_str: str, index: ToggleIndex | None = None) -> str | None:
+    """日付の入る月のトグルを探す（NOTION_LAYOUT=month）"""
+    month_id = find_toggle_block_by_title(page_id, month_title(date_str), index)
+    if month_id and index is not None:
+        index.add_container(page_id, month_id)
+    return month_id
+
+def find_date_toggle(page_id: str, date_str: str, index: ToggleIndex | None = None) -> str | None:
+    """
+    日付トグルを探す。month レイアウトでも、まだ移行していないページ直下の日付トグルがあればそれを使い
+    （移行中のページに同じ日付のトグルを二重に作らないため）、なければ月のトグルの中を見る
+    """
+    toggle_id = find_toggle_block_by_title(page_id, date_str, index)
+    if toggle_id or NOTION_LAYOUT != "month":
+        return toggle_id
+    month_id = find_month_toggle(page_id, date_str, index)
+    return find_toggle_block_by_title(month_id, date_str, index) if month_id else None
+
+def create_month_toggles(page_id: str, months: list[str], index: ToggleIndex | None = None) -> list[str]:
+    """まだない月のトグルを（古い順に）まとめて作成し、作成したトグルのIDを返す"""
+    months = [m for m in sorted(months) if not find_toggle_block_by_title(page_id, m, index)]
+    created = append_children_chunked(page_id, [toggle_block(m, []) for m in months]) if months else []
+    if index is not None:
+        for month, block in zip(months, created):
+            index.put(page_id, month, block["id"], block.get("last_edited_time"))
+            index.add_empty_container(page_id, block["id"])
+    return [block["id"] for block in created]
+
+def iter_child_blocks(block_id: str):
+    """ブロック直下の子ブロックを並び順に列挙"""
     cursor = None
     while True:
         children = notion.blocks.children.list(block_id=block_id, start_cursor=cursor)
-        for c in children["results"]:
-            if c.get("type") == "paragraph":
-                rt = c["paragraph"].get("rich_text", [])
-                texts.add("".join([t.get("plain_text", "") for t in rt]))
+        yield from children["results"]
         if not children.get("has_more"):
             break
         cursor = children.get("next_cursor")
-    return texts
-
-def append_toggle_with_paragraphs(page_id: str, title: str, lines: list[str]):
-    """タイトル付きトグルを新規作成し、配下に段落を付与"""
-    notion.blocks.children.append(
-        block_id=page_id,
-        children=[{
-            "object": "block",
-            "type": "toggle",
-            "toggle": {
-                "rich_text": [{"type": "text", "text": {"content": title}}],
-                "children": [
-                    {
-                        "object": "block",
-                        "type": "paragraph",
-                        "paragraph": {
-                            "rich_text": [{"type": "text", "text": {"content": line}}]
-                        }
-                    } for line in lines if line.strip()
-                ]
-            }
-        }]
-    )
 
-def append_paragraphs_to_toggle(toggle_id: str, lines: list[str], existing: set[str]):
-    """既存トグルに段落を追記（重複はスキップ）"""
-    new_children = []
-    for line in lines:
-        line = line.strip()
-        if not line or line in existing:
+def paragraph_texts(blocks) -> list[tuple[str, str]]:
+    """子ブロックのうち段落を (ブロックID, テキスト) で返す"""
+    return [(c["id"], _plain_text(c["paragraph"].get("rich_text", []))) for c in blocks if c.get("type") == "paragraph"]
+
+def list_paragraph_blocks(block_id: str) -> list[tuple[str, str]]:
+    """トグル内の段落を並び順に (ブロックID, テキスト) で返す"""
+    return paragraph_texts(iter_child_blocks(block_id))
+
+# Notion API の1リクエストあたりの上限
+NOTION_MAX_CHILDREN = 100              # children 配列の要素数（ネストした children も同じ）
+NOTION_MAX_BLOCKS_PER_REQUEST = 1000   # ネストを含むリクエスト全体のブロック数
+NOTION_MAX_TEXT_LENGTH = 2000          # rich_text 1要素の text.content の文字数（UTF-16 の単位で数える）
+NOTION_PAYLOAD_BUDGET = 450_000        # リクエスト本文の大きさ（上限 500KB に余裕をもたせる）
+
+def rich_text(text: str) -> list[dict]:
+    """
+    テキストを rich_text の要素に分ける（1要素 2000 文字まで）。
+    行と段落を1対1に保つため、長い行も要素を分けて1つの段落に収める
+    （Slack のメッセージは 40,000 文字までなので、要素数の上限 100 には届かない）。
+    """
+    if len(text) <= NOTION_MAX_TEXT_LENGTH // 2:
+        return [{"type": "text", "text": {"content": text}}]
+    chunks, start, units = [], 0, 0
+    for i, ch in enumerate(text):
+        width = 2 if ord(ch) > 0xFFFF else 1  # 絵文字などは UTF-16 で2文字分
+        if units + width > NOTION_MAX_TEXT_LENGTH:
+            chunks.append(text[start:i])
+            start, units = i, 0
+        units += width
+    chunks.append(text[start:])
+    return [{"type": "text", "text": {"content": chunk}} for chunk in chunks]
+
+def paragraph_block(line: str) -> dict:
+    return {
+        "object": "block",
+        "type": "paragraph",
+        "paragraph": {
+            "rich_text": rich_text(line)
+        }
+    }
+
+def toggle_block(title: str, lines: list[str]) -> dict:
+    return {
+        "object": "block",
+        "type": "toggle",
+        "toggle": {
+            "rich_text": [{"type": "text", "text": {"content": title}}],
+            "children": [paragraph_block(line) for line in lines]
+        }
+    }
+
+def block_bytes(block: dict) -> int:
+    """リクエスト本文に占めるブロックの大きさ（httpx と同じく ensure_ascii=False の UTF-8 で数える）"""
+    return len(json.dumps(block, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+def chunk_children(children: list[dict]) -> list[list[dict]]:
+    """children を1リクエストの上限（要素数・本文の大きさ）に収まるように分ける"""
+    chunks: list[list[dict]] = []
+    current: list[dict] = []
+    current_bytes = 0
+    for block in children:
+        size = block_bytes(block)
+        if current and (len(current) >= NOTION_MAX_CHILDREN or current_bytes + size > NOTION_PAYLOAD_BUDGET):
+            chunks.append(current)
+            current, current_bytes = [], 0
+        current.append(block)
+        current_bytes += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _append_chunks(block_id: str, chunks: list[list[dict]], after: str | None = None, on_chunk=None) -> list[dict]:
+    created = []
+    for chunk in chunks:
+        kwargs = {"after": after} if after else {}
+        res = notion.blocks.children.append(block_id=block_id, children=chunk, **kwargs)
+        created.extend(res["results"])
+        if on_chunk is not None:
+            on_chunk(res["results"])
+        if after and created:
+            after = created[-1]["id"]
+    return created
+
+def append_children_chunked(block_id: str, children: list[dict], after: str | None = None,
+                            on_chunk=None) -> list[dict]:
+    """
+    children を上限ごとに分けて順番に追記し、作成されたブロックを返す（after を指定するとそのブロックの直後へ）。
+    on_chunk(作成されたブロック) はリクエストごとに呼ばれる（途中で失敗したときに書けた分を記録するため）。
+    """
+    return _append_chunks(block_id, chunk_children(children), after, on_chunk)
+
+def plan_toggle_batches(toggles: list[tuple[str, list[str]]]) -> list[list[tuple[str, list[str], list[str]]]]:
+    """
+    新規トグル（日付順）を追加リクエスト単位に分割する。
+    各要素は (タイトル, 作成時に入れる段落, 作成後に追記する段落)。
+    トグル数・トグル内の段落数・リクエスト全体のブロック数・本文の大きさが上限を超えないようにする。
+    """
+    batches: list[list[tuple[str, list[str], list[str]]]] = []
+    current: list[tuple[str, list[str], list[str]]] = []
+    current_blocks = current_bytes = 0
+    for title, lines in toggles:
+        lines = [line for line in lines if line.strip()]
+        # トグルと一緒に作る段落は、1リクエストに収まるところまで
+        inline_bytes, n = block_bytes(toggle_block(title, [])), 0
+        while n < min(len(lines), NOTION_MAX_CHILDREN):
+            size = block_bytes(paragraph_block(lines[n]))
+            if inline_bytes + size > NOTION_PAYLOAD_BUDGET:
+                break
+            inline_bytes += size
+            n += 1
+        inline, overflow = lines[:n], lines[n:]
+        if current and (len(current) >= NOTION_MAX_CHILDREN
+                        or current_blocks + 1 + n > NOTION_MAX_BLOCKS_PER_REQUEST
+                        or current_bytes + inline_bytes > NOTION_PAYLOAD_BUDGET):
+            batches.append(current)
+            current, current_blocks, current_bytes = [], 0, 0
+        current.append((title, inline, overflow))
+        current_blocks += 1 + n
+        current_bytes += inline_bytes
+    if current:
+        batches.append(current)
+    return batches
+
+def _run_now(fn, *args) -> Future:
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def append_toggles_batch(page_id: str, toggles: list[tuple[str, list[str]]],
+                         index: ToggleIndex | None = None, on_created=None,
+                         pipeline: ThreadPoolExecutor | None = None) -> int:
+    """
+    1ページ分の新規日付トグルをまとめて作成する（追加リクエスト数を返す）。
+    上限を超える分は自動で分割し、トグルに入りきらない段落は作成後に追記する。
+    pipeline を渡すと、入りきらない段落の追記（トグルごとには順番どおり）を別スレッドで進め、
+    その間に次のトグルの作成リクエストを送る。
+    on_created(タイトル, トグルID, 行) はトグルごとに書き込み完了後に呼ばれる。
+    """
+    submit = pipeline.submit if pipeline is not None else _run_now
+    requests_made = 0
+    follow_ups: list[tuple[str, str, list[str], Future]] = []
+
+    def settle() -> Exception | None:
+        # 追記が終わったトグルだけ完了にする（失敗したトグルは on_created を呼ばない）
+        error = None
+        for title, toggle_id, lines, future in follow_ups:
+            try:
+                future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if on_created is not None:
+                on_created(title, toggle_id, lines)
+        return error
+
+    try:
+        for batch in plan_toggle_batches(toggles):
+            res = notion.blocks.children.append(
+                block_id=page_id,
+                children=[toggle_block(title, inline) for title, inline, _ in batch]
+            )
+            requests_made += 1
+            # 作成済みのトグルを先に索引へ登録（後続の失敗時に二重作成しないため）
+            if index is not None:
+                for (title, _, _), created in zip(batch, res["results"]):
+                    index.put(page_id, title, created["id"], created.get("last_edited_time"))
+            for (title, inline, overflow), created in zip(batch, res["results"]):
+                if overflow:
+                    chunks = chunk_children([paragraph_block(line) for line in overflow])
+                    requests_made += len(chunks)
+                    follow_ups.append((title, created["id"], inline + overflow,
+                                       submit(_append_chunks, created["id"], chunks)))
+                elif on_created is not None:
+                    on_created(title, created["id"], inline)
+    except Exception:
+        settle()
+        raise
+    error = settle()
+    if error is not None:
+        raise error
+    return requests_made
+
+def append_toggle_with_paragraphs(page_id: str, title: str, lines: list[str],
+                                  index: ToggleIndex | None = None) -> str:
+    """タイトル付きトグルを新規作成し、配下に段落を付与（作成したトグルのIDを返す）"""
+    [[(_, inline, overflow)]] = plan_toggle_batches([(title, lines)])
+    res = notion.blocks.children.append(block_id=page_id, children=[toggle_block(title, inline)])
+    created = res["results"][0]
+    if index is not None:
+        index.put(page_id, title, created["id"], created.get("last_edited_time"))
+    if overflow:
+        append_children_chunked(created["id"], [paragraph_block(line) for line in overflow])
+    return created["id"]
+
+def new_paragraph_lines(lines: list[str], existing_hashes: set[str]) -> list[str]:
+    """既存トグルに追記が必要な行（空行と、既存行のハッシュと一致する行を除く）"""
+    return [line.strip() for line in lines if line.strip() and line_hash(line) not in existing_hashes]
+
+def append_paragraphs_to_toggle(toggle_id: str, lines: list[str], after: str | None = None,
+                                on_chunk=None) -> list[str]:
+    """既存トグルに段落を追記し、作成した段落のブロックIDを返す"""
+    children = [paragraph_block(line) for line in lines]
+    return [b["id"] for b in append_children_chunked(toggle_id, children, after, on_chunk)]
+
+def update_paragraph(block_id: str, line: str):
+    notion.blocks.update(block_id=block_id, paragraph={"rich_text": rich_text(line)})
+
+def archive_block(block_id: str):
+    notion.blocks.delete(block_id=block_id)
+
+# バケットの1メッセージ分: (チャンネル, ts, 親スレッドの ts（返信でなければ ""）, 「やったこと」行)
+# 行が空のものは、削除された・日報でなくなったメッセージ（書き込んだ段落をアーカイブする）
+Segment = tuple[str, str, str, list[str]]
+
+def segment_lines(segments: list[Segment]) -> list[str]:
+    return [line for _, _, _, lines in segments for line in lines]
+
+def resolve_message_blocks(blocks: list[list], paragraphs: list[tuple[str, str]] | None,
+                           claimed: set[str]) -> list[tuple[str, str]]:
+    """
+    台帳のメッセージの段落 [[ブロックID, ハッシュ]] を実在するブロックに対応付ける。
+    paragraphs（トグルの段落一覧）があれば、IDが未取得の段落はハッシュで探し、消えた段落は外す。
+    """
+    if paragraphs is None:
+        return [(block_id, h) for block_id, h in blocks if block_id]
+    by_id = {block_id for block_id, _ in paragraphs}
+    resolved = []
+    for block_id, h in blocks:
+        if block_id is None:
+            block_id = next((pid for pid, text in paragraphs
+                             if pid not in claimed and line_hash(text) == h), None)
+        if block_id in by_id and block_id not in claimed:
+            claimed.add(block_id)
+            resolved.append((block_id, h))
+    return resolved
+
+def diff_message_blocks(old: list[tuple[str, str]], new_lines: list[str]):
+    """
+    メッセージの段落 [(ブロックID, ハッシュ)] を新しい行に合わせる操作。
+    戻り値: (steps, archives)。steps は新しい並び順の ("keep" | "update" | "insert", ブロックID, 行)
+    Notion は「このブロックの直後に追加」しかできないので、先頭への挿入になる場合は位置ごとの更新にする。
+    """
+    matcher = difflib.SequenceMatcher(a=[h for _, h in old], b=[line_hash(line) for line in new_lines],
+                                      autojunk=False)
+    steps, archives = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            steps += [("keep", old[i1 + k][0], new_lines[j1 + k]) for k in range(i2 - i1)]
             continue
-        new_children.append({
-            "object": "block",
-            "type": "paragraph",
-            "paragraph": {
-                "rich_text": [{"type": "text", "text": {"content": line}}]
-            }
-        })
-    if new_children:
-        notion.blocks.children.append(block_id=toggle_id, children=new_children)
+        olds, news = old[i1:i2], new_lines[j1:j2]
+        n = min(len(olds), len(news))
+        steps += [("update", olds[k][0], news[k]) for k in range(n)]
+        steps += [("insert", None, line) for line in news[n:]]
+        archives += [block_id for block_id, _ in olds[n:]]
+    if steps and steps[0][0] == "insert" and any(kind != "insert" for kind, _, _ in steps):
+        n = min(len(old), len(new_lines))
+        steps = [("keep" if old[k][1] == line_hash(new_lines[k]) else "update", old[k][0], new_lines[k])
+                 for k in range(n)]
+        steps += [("insert", None, line) for line in new_lines[n:]]
+        archives = [block_id for block_id, _ in old[n:]]
+    return steps, archives
+
+@dataclass
+class MessageEdit:
+    """編集・削除されたメッセージ1件分の段落の操作（diff_message_blocks の結果）"""
+    date_str: str
+    toggle_id: str
+    source: tuple[str, str, str]  # (チャンネル, ts, 親スレッドの ts)
+    steps: list[tuple[str, str | None, str]]
+    archives: list[str]
+    removed: set[str]  # 台帳から外す行のハッシュ
+
+    def counts(self) -> tuple[int, int, int]:
+        """(更新, 追加, アーカイブ) するブロック数"""
+        kinds = [kind for kind, _, _ in self.steps]
+        return kinds.count("update"), kinds.count("insert"), len(self.archives)
+
+@dataclass
+class PagePlan:
+    """
+    1ページ分（DB×人×評価年度）の書き込み計画。
+    バケット（あるべき状態）と、ユーザーページ索引・トグル索引・台帳（Notionのスナップショット）との差分で、
+    追記する行がない日は操作を作らない（unchanged に数えるだけ）。
+      create_page:      CreatePage（ページを作成する。page_id は None）
+      create_months:    CreateMonth（NOTION_LAYOUT=month で、新しい日付トグルの入る月のトグルがなければ作る）
+      create_toggles:   CreateToggle（新しい日付トグルと段落）
+      appends:          AppendLines（既存トグルに、まだ書いていないメッセージの足りない段落だけ追記）
+      edits:            EditLines（書き込み済みのメッセージが編集・削除されたら、その段落だけ更新・追加・アーカイブ）
+      archive_toggles:  ArchiveToggle（日付トグルの最後のメッセージが取り下げられ、ほかに何も残らない日はトグルごとアーカイブ）
+    """
+    db_id: str
+    person: str
+    evaluation_year: int
+    page_id: str | None
+    create_page: bool = False
+    create_months: list[str] = field(default_factory=list)
+    create_toggles: list[tuple[str, list[Segment]]] = field(default_factory=list)
+    appends: list[tuple[str, str, list[Segment]]] = field(default_factory=list)  # (日付, トグルID, メッセージ)
+    edits: list[MessageEdit] = field(default_factory=list)
+    archive_toggles: list[tuple[str, str]] = field(default_factory=list)  # (日付, トグルID)
+    unchanged: list[str] = field(default_factory=list)
+
+    def ops(self) -> list[str]:
+        """1操作1行の表示（--dry-run 用）"""
+        ops = [f"CreatePage {self.person} ({self.evaluation_year}年度)"] if self.create_page else []
+        ops += [f"CreateMonth {month}" for month in self.create_months]
+        ops += [f"CreateToggle {date_str} (+{len(segment_lines(segments))}行)"
+                for date_str, segments in self.create_toggles]
+        ops += [f"AppendLines {date_str} → {toggle_id} (+{len(segment_lines(segments))}行)"
+                for date_str, toggle_id, segments in self.appends]
+        for edit in self.edits:
+            updated, inserted, archived = edit.counts()
+            ops.append(f"EditLines {edit.date_str} ts={edit.source[1]} "
+                       f"(更新 {updated} / 追加 {inserted} / アーカイブ {archived})")
+        ops += [f"ArchiveToggle {date_str} → {toggle_id}" for date_str, toggle_id in self.archive_toggles]
+        return ops
+
+class PageWriterPool:
+    """
+    ページごとに直列、ページ間は並列に書き込むワーカープール。
+    同じページ宛ての仕事は投入順に1スレッドでまとめて処理する（トグルの並び順を保つため）。
+    """
+
+    def __init__(self, workers: int, handler):
+        self.handler = handler  # handler(page_key, items)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.lock = threading.Lock()
+        self.pending: dict = {}
+        self.running: set = set()
+        self.futures = []
+
+    def submit(self, page_key, items: list):
+        with self.lock:
+            self.pending.setdefault(page_key, []).extend(items)
+            if page_key not in self.running:
+                self.running.add(page_key)
+                self.futures.append(self.executor.submit(self._drain, page_key))
+
+    def _drain(self, page_key):
+        while True:
+            with self.lock:
+                items = self.pending.pop(page_key, [])
+                if not items:
+                    self.running.discard(page_key)
+                    return
+            try:
+                self.handler(page_key, items)
+            except Exception as e:
+                print(f"❌ {page_key} の処理中に予期しないエラー: {e}")
+
+    def wait_idle(self):
+        """投入済みの仕事がすべて終わるまで待つ（プールは閉じない）"""
+        with self.lock:
+            futures, self.futures = self.futures, []
+        wait(futures)
+
+    def join(self):
+        self.wait_idle()
+        self.executor.shutdown()
 
 # ====== Slack → Notion メイン処理 ======
-def run():
-    print("🚀 Slack日報同期を開始します...")
-    
-    oldest = time.time() - LOOKBACK_DAYS * 86400
-    print(f"📅 遡及期間: {LOOKBACK_DAYS}日分（{datetime.fromtimestamp(oldest, tz=JST).strftime('%Y-%m-%d %H:%M:%S')} JST 以降）")
-    
+def next_checkpoint_ts(fetched_ts: list[str], failed_ts: set[str]) -> str | None:
+    """
+    次回の同期位置。Notion反映に失敗したメッセージがあれば、それより前までしか進めない
+    （失敗した日は次回の差分取得で再処理される）
+    """
+    limit = min((float(ts) for ts in failed_ts), default=None)
+    candidates = [ts for ts in fetched_ts if limit is None or float(ts) < limit]
+    return max(candidates, key=float, default=None)
+
+class NotionWriter:
+    """
+    閉じた日のバケットを受け取り、ページ単位のワーカープールでNotionに反映する。
+    ページごとに書き込み計画（PagePlan）を作ってから実行する。dry_run なら計画を表示するだけで書き込まない。
+    バケットの元になったメッセージ (チャンネル, ts) を覚えておき、失敗した日の分を failed_ts に集める。
+    複数のデータベースに書く場合も、ユーザーページ索引以外（トグル索引・台帳・プール）は共有する。
+    journal を渡すと、投入したバケット（record_buckets のとき）と反映が終わったページ×日付を記録する。
+    skip_days（前回の実行で反映済みの (DB, メンバー名, 評価年度, 日付)）は投入されても書き込まない。
+    """
+
+    def __init__(self, notion_db_ids, dry_run: bool = False, journal: RunJournal | None = None,
+                 skip_days: set[tuple[str, str, int, str]] | None = None):
+        self.dry_run = dry_run
+        self.journal = journal
+        self.record_buckets = True
+        self.skip_days = skip_days or set()
+        self.resumed = 0  # skip_days のため書き込まなかったユーザー・日付の数
+        self.retracted = 0  # 段落を取り下げたメッセージの数
+        self.mirror = NotionMirror(os.path.join(CACHE_DIR, "sync_state.sqlite"))
+        self.person_pages = {db_id: PersonPageIndex(db_id, self.mirror) for db_id in notion_db_ids}
+        self.toggles = ToggleIndex(self.mirror)
+        self.ledger = DedupLedger(os.path.join(CACHE_DIR, "sync_state.sqlite"))
+        self.pool = PageWriterPool(NOTION_WORKERS, self.sync_person_page)
+        # 長い日の続きの追記はトグルごとに独立しているので、ページの作成リクエストと並行に進める
+        self.follow_ups = ThreadPoolExecutor(max_workers=max(1, NOTION_APPEND_PIPELINE))
+        self.lock = threading.Lock()
+        self.bucket_ts: dict[tuple[str, str, int, str], list[tuple[str, str]]] = {}
+        self.failed_ts: set[tuple[str, str]] = set()  # (チャンネル, ts)
+        self.failed_days: set[tuple[str, str, int, str]] = set()
+        self.submitted = 0
+        self.started = False
+        self.planned = {"pages": 0, "toggles": 0, "appends": 0, "edits": 0, "lines": 0, "archives": 0, "unchanged": 0}
+        self.planned_pages: set[tuple[str, str, int]] = set()  # dry_run で作成を計画したページ
+
+    def start(self, evaluation_years):
+        """最初のバケットを書く前に、対象年度のユーザーページ索引を作る"""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+            if self.dry_run:
+                print(f"\n📝 書き込み計画を作成中（--dry-run: Notionには書き込みません）...")
+            else:
+                print(f"\n📝 Notionデータベースに反映中...")
+            for db_id, person_pages in self.person_pages.items():
+                try:
+                    with metrics.phase("page"):
+                        person_pages.load(evaluation_years)
+                except Exception as e:
+                    # 索引が作れなくても、従来どおりバケットごとの検索で続行する
+                    print(f"⚠️  ユーザーページ索引の作成に失敗しました（{db_id}）: {e}")
+
+    def submit_day(self, db_id: str, date_str: str, day_bucket: dict[tuple[str, int], list[Segment]]):
+        """1日分（閉じたバケット）を人×評価年度のページごとに投入する"""
+        if self.journal is not None and self.record_buckets and day_bucket:
+            self.journal.append("day", db=db_id, date=date_str,
+                                bucket=[[person, year, segments] for (person, year), segments in day_bucket.items()])
+        for (person, evaluation_year), segments in day_bucket.items():
+            if (db_id, person, evaluation_year, date_str) in self.skip_days:
+                with self.lock:
+                    self.resumed += 1
+                continue
+            with self.lock:
+                self.bucket_ts.setdefault((db_id, person, evaluation_year, date_str), []).extend(
+                    (channel_id, ts) for channel_id, ts, _, _ in segments)
+                self.submitted += 1
+            self.pool.submit((db_id, person, evaluation_year), [(date_str, segments)])
+
+    def retract(self, channel_id: str, ts: str):
+        """削除された・日報でなくなったメッセージの段落をアーカイブする（書き込んでいないメッセージなら何もしない）"""
+        found = self.ledger.message_page(channel_id, ts)
+        if found is None or found[0] not in self.person_pages:
+            return
+        db_id, person, evaluation_year, date_str = found
+        if self.journal is not None and self.record_buckets:
+            self.journal.append("retract", channel=channel_id, ts=ts)
+        metrics.count("messages_retracted")
+        with self.lock:
+            self.retracted += 1
+            self.bucket_ts.setdefault((db_id, person, evaluation_year, date_str), []).append((channel_id, ts))
+        self.pool.submit((db_id, person, evaluation_year), [(date_str, [(channel_id, ts, "", [])])])
+
+    def _mark_failed(self, db_id: str, person: str, evaluation_year: int, date_str: str):
+        with self.lock:
+            self.failed_ts.update(self.bucket_ts[(db_id, person, evaluation_year, date_str)])
+            self.failed_days.add((db_id, person, evaluation_year, date_str))
+
+    def plan_page(self, page_key: tuple[str, str, int], days: list[tuple[str, list[Segment]]],
+                  out: list[str]) -> PagePlan:
+        """1ページ分の書き込み計画を作る（読み取りだけ。日単位の失敗はその日を計画から外す）"""
+        db_id, person, evaluation_year = page_key
+        with metrics.phase("page"):
+            page_id = find_person_page(db_id, person, evaluation_year, self.person_pages[db_id])
+        plan = PagePlan(db_id, person, evaluation_year, page_id, create_page=page_id is None)
+        if page_id is None and self.dry_run:
+            # dry_run ではページを作らないので、同じページの2回目以降の計画では作成済みとして数える
+            with self.lock:
+                plan.create_page = page_key not in self.planned_pages
+                self.planned_pages.add(page_key)
+
+        # 同じ日が複数回届いたら1つにまとめる（同じメッセージは後の版を使う）
+        by_date: dict[str, dict[tuple[str, str], Segment]] = {}
+        for date_str, segments in days:
+            for channel_id, ts, thread_ts, lines in segments:
+                lines = [line.strip() for line in lines if line.strip()]
+                by_date.setdefault(date_str, {})[(channel_id, ts)] = (channel_id, ts, thread_ts, lines)
+
+        for date_str in sorted(by_date):
+            segments = list(by_date[date_str].values())
+            try:
+                self._plan_day(plan, date_str, segments)
+            except Exception as e:
+                out.append(f"   ❌ {date_str}: エラーが発生しました: {e}")
+                self._mark_failed(db_id, person, evaluation_year, date_str)
+                metrics.count("buckets_failed")
+        return plan
+
+    def _plan_day(self, plan: PagePlan, date_str: str, segments: list[Segment]):
+        page_id, toggles, ledger = plan.page_id, self.toggles, self.ledger
+        with metrics.phase("toggle"):
+            toggle_id = find_date_toggle(page_id, date_str, toggles) if page_id else None
+        written = [seg for seg in segments if seg[3]]
+        if not toggle_id:
+            # トグルがなければ（削除されたメッセージ以外を）まとめて作る
+            if written:
+                plan.create_toggles.append((date_str, written))
+                month = month_title(date_str)
+                if NOTION_LAYOUT == "month" and month not in plan.create_months and not (
+                        page_id and find_month_toggle(page_id, date_str, toggles)):
+                    plan.create_months.append(month)
+            return
+
+        with metrics.phase("toggle"):
+            mapped = ledger.message_blocks((channel_id, ts) for channel_id, ts, _, _ in segments)
+            mapped = {key: blocks for key, (mapped_toggle, blocks) in mapped.items() if mapped_toggle == toggle_id}
+            paragraphs = None
+            if ledger.is_trusted(page_id, date_str, toggle_id, toggles.last_edited_time(toggle_id)):
+                existing = ledger.hashes(page_id, date_str)
+            else:
+                # 台帳がない・手動編集された場合だけNotionから読み直す
+                paragraphs = list_paragraph_blocks(toggle_id)
+                texts = [text for _, text in paragraphs]
+                ledger.reseed(page_id, date_str, toggle_id, texts)
+                existing = {line_hash(t) for t in texts}
+
+        # 書き込み済みのメッセージは、行が変わったものだけ段落を合わせ直す
+        changed: list[tuple[Segment, list[list], list[str]]] = []
+        for seg in segments:
+            blocks = mapped.get((seg[0], seg[1]))
+            if blocks is None:
+                continue
+            own = {h for _, h in blocks}
+            # 他のメッセージ（や手入力）ですでにある行は書かない
+            new_lines = [line for line in seg[3] if line_hash(line) in own or line_hash(line) not in existing]
+            if [h for _, h in blocks] != [line_hash(line) for line in new_lines]:
+                changed.append((seg, blocks, new_lines))
+        if changed and not any(seg[3] for seg in segments) and \
+                ledger.toggle_messages(page_id, date_str, toggle_id) <= {(seg[0], seg[1]) for seg in segments}:
+            # トグルに書いたメッセージがすべて取り下げられた日: 手入力などほかの内容がなければトグルごとアーカイブする
+            with metrics.phase("toggle"):
+                children = list(iter_child_blocks(toggle_id))
+            paragraphs = paragraph_texts(children)
+            owned: set[str] = set()
+            for _, blocks, _ in changed:
+                resolve_message_blocks(blocks, paragraphs, owned)
+            if all(c["id"] in owned for c in children):
+                plan.archive_toggles.append((date_str, toggle_id))
+                return
+        if changed and paragraphs is None and any(block_id is None for _, blocks, _ in changed for block_id, _ in blocks):
+            # トグルと一緒に作った段落はIDが分からないので、一覧を取って対応付ける
+            with metrics.phase("toggle"):
+                paragraphs = list_paragraph_blocks(toggle_id)
+        claimed: set[str] = set()
+        for (channel_id, ts, thread_ts, _), blocks, new_lines in changed:
+            old = resolve_message_blocks(blocks, paragraphs, claimed)
+            steps, archives = diff_message_blocks(old, new_lines)
+            removed = {h for _, h in blocks} - {line_hash(line) for line in new_lines}
+            plan.edits.append(MessageEdit(date_str, toggle_id, (channel_id, ts, thread_ts), steps, archives, removed))
+
+        new_segments = []
+        for channel_id, ts, thread_ts, lines in segments:
+            if (channel_id, ts) in mapped:
+                continue
+            # まだ書いていないメッセージ: 既存の行と重ならない行だけ追記する
+            added = new_paragraph_lines(lines, existing)
+            existing.update(line_hash(line) for line in added)
+            if added:
+                new_segments.append((channel_id, ts, thread_ts, added))
+        if new_segments:
+            plan.appends.append((date_str, toggle_id, new_segments))
+        if not new_segments and not any(edit.date_str == date_str for edit in plan.edits):
+            plan.unchanged.append(date_str)
+
+    def _count_plan(self, plan: PagePlan):
+        edit_counts = [edit.counts() for edit in plan.edits]
+        counts = {
+            "pages": int(plan.create_page),
+            "toggles": len(plan.create_toggles),
+            "appends": len(plan.appends),
+            "edits": len(plan.edits),
+            "lines": sum(len(segment_lines(segments)) for _, segments in plan.create_toggles)
+                     + sum(len(segment_lines(segments)) for _, _, segments in plan.appends)
+                     + sum(updated + inserted for updated, inserted, _ in edit_counts),
+            "archives": sum(archived for _, _, archived in edit_counts) + len(plan.archive_toggles),
+            "unchanged": len(plan.unchanged),
+        }
+        with self.lock:
+            for key, n in counts.items():
+                self.planned[key] += n
+        for key, n in counts.items():
+            metrics.count(f"plan_{key}", n)
+
+    def sync_person_page(self, page_key: tuple[str, str, int], days: list[tuple[str, list[Segment]]]):
+        """1ページ分（DB×人×評価年度）の日付を日付順に反映する。ログはページ単位でまとめて出す"""
+        db_id, person, evaluation_year = page_key
+        out = [f"\n👤 {person} ({evaluation_year}年度 - {len({date_str for date_str, _ in days})}日分) を処理中..."]
+        try:
+            try:
+                plan = self.plan_page(page_key, days, out)
+            except Exception as e:
+                out.append(f"   ❌ エラーが発生しました: {e}")
+                for date_str in {date_str for date_str, _ in days}:
+                    self._mark_failed(db_id, person, evaluation_year, date_str)
+                metrics.count("buckets_failed", len(days))
+                return
+            self._count_plan(plan)
+            if plan.unchanged:
+                out.append(f"   ⏭️  変更のない日 {len(plan.unchanged)} 件（書き込みなし）")
+            if self.dry_run:
+                out += [f"   📝 {op}" for op in plan.ops()]
+                return
+            self.apply_plan(plan, out)
+            self._journal_done(page_key, {date_str for date_str, _ in days})
+        finally:
+            print("\n".join(out))
+
+    def _journal_done(self, page_key: tuple[str, str, int], dates: set[str]):
+        """反映が終わった日を、ページIDと日付トグルのIDとともに記録する（失敗した日は記録しない）"""
+        if self.journal is None:
+            return
+        db_id, person, evaluation_year = page_key
+        with self.lock:
+            dates = sorted(d for d in dates if (db_id, person, evaluation_year, d) not in self.failed_days)
+        if not dates:
+            return
+        page_id = self.person_pages[db_id].get(person, evaluation_year)
+        self.journal.append("done", db=db_id, person=person, year=evaluation_year, page_id=page_id,
+                            dates={d: find_date_toggle(page_id, d, self.toggles) if page_id else None for d in dates})
+
+    def _record_segments(self, plan: PagePlan, page_id: str, date_str: str, toggle_id: str,
+                         segments: list[Segment], block_ids: list[str | None]):
+        """追記・作成したメッセージごとの段落を台帳に記録する（block_ids は行の並びと同じ順）"""
+        messages = []
+        pos = 0
+        for channel_id, ts, thread_ts, lines in segments:
+            blocks = [[block_id, line_hash(line)] for block_id, line in zip(block_ids[pos:pos + len(lines)], lines)]
+            messages.append((channel_id, ts, thread_ts, blocks))
+            pos += len(lines)
+        self.ledger.record_messages((plan.db_id, plan.person, plan.evaluation_year), page_id, date_str, toggle_id,
+                                    messages)
+
+    def _apply_edit(self, plan: PagePlan, page_id: str, edit: MessageEdit):
+        """編集されたメッセージの段落を更新・追加・アーカイブし、台帳を書き換える"""
+        result: list[tuple[str, str]] = []  # (ブロックID, 行)。steps の先頭から適用済みの分
+        inserts: list[str] = []
+        archived = 0
+
+        def flush_inserts():
+            if inserts:
+                anchor = result[-1][0] if result else None
+                lines = iter(list(inserts))
+                append_paragraphs_to_toggle(edit.toggle_id, inserts, after=anchor,
+                                            on_chunk=lambda blocks: result.extend((b["id"], next(lines)) for b in blocks))
+                inserts.clear()
+
+        channel_id, ts, thread_ts = edit.source
+        page_key = (plan.db_id, plan.person, plan.evaluation_year)
+        try:
+            for kind, block_id, line in edit.steps:
+                if kind == "insert":
+                    inserts.append(line)
+                    continue
+                flush_inserts()
+                if kind == "update":
+                    update_paragraph(block_id, line)
+                result.append((block_id, line))
+            flush_inserts()
+            for block_id in edit.archives:
+                archive_block(block_id)
+                archived += 1
+        except Exception:
+            # 途中で失敗しても、適用済みの段落とまだ手を付けていない段落をメッセージの段落として残す
+            # （次回の差分で残りだけをやり直す。書き換え前の段落はハッシュを空にして必ず更新させる。
+            # 追加する段落はIDなしで残し、失敗したリクエストが実は反映されていれば次回ハッシュで対応付ける）
+            rest = [[block_id, "" if kind == "update" else line_hash(line)]
+                    for kind, block_id, line in edit.steps[len(result):]]
+            rest += [[block_id, ""] for block_id in edit.archives[archived:]]
+            self.ledger.record_messages(page_key, page_id, edit.date_str, edit.toggle_id,
+                                        [(channel_id, ts, thread_ts,
+                                          [[block_id, line_hash(line)] for block_id, line in result] + rest)])
+            self.ledger.record(page_id, edit.date_str, edit.toggle_id, [line for _, line in result])
+            raise
+
+        self.ledger.record_messages(page_key, page_id, edit.date_str, edit.toggle_id,
+                                    [(channel_id, ts, thread_ts, [[block_id, line_hash(line)] for block_id, line in result])])
+        self.ledger.replace_lines(page_id, edit.date_str, edit.toggle_id, edit.removed, [line for _, line in result])
+
+    def apply_plan(self, plan: PagePlan, out: list[str]):
+        """書き込み計画をそのまま実行する"""
+        db_id, person, evaluation_year = plan.db_id, plan.person, plan.evaluation_year
+        person_pages, toggles, ledger = self.person_pages[db_id], self.toggles, self.ledger
+        if not plan.create_toggles and not plan.appends and not plan.edits and not plan.archive_toggles:
+            return
+
+        user_page_id = plan.page_id
+        if user_page_id is None:
+            try:
+                with metrics.phase("page"):
+                    user_page_id = create_person_page(db_id, person, evaluation_year, person_pages)
+                toggles.add_empty_page(user_page_id)
+            except Exception as e:
+                out.append(f"   ❌ エラーが発生しました: {e}")
+                # 作成は再試行しないので、作られているかもしれない（次に引くときにDBへ問い合わせ直す）
+                person_pages.forget(person, evaluation_year)
+                for date_str, _ in plan.create_toggles:
+                    self._mark_failed(db_id, person, evaluation_year, date_str)
+                metrics.count("buckets_failed", len(plan.create_toggles))
+                return
+        out.append(f"   ✅ ユーザーページ取得/作成: {user_page_id}")
+        # 失敗がなければ、写しのトグル一覧はこのページの現状と一致している
+        synced = True
+
+        for date_str, toggle_id, segments in plan.appends:
+            try:
+                added = segment_lines(segments)
+                out.append(f"   🔄 {date_str}: 既存の日付トグルを更新: {toggle_id}")
+                written: list[str] = []
+                ledger.distrust(user_page_id, date_str)
+                with metrics.phase("append"):
+                    try:
+                        block_ids = append_paragraphs_to_toggle(
+                            toggle_id, added, on_chunk=lambda blocks: written.extend(b["id"] for b in blocks))
+                    except Exception:
+                        # 書けたリクエストの分は台帳に残す（次回に同じ行を二重に追記しないため）
+                        ledger.record(user_page_id, date_str, toggle_id, added[:len(written)])
+                        raise
+                ledger.record(user_page_id, date_str, toggle_id, added)
+                self._record_segments(plan, user_page_id, date_str, toggle_id, segments, block_ids)
+                metrics.count("lines_appended", len(added))
+                out.append(f"   ✅ {date_str}: 既存トグルに {len(added)} 行を追加")
+            except Exception as e:
+                out.append(f"   ❌ {date_str}: エラーが発生しました: {e}")
+                # 追記は再試行しないので、失敗したリクエストの分も次回は段落一覧で確かめる
+                ledger.distrust(user_page_id, date_str)
+                self._mark_failed(db_id, person, evaluation_year, date_str)
+                metrics.count("buckets_failed")
+                synced = False
+
+        for edit in plan.edits:
+            try:
+                ledger.distrust(user_page_id, edit.date_str)
+                with metrics.phase("append"):
+                    self._apply_edit(plan, user_page_id, edit)
+                updated, inserted, archived = edit.counts()
+                metrics.count("blocks_updated", updated)
+                metrics.count("lines_appended", inserted)
+                metrics.count("blocks_archived", archived)
+                out.append(f"   ✏️  {edit.date_str}: メッセージ {edit.source[1]} の変更を反映"
+                           f"（更新 {updated} / 追加 {inserted} / アーカイブ {archived}）")
+            except Exception as e:
+                out.append(f"   ❌ {edit.date_str}: エラーが発生しました: {e}")
+                ledger.distrust(user_page_id, edit.date_str)
+                self._mark_failed(db_id, person, evaluation_year, edit.date_str)
+                metrics.count("buckets_failed")
+                synced = False
+
+        for date_str, toggle_id in plan.archive_toggles:
+            try:
+                with metrics.phase("append"):
+                    archive_block(toggle_id)
+                toggles.remove(toggle_id)
+                ledger.drop_toggle(user_page_id, date_str)
+                metrics.count("toggles_archived")
+                out.append(f"   🗑️  {date_str}: 日報がなくなったため日付トグルをアーカイブ")
+            except Exception as e:
+                out.append(f"   ❌ {date_str}: エラーが発生しました: {e}")
+                self._mark_failed(db_id, person, evaluation_year, date_str)
+                metrics.count("buckets_failed")
+                synced = False
+
+        new_toggles = [(date_str, segment_lines(segments)) for date_str, segments in plan.create_toggles]
+        toggle_segments = dict(plan.create_toggles)
+
+        completed: set[str] = set()
+
+        def on_created(title: str, toggle_id: str, added: list[str]):
+            completed.add(title)
+            ledger.record(user_page_id, title, toggle_id, added)
+            # トグルと一緒に作った段落のIDは応答に含まれないので、編集時に一覧から対応付ける
+            self._record_segments(plan, user_page_id, title, toggle_id, toggle_segments[title], [None] * len(added))
+            metrics.count("toggles_created")
+            metrics.count("lines_appended", len(added))
+
+        # 新しい日付トグルは入れ物（ページ直下、month レイアウトでは月のトグル）ごとにまとめて作成
+        containers: dict[str, list[tuple[str, list[str]]]] = {}
+        if new_toggles and NOTION_LAYOUT == "month":
+            try:
+                toggles.begin_write(user_page_id)
+                with metrics.phase("append"):
+                    created_months = create_month_toggles(user_page_id, plan.create_months, toggles)
+                if created_months:
+                    out.append(f"   🗓️  月のトグル {len(created_months)} 件を作成")
+                for date_str, lines in new_toggles:
+                    containers.setdefault(find_month_toggle(user_page_id, date_str, toggles), []).append((date_str, lines))
+            except Exception as e:
+                out.append(f"   ❌ 月のトグルの作成に失敗しました: {e}")
+                # 作成は再試行しないので、次に引くときはページの子ブロック一覧を取り直す
+                toggles.forget(user_page_id)
+                for date_str, _ in new_toggles:
+                    self._mark_failed(db_id, person, evaluation_year, date_str)
+                metrics.count("buckets_failed", len(new_toggles))
+                synced = False
+        elif new_toggles:
+            containers[user_page_id] = new_toggles
+
+        requests_made = created = 0
+        for container_id, container_toggles in containers.items():
+            try:
+                toggles.begin_write(container_id)
+                with metrics.phase("append"):
+                    requests_made += append_toggles_batch(
+                        container_id, container_toggles, toggles, on_created=on_created, pipeline=self.follow_ups)
+                created += len(container_toggles)
+            except Exception as e:
+                # 一括作成に失敗したら、作成済みでない日だけ1件ずつやり直して失敗を日単位に閉じ込める
+                # （失敗したリクエストが実は反映されている場合に備え、先にトグルの一覧を取り直す）
+                synced = False
+                out.append(f"   ⚠️  一括作成に失敗したため1件ずつ作成します: {e}")
+                toggles.forget(container_id)
+                for date_str, lines in container_toggles:
+                    if date_str in completed:
+                        continue
+                    try:
+                        with metrics.phase("toggle"):
+                            existing_id = toggles.get(container_id, date_str)
+                        if existing_id:
+                            # 一括作成で作られていた日（応答が失われた・続きの追記に失敗した）は作り直さない。
+                            # 次回、段落の一覧と突き合わせて足りない行を追記する
+                            out.append(f"   ❌ {date_str}: 作成済みのトグルへの書き込みを確認できませんでした")
+                            ledger.distrust(user_page_id, date_str)
+                            self._mark_failed(db_id, person, evaluation_year, date_str)
+                            metrics.count("buckets_failed")
+                            continue
+                        with metrics.phase("append"):
+                            toggle_id = append_toggle_with_paragraphs(container_id, date_str, lines, toggles)
+                        on_created(date_str, toggle_id, lines)
+                        out.append(f"   ✅ {date_str}: 新しいトグルに {len(lines)} 行を追加")
+                    except Exception as e:
+                        out.append(f"   ❌ {date_str}: エラーが発生しました: {e}")
+                        # 作られているかもしれないので、次の日を作る前（と次回）に一覧を取り直す
+                        toggles.forget(container_id)
+                        ledger.distrust(user_page_id, date_str)
+                        self._mark_failed(db_id, person, evaluation_year, date_str)
+                        metrics.count("buckets_failed")
+        if created:
+            out.append(f"   ➕ 新しい日付トグル {created} 件を {requests_made} 回の追加リクエストで作成")
+        if synced:
+            toggles.mark_synced(user_page_id)
+
+    def plan_summary(self) -> str:
+        p = self.planned
+        return (f"ページ作成 {p['pages']} / トグル作成 {p['toggles']} / 追記 {p['appends']} / "
+                f"編集 {p['edits']}（計 {p['lines']} 行、アーカイブ {p['archives']}）/ 変更なし {p['unchanged']} 日")
+
+    def flush(self) -> set[tuple[str, str]]:
+        """投入済みのバケットの反映を待ち、失敗した (チャンネル, ts) を返して記録をリセットする（常駐モード用）"""
+        self.pool.wait_idle()
+        with self.lock:
+            failed, self.failed_ts = self.failed_ts, set()
+            self.bucket_ts.clear()
+            self.failed_days.clear()
+        return failed
+
+    def close(self):
+        self.pool.join()
+        self.follow_ups.shutdown()
+        self.ledger.close()
+        self.mirror.close()
+
+def jst_day_windows(oldest: float, latest: float):
+    """[oldest, latest) を JST の日付境界で区切り、(日付, 開始, 終了) を古い順に返す"""
+    start = oldest
+    while start < latest:
+        d = datetime.fromtimestamp(start, tz=JST)
+        next_midnight = JST.localize(datetime(d.year, d.month, d.day) + timedelta(days=1)).timestamp()
+        yield d.strftime("%Y-%m-%d"), start, min(next_midnight, latest)
+        start = next_midnight
+
+def iter_history_pages(channel_id: str, oldest: float, latest: float):
+    """conversations_history を1ページずつ返す（両端を含めて取得し、呼び出し側で振り分ける）"""
     cursor = None
-    messages = []
-    
-    print(f"📡 Slackチャンネル {SLACK_CHANNEL_ID} からメッセージを取得中...")
-    
     while True:
-        resp = slack.conversations_history(
-            channel=SLACK_CHANNEL_ID,
-            oldest=str(oldest),
-            limit=200,
-            cursor=cursor
-        )
-        batch_messages = resp.get("messages", [])
-        messages.extend(batch_messages)
-        print(f"📥 バッチ取得: {len(batch_messages)}件のメッセージ")
-        
+        with metrics.phase("fetch"):
+            resp = slack.conversations_history(
+                channel=channel_id,
+                oldest=f"{oldest:.6f}",
+                latest=f"{latest:.6f}",
+                inclusive=True,
+                limit=200,
+                cursor=cursor
+            )
+        yield resp.get("messages", [])
         if not resp.get("has_more"):
             break
         cursor = resp.get("response_metadata", {}).get("next_cursor")
-    
-    print(f"📊 合計 {len(messages)} 件のメッセージを取得しました")
 
-    # 新しい順で来るので時系列に揃える
-    messages.sort(key=lambda m: float(m["ts"]))
-    print(f"📅 メッセージを時系列順にソートしました")
+def iter_thread_replies(channel_id: str, thread_ts: str):
+    """conversations_replies をページングしてスレッドの返信を返す（親と、チャンネルにも送信された返信は除く）"""
+    cursor = None
+    while True:
+        with metrics.phase("fetch"):
+            resp = slack.conversations_replies(channel=channel_id, ts=thread_ts, limit=200, cursor=cursor)
+        for msg in resp.get("messages", []):
+            # チャンネルにも送信された返信は conversations_history 側で拾う
+            if msg["ts"] != thread_ts and msg.get("subtype") != "thread_broadcast":
+                yield msg
+        if not resp.get("has_more"):
+            break
+        cursor = resp.get("response_metadata", {}).get("next_cursor")
 
-    # ユーザーごと、評価年度ごと、日付（JST）ごとに「やったこと」行を蓄積
-    bucket: dict[tuple[str, int, str], list[str]] = {}
-    
-    print("\n🔍 日報メッセージを解析中...")
-    
-    for i, msg in enumerate(messages):
-        text = msg.get("text", "").strip()
-        if not text:
-            continue
+@dataclass(slots=True)
+class SlackMessage:
+    """解析に必要な項目だけを持つメッセージ（blocks や files などの大きなペイロードは持たない）"""
+    ts: str
+    ts_sec: float      # 並べ替えと日付の判定用に、取り込むときに一度だけ数値にしておく
+    edited_ts: str
+    thread_ts: str     # スレッドの返信なら親の ts（チャンネルにも送信された返信は通常のメッセージとして扱う）
+    user: str
+    text: str
+    reply_count: int
+    latest_reply: str
 
-        print(f"\n📝 メッセージ {i+1}:")
-        print(f"   ユーザー: {msg.get('user', 'bot')}")
-        print(f"   タイムスタンプ: {msg.get('ts')}")
+def slim_message(msg: dict) -> SlackMessage:
+    """解析に必要な項目だけを残す（blocks や files などの大きなペイロードは捨てる）"""
+    ts = msg["ts"]
+    thread_ts = msg.get("thread_ts", ts)
+    return SlackMessage(
+        ts, float(ts),
+        (msg.get("edited") or {}).get("ts", ""),
+        thread_ts if thread_ts != ts and msg.get("subtype") != "thread_broadcast" else "",
+        msg.get("user") or msg.get("bot_id") or "unknown",
+        message_text(msg),
+        msg.get("reply_count", 0),
+        msg.get("latest_reply", ""),
+    )
+
+class ThreadReplyFetcher:
+    """
+    スレッドの返信を、全チャンネルで共有するスレッドプール（SLACK_REPLY_WORKERS）で並列に取得する。
+    前回取り込んだ時から latest_reply が変わったスレッドだけを取り直す。
+    """
+
+    def __init__(self, workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+
+    @staticmethod
+    def _fetch(channel_id: str, thread_ts: str) -> list[SlackMessage]:
+        return [slim_message(msg) for msg in iter_thread_replies(channel_id, thread_ts)]
+
+    def changed_threads(self, checkpoint: CheckpointStore, channel_id: str,
+                        day: list[SlackMessage]) -> list[SlackMessage]:
+        return [msg for msg in day
+                if msg.reply_count and checkpoint.thread_latest_reply(channel_id, msg.ts) != msg.latest_reply]
+
+    def fetch(self, channel_id: str,
+              parents: list[SlackMessage]) -> list[tuple[SlackMessage, list[SlackMessage]]]:
+        """(親, 返信（軽量化済み）) を返す。取得に失敗したスレッドは今回は飛ばす（次回また取り直す）"""
+        futures = [(parent, self.executor.submit(self._fetch, channel_id, parent.ts)) for parent in parents]
+        results = []
+        for parent, future in futures:
+            try:
+                results.append((parent, future.result()))
+            except Exception as e:
+                print(f"⚠️  {channel_id}: スレッド {parent.ts} の返信の取得に失敗しました: {e}")
+        return results
+
+    def close(self):
+        self.executor.shutdown()
+
+def iter_day_messages(channel_id: str, oldest: float, latest: float, after_ts: str | None = None):
+    """
+    JSTの1日ずつ古い順に取得し、(日付, その日のメッセージ（時系列順）) を返す。
+    保持するのは取得中の1ページと、その日の軽量化したメッセージだけ。
+    after_ts を指定すると、その ts ちょうどのメッセージは除く（処理済みの同期位置）。
+    """
+    for date_str, start, end in jst_day_windows(oldest, latest):
+        day: list[SlackMessage] = []
+        for page in iter_history_pages(channel_id, start, end):
+            debug(f"📥 {channel_id} {date_str}: バッチ取得 {len(page)}件のメッセージ")
+            for msg in page:
+                record = slim_message(msg)
+                if start <= record.ts_sec < end and record.ts != after_ts:
+                    day.append(record)
+        day.sort(key=attrgetter("ts_sec"))
+        yield date_str, day
+
+def parse_report(msg: SlackMessage, date_str: str, index: int) -> tuple[str, int, list[str]] | None:
+    """1メッセージから (人, 評価年度, 「やったこと」の行) を取り出す。日報でなければ None"""
+    text = msg.text.strip()
+    if not text:
+        return None
+
+    # ログの文字列はメッセージごとに作らない（件数が多いと解析より重くなる）
+    verbose = LOG_LEVEL == "debug"
+    if verbose:
+        print(f"\n📝 メッセージ {index}:")
+        print(f"   ユーザー: {msg.user}")
+        print(f"   タイムスタンプ: {msg.ts}")
         print(f"   テキスト長: {len(text)} 文字")
-        
+
         # テキストの最初の100文字を表示
         preview = text[:100] + "..." if len(text) > 100 else text
         print(f"   プレビュー: {preview}")
 
-        done = extract_done_section(text)
-        if not done:
-            print("   ❌ 「やったこと」セクションが見つかりません")
-            continue
+    report = REPORT_PARSER.parse(text)
+    if report.template is None:
+        debug("   ❌ 「やったこと」セクションが見つかりません")
+        return None
 
-        print(f"   ✅ 「やったこと」セクションを抽出: {len(done)} 文字")
-        
-        user_id = msg.get("user") or msg.get("bot_id") or "unknown"
-        person = get_user_name(user_id if isinstance(user_id, str) and user_id.startswith("U") else "unknown")
-        print(f"   ユーザー名: {person}")
+    user_id = msg.user
+    person = get_user_name(user_id if isinstance(user_id, str) and user_id.startswith("U") else "unknown")
+    evaluation_year = evaluation_year_of(date_str)
+    # 箇条書きに分割（・ / - / 行頭番号など大雑把に）
+    lines = report.items()
 
-        date_str = jst_date_str_from_ts(msg["ts"])
+    if verbose:
+        print(f"   ✅ 「やったこと」セクションを抽出: {report.template.name} テンプレート")
+        print(f"   ユーザー名: {person}")
         print(f"   日付: {date_str}")
-        
-        # 評価年度を取得
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        evaluation_year = get_evaluation_year(date_obj)
         print(f"   評価年度: {evaluation_year}年度 ({evaluation_year}.4.1〜{evaluation_year+1}.3.31)")
-        
-        # 箇条書きに分割（・ / - / 行頭番号など大雑把に）
-        lines = [s.strip(" ・-　") for s in re.split(r"\n+", done) if s.strip()]
         print(f"   箇条書き行数: {len(lines)}")
 
-        if not lines:
-            print("   ❌ 有効な箇条書きが見つかりません")
-            continue
+    if not lines:
+        debug("   ❌ 有効な箇条書きが見つかりません")
+        return None
+    return person, evaluation_year, lines
+
+class DayMerger:
+    """
+    複数チャンネルの日ごとのバケットを、書き込み先DBごとに同じ日・同じ人でまとめてから NotionWriter に渡す。
+    同じDBに書くチャンネルがすべてその日を取得し終えた（日が閉じた）時点で、チャンネルの並び順に連結して投入する。
+    """
+
+    def __init__(self, channel_db_map: dict[str, str], writer: NotionWriter, evaluation_years):
+        self.channel_db_map = channel_db_map
+        self.channel_order = {channel_id: i for i, channel_id in enumerate(channel_db_map)}
+        self.writer = writer
+        self.evaluation_years = evaluation_years
+        self.lock = threading.Lock()
+        self.closed: dict[str, str] = {channel_id: "" for channel_id in channel_db_map}  # 取得済みの最後の日付
+        # (DB, 日付) → チャンネル → バケット
+        self.pending: dict[tuple[str, str], dict[str, dict]] = {}
+
+    def add(self, channel_id: str, date_str: str, day_bucket: dict[tuple[str, int], list[Segment]]):
+        """1チャンネルの1日分を受け取る（空の日も渡して、日が閉じたことを知らせる）"""
+        with self.lock:
+            if day_bucket:
+                key = (self.channel_db_map[channel_id], date_str)
+                self.pending.setdefault(key, {})[channel_id] = day_bucket
+            self.closed[channel_id] = date_str
+            ready = self._pop_ready()
+        self._submit(ready)
+
+    def finish(self, channel_id: str):
+        """チャンネルの取得が終わった（失敗を含む）。以降そのチャンネルは待たない"""
+        with self.lock:
+            self.closed[channel_id] = "9999-12-31"
+            ready = self._pop_ready()
+        self._submit(ready)
+
+    def retract(self, channel_id: str, ts: str):
+        """削除された・日報でなくなったメッセージを取り下げる"""
+        self.writer.start(self.evaluation_years)
+        self.writer.retract(channel_id, ts)
 
-        bucket.setdefault((person, evaluation_year, date_str), []).extend(lines)
+    def _pop_ready(self) -> list:
+        ready = []
+        for db_id, date_str in sorted(self.pending, key=lambda k: k[1]):
+            channels = [c for c, db in self.channel_db_map.items() if db == db_id]
+            if all(self.closed[c] >= date_str for c in channels):
+                ready.append((db_id, date_str, self.pending.pop((db_id, date_str))))
+        return ready
+
+    def _submit(self, ready: list):
+        for db_id, date_str, parts in ready:
+            merged: dict[tuple[str, int], list[Segment]] = {}
+            for channel_id in sorted(parts, key=self.channel_order.__getitem__):
+                for key, segments in parts[channel_id].items():
+                    merged.setdefault(key, []).extend(segments)
+            # 日が閉じたらすぐにNotionへ
+            self.writer.start(self.evaluation_years)
+            self.writer.submit_day(db_id, date_str, merged)
+
+def add_to_bucket(day_bucket: dict[tuple[str, int], list[Segment]], msg: SlackMessage, date_str: str, index: int,
+                  channel_id: str) -> bool:
+    """日報なら解析して、その日のバケットに (人, 評価年度) ごとにメッセージ単位の行を追加する。日報だったか返す"""
+    with metrics.phase("parse"):
+        parsed = parse_report(msg, date_str, index)
+    if parsed is None:
+        return False
+    person, evaluation_year, lines = parsed
+    metrics.count("reports_parsed")
+    day_bucket.setdefault((person, evaluation_year), []).append((channel_id, msg.ts, msg.thread_ts, lines))
+    if LOG_LEVEL == "debug":
         print(f"   ✅ バケットに追加: {person} - {evaluation_year}年度 - {date_str}")
+    return True
 
-    print(f"\n📦 処理対象: {len(bucket)} 件のユーザー・日付の組み合わせ")
-    
-    if not bucket:
+def channel_fetch_range(checkpoint: CheckpointStore, channel_id: str, now: float,
+                        full: bool) -> tuple[float, str | None, str]:
+    """チャンネルの取得開始位置 (oldest, 除外する ts, 説明)"""
+    since = checkpoint.latest_ts(channel_id)
+    if INCLUDE_THREADS and since is not None and not full:
+        # 古い親に付いた新しい返信を見つけるため、履歴は遡及期間全体を見る（未変更のメッセージは解析しない）
+        return now - LOOKBACK_DAYS * 86400, None, "スレッド返信の確認を含む再照合"
+    if full or since is None:
+        mode = "全期間の再照合" if since is not None else f"遡及期間 {LOOKBACK_DAYS}日分"
+        return now - LOOKBACK_DAYS * 86400, None, mode
+    return float(since), since, "差分取得"  # 処理済みの最新 ts 自体は除く
+
+def fetch_channel(channel_id: str, oldest: float, latest: float, after_ts: str | None,
+                  checkpoint: CheckpointStore, merger: DayMerger,
+                  replies: ThreadReplyFetcher | None = None) -> dict:
+    """
+    1チャンネル分を1日ずつ取得・解析し、日が閉じるたびに merger へ渡す。
+    replies を渡すと、その日の親メッセージのうち返信が増えたスレッドの返信も取得し、
+    返信が投稿された日のバケットに入れる。
+    after_ts なしで取得範囲を丸ごと見たときは、書き込み済みなのに見つからなかったメッセージを削除されたとみなして
+    段落を取り下げる（返信は、そのスレッドを今回取り直した場合だけ）。
+    戻り値: fetched（(ts, edited.ts) の一覧）, count（取得件数）, skipped（未変更でスキップした件数）,
+            threads（(親 ts, latest_reply, 返信の ts) の一覧）, deleted（削除を検出した ts の一覧）
+    """
+    fetched: list[tuple[str, str]] = []  # (ts, edited.ts) 同期位置の保存用
+    threads: list[tuple[str, str, list[str]]] = []
+    pending_replies: dict[str, list[SlackMessage]] = {}  # 日付 → まだその日を処理していない返信
+    days = JstDayTable(oldest, latest)
+    count = skipped = 0
+    try:
+        for date_str, day in iter_day_messages(channel_id, oldest, latest, after_ts):
+            if replies is not None:
+                for parent, thread in replies.fetch(channel_id, replies.changed_threads(checkpoint, channel_id, day)):
+                    for reply in thread:
+                        pending_replies.setdefault(days.date_of(reply.ts_sec), []).append(reply)
+                    threads.append((parent.ts, parent.latest_reply, [reply.ts for reply in thread]))
+                if date_str in pending_replies:
+                    day = sorted(day + pending_replies.pop(date_str), key=attrgetter("ts_sec"))
+            # その日のバケット: (人, 評価年度) → メッセージ単位の「やったこと」行
+            day_bucket: dict[tuple[str, int], list[Segment]] = {}
+            for msg in day:
+                count += 1
+                fetched.append((msg.ts, msg.edited_ts))
+                if checkpoint.is_unchanged(channel_id, msg.ts, msg.edited_ts):
+                    skipped += 1
+                    continue
+                if not add_to_bucket(day_bucket, msg, date_str, count, channel_id) and msg.edited_ts:
+                    # 編集で日報でなくなったメッセージは、書き込み済みの段落を取り下げる
+                    merger.retract(channel_id, msg.ts)
+            merger.add(channel_id, date_str, day_bucket)
+    finally:
+        merger.finish(channel_id)
+    # 取得範囲より後に付いた返信は今回は入れず、そのスレッドは次回また取り直す
+    late = {reply.ts for rest in pending_replies.values() for reply in rest}
+    threads = [t for t in threads if not late.intersection(t[2])]
+
+    deleted: list[str] = []
+    if after_ts is None:
+        seen = {ts for ts, _ in fetched}
+        refetched = {thread_ts for thread_ts, _, _ in threads}
+        for ts, thread_ts in merger.writer.ledger.mapped_messages(channel_id, oldest, latest):
+            if ts not in seen and (not thread_ts or thread_ts in refetched):
+                merger.retract(channel_id, ts)
+                deleted.append(ts)
+    return {"fetched": fetched, "count": count, "skipped": skipped, "threads": threads, "deleted": deleted}
+
+def run(full: bool = False, dry_run: bool = False):
+    require_config()
+    print("🚀 Slack日報同期を開始します...")
+
+    checkpoint = CheckpointStore(os.path.join(CACHE_DIR, "checkpoint.json"))
+    # 前回の実行が取得を終えたあとで止まっていたら、記録したバケットから書き込みだけをやり直す
+    journal = RunJournal(os.path.join(CACHE_DIR, "journal_sync.jsonl"))
+    header = {"kind": "sync", "full": full, "channels": CHANNEL_DB_MAP}
+    previous = None if dry_run else journal.load(header)
+    fetched = next((r for r in previous or [] if r["type"] == "fetched"), None)
+    if fetched is not None:
+        results, failed_channels, window_oldest, writer = resume_run(journal, header, previous, fetched)
+    else:
+        if previous is not None:
+            print("♻️  前回の実行は取得の途中で止まっています。最初から取得し直します（書き込み済みの行は台帳で重複を防ぎます）")
+        results, failed_channels, window_oldest, writer = fetch_and_write(checkpoint, full, dry_run,
+                                                                          None if dry_run else journal, header)
+
+    count = sum(r["count"] for r in results.values())
+    skipped = sum(r["skipped"] for r in results.values())
+    metrics.count("messages_fetched", count)
+    metrics.count("messages_skipped", skipped)
+    metrics.count("buckets_submitted", writer.submitted)
+    if len(results) > 1:
+        for channel_id, result in results.items():
+            print(f"📥 {channel_id}: {result['count']} 件")
+    print(f"\n📊 合計 {count} 件のメッセージを取得しました")
+    if skipped:
+        print(f"⏭️  前回から変更のないメッセージ {skipped} 件をスキップしました")
+    print(f"📦 処理対象: {writer.submitted} 件のユーザー・日付の組み合わせ")
+    if writer.resumed:
+        print(f"♻️  前回の実行で反映済みの {writer.resumed} 件は書き込みませんでした")
+    if writer.retracted:
+        print(f"🗑️  削除された・日報でなくなったメッセージ {writer.retracted} 件の段落を取り下げます")
+
+    if not writer.submitted and not writer.resumed and not writer.retracted:
         print("❌ 処理対象の日報が見つかりませんでした")
         print("   以下の点を確認してください:")
         print("   1. Slackチャンネルに日報メッセージが投稿されているか")
         print("   2. 日報の形式が「やったこと」セクションを含んでいるか")
-        print("   3. 遡及期間（3日）内にメッセージがあるか")
+        print(f"   3. 遡及期間（{LOOKBACK_DAYS}日）内にメッセージがあるか")
+
+    if dry_run:
+        print(f"\n📝 書き込み計画: {writer.plan_summary()}")
+        print("   --dry-run のため、Notionへの書き込みと同期位置の保存は行っていません")
+        report = metrics.write_report(RUN_REPORT_PATH)
+        print(f"📈 実行レポート: {RUN_REPORT_PATH}（{report['wall_sec']:.1f}秒）")
         return
 
-    # Notion 反映
-    print(f"\n📝 Notionデータベースに反映中...")
-    
-    for (person, evaluation_year, date_str), lines in bucket.items():
-        print(f"\n👤 {person} ({evaluation_year}年度 - {date_str}) を処理中...")
-        
-        try:
-            # 該当年プロパティ付きでユーザーページを取得/作成
-            user_page_id = ensure_person_page(NOTION_DB_ID, person, evaluation_year)
-            print(f"   ✅ ユーザーページ取得/作成: {user_page_id}")
-            
-            toggle_id = find_toggle_block_by_title(user_page_id, date_str)
-            if toggle_id:
-                print(f"   🔄 既存の日付トグルを更新: {toggle_id}")
-                existing = list_paragraph_texts(toggle_id)
-                append_paragraphs_to_toggle(toggle_id, lines, existing)
-                print(f"   ✅ 既存トグルに {len(lines)} 行を追加")
-            else:
-                print(f"   ➕ 新しい日付トグルを作成")
-                append_toggle_with_paragraphs(user_page_id, date_str, lines)
-                print(f"   ✅ 新しいトグルに {len(lines)} 行を追加")
-                
-        except Exception as e:
-            print(f"   ❌ エラーが発生しました: {e}")
-    
-    print(f"\n🎉 同期完了！ {len(bucket)} 件の日報を処理しました")
+    # 同期位置を保存（失敗した日報は次回また拾えるよう、記録も進めない）
+    # 取得に失敗したチャンネルは途中までの結果が分からないので、同期位置を動かさない
+    for channel_id, result in results.items():
+        failed_ts = {ts for c, ts in writer.failed_ts if c == channel_id}
+        for ts, edited_ts in result["fetched"]:
+            if ts not in failed_ts:
+                checkpoint.record(channel_id, ts, edited_ts)
+        for thread_ts, latest_reply, reply_ts in result["threads"]:
+            if not failed_ts.intersection(reply_ts):
+                checkpoint.record_thread(channel_id, thread_ts, latest_reply)
+        for ts in result["deleted"]:
+            if ts not in failed_ts:
+                checkpoint.forget(channel_id, ts)
+        checkpoint.advance(channel_id, next_checkpoint_ts([ts for ts, _ in result["fetched"]], failed_ts),
+                           window_oldest)
+    checkpoint.save()
+    journal.discard()
+    if writer.failed_ts:
+        print(f"\n⚠️  反映に失敗した日報があるため、同期位置は失敗箇所の手前までしか進めていません")
+
+    if writer.submitted:
+        print(f"\n🎉 同期完了！ {writer.submitted} 件の日報を処理しました（{writer.plan_summary()}）")
+
+    report = metrics.write_report(RUN_REPORT_PATH)
+    metrics.write_step_summary(report)
+    print(f"📈 実行レポート: {RUN_REPORT_PATH}（{report['wall_sec']:.1f}秒）")
+    if failed_channels:
+        raise SystemExit(f"❌ 取得に失敗したチャンネルがあります: {', '.join(failed_channels)}")
+
+def fetch_and_write(checkpoint: CheckpointStore, full: bool, dry_run: bool, journal: RunJournal | None,
+                    header: dict) -> tuple[dict[str, dict], list[str], float, NotionWriter]:
+    """全チャンネルを並列に取得・解析しながら書き込む。(チャンネルごとの結果, 取得に失敗したチャンネル, 遡及期間の始まり, writer)"""
+    now = time.time()
+    window_oldest = now - LOOKBACK_DAYS * 86400
+    if full:
+        print("🔁 全期間の再照合モード（前回から変更のないメッセージはスキップ）")
+
+    channels = list(CHANNEL_DB_MAP)
+    print(f"📡 Slackチャンネル {', '.join(channels)} からメッセージを1日ずつ取得・解析し、閉じた日から順にNotionへ反映します...")
+
+    ranges = {channel_id: channel_fetch_range(checkpoint, channel_id, now, full) for channel_id in channels}
+    for channel_id, (oldest, _, mode) in ranges.items():
+        print(f"📅 {channel_id}: {mode}（{datetime.fromtimestamp(oldest, tz=JST).strftime('%Y-%m-%d %H:%M:%S')} JST 以降）")
+
+    if journal is not None:
+        journal.start(header)
+    writer = NotionWriter(notion_db_ids(), dry_run=dry_run, journal=journal)
+    evaluation_years = {evaluation_year_of(d)
+                        for d, _, _ in jst_day_windows(min(oldest for oldest, _, _ in ranges.values()), now)}
+    merger = DayMerger(CHANNEL_DB_MAP, writer, evaluation_years)
+    replies = ThreadReplyFetcher(SLACK_REPLY_WORKERS) if INCLUDE_THREADS else None
+    results: dict[str, dict] = {}
+    failed_channels: list[str] = []
+
+    try:
+        # チャンネルごとの取得は並列。ユーザー名・ページ索引・レート制限は全チャンネルで共有する
+        with ThreadPoolExecutor(max_workers=max(1, min(SLACK_FETCH_WORKERS, len(channels)))) as executor:
+            futures = {executor.submit(fetch_channel, channel_id, oldest, now, after_ts, checkpoint, merger, replies): channel_id
+                       for channel_id, (oldest, after_ts, _) in ranges.items()}
+            for future, channel_id in futures.items():
+                try:
+                    results[channel_id] = future.result()
+                except Exception as e:
+                    print(f"❌ {channel_id}: 取得中にエラーが発生しました: {e}")
+                    failed_channels.append(channel_id)
+        # ここまでのバケットはすべて記録済みなので、以降に止まっても取得・解析はやり直さなくてよい
+        if journal is not None:
+            journal.append("fetched", results=results, failed_channels=failed_channels, window_oldest=window_oldest,
+                           evaluation_years=sorted(evaluation_years))
+    finally:
+        if replies is not None:
+            replies.close()
+        writer.close()
+        user_directory.save()
+    return results, failed_channels, window_oldest, writer
+
+def resume_run(journal: RunJournal, header: dict, previous: list[dict],
+               fetched: dict) -> tuple[dict[str, dict], list[str], float, NotionWriter]:
+    """前回の実行の記録から、反映が終わっていないバケットだけを書き込み直す（Slackからは取得しない）"""
+    print("♻️  前回の実行が書き込みの途中で止まっています。記録したバケットから再開します（Slackからの取得・解析は行いません）")
+    journal.start(header, previous)
+    writer = NotionWriter(notion_db_ids(), journal=journal, skip_days=done_days(previous))
+    writer.record_buckets = False  # バケットは記録済み
+    try:
+        writer.start(fetched["evaluation_years"])
+        for record in previous:
+            if record["type"] == "day":
+                writer.submit_day(record["db"], record["date"],
+                                  {(person, year): [tuple(seg) for seg in segments]
+                                   for person, year, segments in record["bucket"]})
+            elif record["type"] == "retract":
+                writer.retract(record["channel"], record["ts"])
+    finally:
+        writer.close()
+        user_directory.save()
+    return fetched["results"], fetched["failed_channels"], fetched["window_oldest"], writer
+
+# ====== 評価年度のバックフィル ======
+def backfill_windows(start: float, end: float, days: int) -> list[tuple[str, float, float]]:
+    """[start, end) を days 日ずつの時間窓 (開始日, 開始, 終了) に分ける（start は JST の0時）"""
+    windows = []
+    day_starts = list(jst_day_windows(start, end))
+    for i in range(0, len(day_starts), max(1, days)):
+        chunk = day_starts[i:i + days]
+        windows.append((chunk[0][0], chunk[0][1], chunk[-1][2]))
+    return windows
+
+def collect_window(channel_id: str, start: float, end: float) -> tuple[list, int]:
+    """1チャンネル×1時間窓を取得・解析し、([(日付, バケット)], 取得件数) を返す"""
+    days = []
+    count = 0
+    for date_str, day in iter_day_messages(channel_id, start, end):
+        day_bucket: dict[tuple[str, int], list[Segment]] = {}
+        for msg in day:
+            count += 1
+            add_to_bucket(day_bucket, msg, date_str, count, channel_id)
+        days.append((date_str, day_bucket))
+    return days, count
+
+def run_backfill(evaluation_year: int, dry_run: bool = False):
+    """
+    評価年度1年分を作り直す。年度を BACKFILL_WINDOW_DAYS 日ずつの時間窓に分けて並列に取得し、
+    終わった窓から古い順にNotionへ渡す（ページごとに日付順でまとめて書き込む）。
+    反映まで終わった窓は backfill_<年度>.json に記録し、再実行時は飛ばす。
+    書き込みに渡した窓のバケットと反映が終わったページ×日付は journal_backfill_<年度>.jsonl に記録するので、
+    ジョブが途中で止まっても、次の実行では記録済みの窓を取得し直さず、反映が終わっていない日だけを書き込む。
+    """
+    require_config()
+    print(f"🚀 {evaluation_year}年度のバックフィルを開始します...")
+    now = time.time()
+    year_start, year_end = evaluation_year_range(evaluation_year)
+    if year_start >= now:
+        raise SystemExit(f"❌ {evaluation_year}年度はまだ始まっていません")
+    windows = backfill_windows(year_start, year_end, BACKFILL_WINDOW_DAYS)
+    progress = BackfillProgress(os.path.join(CACHE_DIR, f"backfill_{evaluation_year}.json"))
+    channels = list(CHANNEL_DB_MAP)
+    journal = RunJournal(os.path.join(CACHE_DIR, f"journal_backfill_{evaluation_year}.jsonl"))
+    header = {"kind": "backfill", "year": evaluation_year, "channels": CHANNEL_DB_MAP, "window_days": BACKFILL_WINDOW_DAYS}
+    previous = (None if dry_run else journal.load(header)) or []
+
+    # 未来の窓は取得しない。今日を含む窓は途中までなので完了扱いにしない
+    todo = [(i, channel_id) for i, (label, start, _) in enumerate(windows) if start < now
+            for channel_id in channels if not progress.is_done(channel_id, label)]
+    # 前回の実行で書き込みに渡した窓は、記録したバケットを使う（取得し直さない）
+    todo_set = set(todo)
+    fetched: dict[tuple[int, str], list | None] = {   # 取得が終わって、まだ書き込みに渡していない窓
+        (r["window"], r["channel"]): [(date_str, {(person, year): [tuple(seg) for seg in segments]
+                                                 for person, year, segments in bucket})
+                                      for date_str, bucket in r["days"]]
+        for r in previous if r["type"] == "window" and (r["window"], r["channel"]) in todo_set
+    }
+    replayed = set(fetched)
+    print(f"📅 {len(windows)} 個の時間窓（{BACKFILL_WINDOW_DAYS}日ずつ）× {len(channels)} チャンネル。"
+          f"未完了 {len(todo)} 件を取得します" + (f"（うち {len(replayed)} 件は前回の記録から再開）" if replayed else ""))
+
+    if not dry_run:
+        journal.start(header, previous)
+    writer = NotionWriter(notion_db_ids(), dry_run=dry_run,
+                          journal=None if dry_run else journal, skip_days=done_days(previous))
+    writer.record_buckets = False  # バケットは窓ごとに記録する
+    merger = DayMerger(CHANNEL_DB_MAP, writer, {evaluation_year})
+    submitted: dict[tuple[int, str], set[str]] = {}    # 書き込みに渡した窓 → 元メッセージの ts
+    pending = set(todo) - replayed
+    released = 0
+    count = 0
+
+    def release_ready():
+        # 古い窓から順に渡す（同じ人・同じ日を全チャンネルでまとめ、ページ内を日付順に保つため）
+        nonlocal released
+        while released < len(windows) and not any((released, c) in pending for c in channels):
+            for channel_id in channels:
+                days = fetched.pop((released, channel_id), None)
+                if days is None:
+                    continue
+                if not dry_run and (released, channel_id) not in replayed:
+                    journal.append("window", window=released, channel=channel_id,
+                                   days=[[date_str, [[person, year, segments] for (person, year), segments in bucket.items()]]
+                                         for date_str, bucket in days])
+                for date_str, day_bucket in days:
+                    merger.add(channel_id, date_str, day_bucket)
+                submitted[(released, channel_id)] = {ts for _, day_bucket in days
+                                                     for segments in day_bucket.values() for _, ts, _, _ in segments}
+            released += 1
+
+    try:
+        release_ready()
+        with ThreadPoolExecutor(max_workers=max(1, SLACK_FETCH_WORKERS)) as executor:
+            futures = {executor.submit(collect_window, channel_id, windows[i][1], min(windows[i][2], now)): (i, channel_id)
+                       for i, channel_id in todo if (i, channel_id) not in replayed}
+            for future in as_completed(futures):
+                i, channel_id = futures[future]
+                try:
+                    days, n = future.result()
+                    fetched[(i, channel_id)] = days
+                    count += n
+                except Exception as e:
+                    print(f"❌ {channel_id} {windows[i][0]}〜: 取得中にエラーが発生しました: {e}")
+                pending.discard((i, channel_id))
+                release_ready()
+    finally:
+        for channel_id in channels:
+            merger.finish(channel_id)
+        writer.close()
+        user_directory.save()
+        # 反映に失敗した日報がなく、期間が最後まで取得済みの窓だけを完了にする
+        for (i, channel_id), ts_set in submitted.items():
+            failed = {ts for c, ts in writer.failed_ts if c == channel_id}
+            if windows[i][2] <= now and not failed.intersection(ts_set) and not dry_run:
+                progress.mark_done(channel_id, windows[i][0])
+        progress.save()
+
+    done = sum(progress.is_done(c, label) for label, _, _ in windows for c in channels)
+    metrics.count("messages_fetched", count)
+    metrics.count("buckets_submitted", writer.submitted)
+    print(f"\n📊 {count} 件のメッセージから {writer.submitted} 件のユーザー・日付の組み合わせを反映しました")
+    if writer.resumed:
+        print(f"♻️  前回の実行で反映済みの {writer.resumed} 件は書き込みませんでした")
+    print(f"📌 完了した時間窓: {done} / {len(windows) * len(channels)}")
+    if dry_run:
+        print(f"📝 書き込み計画: {writer.plan_summary()}（--dry-run のため書き込んでいません）")
+    report = metrics.write_report(RUN_REPORT_PATH)
+    metrics.write_step_summary(report)
+    print(f"📈 実行レポート: {RUN_REPORT_PATH}（{report['wall_sec']:.1f}秒）")
+    if writer.failed_ts or len(submitted) < len(todo):
+        raise SystemExit("⚠️  未完了の時間窓があります。同じコマンドを再実行すると続きから処理します")
+    if not dry_run:
+        journal.discard()
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Slackの日報をNotionに同期します")
+    parser.add_argument("--full", action="store_true",
+                        help="前回の同期位置を使わず LOOKBACK_DAYS 全期間を再照合する")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Notionへの書き込み計画を表示するだけで、書き込みも同期位置の保存もしない")
+    subparsers = parser.add_subparsers(dest="command")
+    backfill = subparsers.add_parser("backfill", help="評価年度1年分をまとめて取り込み直す")
+    backfill.add_argument("--year", type=int, required=True, help="評価年度（例: 2025 → 2025-04-01〜2026-03-31）")
+    args = parser.parse_args()
+    if args.command == "backfill":
+        run_backfill(args.year, dry_run=args.dry_run)
+    else:
+        run(full=args.full, dry_run=args.dry_run)
@@ -0,0 +1,182 @@
+"""
+同期1回分の計測（エンドポイント別の呼び出し回数・レイテンシ、レート制限の待ち時間、処理段階ごとの時間）。
+最後に JSON のレポートと GitHub Actions のステップサマリー（Markdown）に書き出す。
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from sync_state import write_json_atomic
+
+# レイテンシのヒストグラムの区切り（ミリ秒、上限を含む）
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 処理段階（レポートでの表示順）
+PHASES = ("fetch", "parse", "page", "toggle", "append")
+
+
+def endpoint_name(method: str, path: str) -> str:
+    """Notion のパスからIDを伏せたエンドポイント名を作る（例: PATCH blocks/{id}/children）"""
+    parts = path.strip("/").split("/")
+    masked = [p if i == 0 or p in ("query", "children") else "{id}" for i, p in enumerate(parts)]
+    return f"{method.upper()} {'/'.join(masked)}"
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # 最後は上限超え
+
+    def add(self, seconds: float, ok: bool = True):
+        ms = seconds * 1000
+        self.count += 1
+        self.errors += 0 if ok else 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile_ms(self, q: float) -> float:
+        """ヒストグラムから求めた近似パーセンタイル（該当バケットの上限。最大値は超えない）"""
+        if not self.count:
+            return 0.0
+        max_ms = round(self.max * 1000, 1)
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(float(bound), max_ms)
+        return max_ms
+
+    def to_dict(self) -> dict:
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_sec": round(self.total, 3),
+            "avg_ms": round(self.total / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": self.percentile_ms(0.5),
+            "p95_ms": self.percentile_ms(0.95),
+            "max_ms": round(self.max * 1000, 1),
+            "histogram": {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+class RunMetrics:
+    """
+    スレッド間で共有する計測値。
+    段階ごとの時間はワーカーをまたいで合算するので、並列実行中は実時間より大きくなる。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.calls: dict[tuple[str, str], LatencyHistogram] = {}
+        self.rate_limit_sleep: dict[str, float] = {}
+        self.rate_limited: dict[str, int] = {}
+        self.phases: dict[str, list] = {}  # 段階 → [回数, 合計秒]
+        self.counters: dict[str, int] = {}
+
+    def record_call(self, service: str, endpoint: str, seconds: float, ok: bool = True):
+        with self.lock:
+            self.calls.setdefault((service, endpoint), LatencyHistogram()).add(seconds, ok)
+
+    def record_rate_limit(self, service: str, slept: float = 0.0, hit: bool = False):
+        """レート制限で待った秒数（と 429 を受けたか）を記録"""
+        with self.lock:
+            if slept:
+                self.rate_limit_sleep[service] = self.rate_limit_sleep.get(service, 0.0) + slept
+            if hit:
+                self.rate_limited[service] = self.rate_limited.get(service, 0) + 1
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                entry = self.phases.setdefault(name, [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self) -> dict:
+        with self.lock:
+            services = sorted({service for service, _ in self.calls})
+            order = [p for p in PHASES if p in self.phases] + sorted(set(self.phases) - set(PHASES))
+            return {
+                "started_at": self.started_at,
+                "wall_sec": round(time.perf_counter() - self.started, 3),
+                "counters": dict(sorted(self.counters.items())),
+                "phases": {
+                    name: {"count": self.phases[name][0], "total_sec": round(self.phases[name][1], 3)}
+                    for name in order
+                },
+                "services": {
+                    service: {
+                        "calls": sum(h.count for (s, _), h in self.calls.items() if s == service),
+                        "errors": sum(h.errors for (s, _), h in self.calls.items() if s == service),
+                        "rate_limited": self.rate_limited.get(service, 0),
+                        "rate_limit_sleep_sec": round(self.rate_limit_sleep.get(service, 0.0), 3),
+                        "endpoints": {
+                            endpoint: h.to_dict()
+                            for (s, endpoint), h in sorted(self.calls.items()) if s == service
+                        },
+                    }
+                    for service in services
+                },
+            }
+
+    def write_report(self, path: str) -> dict:
+        report = self.report()
+        write_json_atomic(path, report)
+        return report
+
+    @staticmethod
+    def step_summary(report: dict) -> str:
+        """GitHub Actions のステップサマリー用 Markdown"""
+        lines = [f"### 日報同期 ({report['wall_sec']:.1f}秒)", ""]
+        if report["counters"]:
+            lines += ["| 項目 | 件数 |", "|---|---:|"]
+            lines += [f"| {name} | {n} |" for name, n in report["counters"].items()]
+            lines.append("")
+        if report["phases"]:
+            lines += ["| 段階 | 回数 | 合計(秒) |", "|---|---:|---:|"]
+            lines += [f"| {name} | {p['count']} | {p['total_sec']:.2f} |" for name, p in report["phases"].items()]
+            lines.append("")
+        if report["services"]:
+            lines += ["| API | エンドポイント | 回数 | エラー | 平均(ms) | p95(ms) | 最大(ms) |",
+                      "|---|---|---:|---:|---:|---:|---:|"]
+            for service, s in report["services"].items():
+                for endpoint, h in s["endpoints"].items():
+                    lines.append(f"| {service} | `{endpoint}` | {h['count']} | {h['errors']} | "
+                                 f"{h['avg_ms']} | {h['p95_ms']} | {h['max_ms']} |")
+            lines.append("")
+            for service, s in report["services"].items():
+                lines.append(f"- {service}: {s['calls']} 回（429: {s['rate_limited']} 回、"
+                             f"レート制限の待ち {s['rate_limit_sleep_sec']:.1f} 秒）")
+        return "\n".join(lines) + "\n"
+
+    def write_step_summary(self, report: dict, path: str | None = None):
+        """GITHUB_STEP_SUMMARY があれば追記する（ローカル実行では何もしない）"""
+        path = path or os.getenv("GITHUB_STEP_SUMMARY")
+        if not path:
+            return
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.step_summary(report))
@@ -0,0 +1,635 @@
+"""
+同期処理で実行間に引き継ぐ状態（キャッシュディレクトリ内に保存）
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def write_json_atomic(path: str, data: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _load_json(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class CheckpointStore:
+    """
+    チャンネルごとの同期位置。
+      latest_ts: 処理済みの最新メッセージ ts（次回は oldest= にこれを渡す）
+      seen:      直近メッセージの ts → edited.ts（未編集は ""）。全期間の再照合で未変更分を飛ばす
+      threads:   スレッドの親 ts → 取り込み済みの latest_reply。変わっていないスレッドは返信を取り直さない
+    定期同期と常駐モード（event_receiver.py）が同じファイルを使うので、save() はファイルロックの中で
+    読み直し、この実行で変えた分（pending）だけを重ねて書く（相手の変更を上書きしない）。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = _load_json(path)
+        self.data.setdefault("channels", {})
+        self.pending: list[tuple[str, tuple]] = []  # 前回の save() 以降の変更（メソッド名, 引数）
+
+    def _channel(self, channel_id: str) -> dict:
+        return _checkpoint_channel(self.data, channel_id)
+
+    def latest_ts(self, channel_id: str) -> str | None:
+        return self._channel(channel_id)["latest_ts"]
+
+    def is_unchanged(self, channel_id: str, ts: str, edited_ts: str) -> bool:
+        """前回までに同じ版（edited.ts）を処理済みか"""
+        return self._channel(channel_id)["seen"].get(ts) == edited_ts
+
+    def record(self, channel_id: str, ts: str, edited_ts: str):
+        self._apply("record", channel_id, ts, edited_ts)
+
+    def forget(self, channel_id: str, ts: str):
+        """削除されたメッセージの記録を消す"""
+        self._apply("forget", channel_id, ts)
+
+    def thread_latest_reply(self, channel_id: str, thread_ts: str) -> str | None:
+        return self._channel(channel_id).get("threads", {}).get(thread_ts)
+
+    def record_thread(self, channel_id: str, thread_ts: str, latest_reply: str):
+        self._apply("record_thread", channel_id, thread_ts, latest_reply)
+
+    def advance(self, channel_id: str, latest_ts: str | None, keep_since: float):
+        """同期位置を進め（latest_ts が None なら進めない）、keep_since より古い seen を捨てる"""
+        self._apply("advance", channel_id, latest_ts, keep_since)
+
+    def _apply(self, op: str, *args):
+        _CHECKPOINT_OPS[op](self.data, *args)
+        self.pending.append((op, args))
+
+    def save(self):
+        with _file_lock(self.path + ".lock"):
+            data = _load_json(self.path)
+            data.setdefault("channels", {})
+            for op, args in self.pending:
+                _CHECKPOINT_OPS[op](data, *args)
+            write_json_atomic(self.path, data)
+        self.data, self.pending = data, []
+
+
+def _checkpoint_channel(data: dict, channel_id: str) -> dict:
+    return data["channels"].setdefault(channel_id, {"latest_ts": None, "seen": {}})
+
+
+def _checkpoint_record(data: dict, channel_id: str, ts: str, edited_ts: str):
+    _checkpoint_channel(data, channel_id)["seen"][ts] = edited_ts
+
+
+def _checkpoint_forget(data: dict, channel_id: str, ts: str):
+    _checkpoint_channel(data, channel_id)["seen"].pop(ts, None)
+
+
+def _checkpoint_record_thread(data: dict, channel_id: str, thread_ts: str, latest_reply: str):
+    _checkpoint_channel(data, channel_id).setdefault("threads", {})[thread_ts] = latest_reply
+
+
+def _checkpoint_advance(data: dict, channel_id: str, latest_ts: str | None, keep_since: float):
+    ch = _checkpoint_channel(data, channel_id)
+    if latest_ts and (ch["latest_ts"] is None or float(latest_ts) > float(ch["latest_ts"])):
+        ch["latest_ts"] = latest_ts
+    ch["seen"] = {ts: ed for ts, ed in ch["seen"].items() if float(ts) >= keep_since}
+    if "threads" in ch:
+        ch["threads"] = {ts: r for ts, r in ch["threads"].items() if float(ts) >= keep_since}
+
+
+# CheckpointStore の変更（保存時に読み直したデータへ同じ順に重ね直す）
+_CHECKPOINT_OPS = {
+    "record": _checkpoint_record,
+    "forget": _checkpoint_forget,
+    "record_thread": _checkpoint_record_thread,
+    "advance": _checkpoint_advance,
+}
+
+
+@contextmanager
+def _file_lock(path: str):
+    """プロセス間の排他（fcntl がない環境ではロックしない）"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class BackfillProgress:
+    """
+    評価年度のバックフィルの進捗。取得とNotionへの反映が最後まで終わった時間窓を (チャンネル, 窓の開始日) で覚え、
+    中断後の再実行ではその窓を飛ばす。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.done = set(json.load(f).get("done", []))
+        except (OSError, ValueError):
+            self.done = set()
+
+    @staticmethod
+    def _key(channel_id: str, window_start: str) -> str:
+        return f"{channel_id}:{window_start}"
+
+    def is_done(self, channel_id: str, window_start: str) -> bool:
+        return self._key(channel_id, window_start) in self.done
+
+    def mark_done(self, channel_id: str, window_start: str):
+        self.done.add(self._key(channel_id, window_start))
+
+    def save(self):
+        write_json_atomic(self.path, {"done": sorted(self.done)})
+
+
+class LayoutMigrationProgress:
+    """
+    トグルのレイアウト移行（migrate_layout.py）の進捗。移行が終わったページIDを覚え、
+    中断後の再実行ではそのページを飛ばす。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.done = set(json.load(f).get("done", []))
+        except (OSError, ValueError):
+            self.done = set()
+
+    def is_done(self, page_id: str) -> bool:
+        return page_id in self.done
+
+    def mark_done(self, page_id: str):
+        """ページごとにすぐ保存する（ページは並列に移行する）"""
+        with self.lock:
+            self.done.add(page_id)
+            write_json_atomic(self.path, {"done": sorted(self.done)})
+
+
+class RunJournal:
+    """
+    実行の先行書き込みログ（JSONL、1行ごとに flush + fsync）。ジョブが途中で止まっても、次の実行で続きから再開できるようにする。
+      {"type": "run", ...}:     実行の開始（再開できる実行かどうかの確認用）
+      {"type": "day", ...}:     NotionWriter に投入した1日分のバケット（DB, 日付, [[メンバー名, 評価年度, メッセージ], ...]）
+      {"type": "retract", ...}: 取り下げたメッセージ (チャンネル, ts)
+      {"type": "window", ...}:  バックフィルで書き込みに渡した時間窓と、その日ごとのバケット
+      {"type": "fetched", ...}: 取得と解析がすべて終わった（同期位置の保存に使う結果）
+      {"type": "done", ...}:    ページ×日付の反映が終わった（ページIDと日付トグルのID）
+    最後まで終わったら discard() で消す。残っていれば前回は途中で止まっている。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def load(self, header: dict) -> list[dict] | None:
+        """前回の実行の記録を返す（同じ種類の実行でなければ None）。書きかけの最後の行は捨てる"""
+        records = []
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+        except OSError:
+            return None
+        if not records or records[0] != dict(header, type="run"):
+            return None
+        return records[1:]
+
+    def start(self, header: dict, records: list[dict] | None = None):
+        """新しく書き始める（records を渡すと、再開のために前回の記録を書き直してから続ける）"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.file = open(self.path, "w", encoding="utf-8")
+        for record in [dict(header, type="run"), *(records or [])]:
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._sync()
+
+    def append(self, record_type: str, **record):
+        if self.file is None:
+            return
+        line = json.dumps({"type": record_type, **record}, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self._sync()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def discard(self):
+        """実行が最後まで終わったら消す"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def done_days(records: list[dict]) -> set[tuple[str, str, int, str]]:
+    """記録から、反映が終わった (DB, メンバー名, 評価年度, 日付)"""
+    return {(r["db"], r["person"], r["year"], date) for r in records if r["type"] == "done" for date in r["dates"]}
+
+
+def line_hash(line: str) -> str:
+    return hashlib.sha1(line.strip().encode("utf-8")).hexdigest()
+
+
+def _parse_iso(ts: str) -> datetime:
+    return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+
+class DedupLedger:
+    """
+    Notionに書き込んだ行の台帳（SQLite）。(page_id, 日付, sha1(行)) で引けるので、
+    既存トグルへの追記時に段落一覧を取り直さずに重複判定できる。
+    トグルの last_edited_time が前回の書き込みより新しい（手動編集された）場合は信用しない。
+    あわせて Slackメッセージ (チャンネル, ts) → 書き込んだ段落ブロック の対応（message_blocks）を持ち、
+    編集・削除されたメッセージの段落だけを更新・アーカイブできるようにする。
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS ledger_lines ("
+                " page_id TEXT NOT NULL, date TEXT NOT NULL, line_hash TEXT NOT NULL,"
+                " PRIMARY KEY (page_id, date, line_hash))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS ledger_toggles ("
+                " page_id TEXT NOT NULL, date TEXT NOT NULL, toggle_id TEXT NOT NULL, synced_at TEXT NOT NULL,"
+                " PRIMARY KEY (page_id, date))"
+            )
+            # blocks: [[段落ブロックID（トグルと一緒に作った段落は未取得で null）, sha1(行)], ...]（並び順）
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS message_blocks ("
+                " channel TEXT NOT NULL, ts TEXT NOT NULL, thread_ts TEXT NOT NULL,"
+                " db_id TEXT NOT NULL, person TEXT NOT NULL, year INTEGER NOT NULL,"
+                " page_id TEXT NOT NULL, date TEXT NOT NULL, toggle_id TEXT NOT NULL, blocks TEXT NOT NULL,"
+                " PRIMARY KEY (channel, ts))"
+            )
+
+    def is_trusted(self, page_id: str, date: str, toggle_id: str, last_edited_time: str | None) -> bool:
+        """台帳の内容がトグルの現状と一致しているとみなせるか"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT toggle_id, synced_at FROM ledger_toggles WHERE page_id = ? AND date = ?",
+                (page_id, date),
+            ).fetchone()
+        if row is None or row[0] != toggle_id or not last_edited_time:
+            return False
+        # Notion の last_edited_time は分単位に丸められるので、書き込み時刻以下なら手動編集なし
+        return _parse_iso(last_edited_time) <= _parse_iso(row[1])
+
+    def hashes(self, page_id: str, date: str) -> set[str]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT line_hash FROM ledger_lines WHERE page_id = ? AND date = ?", (page_id, date)
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def reseed(self, page_id: str, date: str, toggle_id: str, texts):
+        """Notionから読み直した段落で台帳を作り直す"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM ledger_lines WHERE page_id = ? AND date = ?", (page_id, date))
+            self._insert(page_id, date, toggle_id, texts)
+
+    def record(self, page_id: str, date: str, toggle_id: str, lines):
+        """書き込んだ行を記録する"""
+        with self.lock, self.conn:
+            self._insert(page_id, date, toggle_id, lines)
+
+    def _insert(self, page_id: str, date: str, toggle_id: str, lines):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO ledger_lines (page_id, date, line_hash) VALUES (?, ?, ?)",
+            [(page_id, date, line_hash(line)) for line in lines],
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ledger_toggles (page_id, date, toggle_id, synced_at) VALUES (?, ?, ?, ?)",
+            (page_id, date, toggle_id, datetime.now(timezone.utc).isoformat()),
+        )
+
+    def distrust(self, page_id: str, date: str):
+        """
+        トグルに書き込む前と、書き込みに失敗したときに呼ぶ。書き込みの結果を記録する（record）までは
+        台帳を信用せず、途中で止まったり失敗した応答の裏で反映されていたりしても、次回は段落一覧を取り直して確かめる
+        """
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM ledger_toggles WHERE page_id = ? AND date = ?", (page_id, date))
+
+    def message_blocks(self, keys) -> dict[tuple[str, str], tuple[str, list[list]]]:
+        """(チャンネル, ts) → (トグルID, [[ブロックID, 行のハッシュ], ...])"""
+        found = {}
+        with self.lock:
+            for channel, ts in keys:
+                row = self.conn.execute(
+                    "SELECT toggle_id, blocks FROM message_blocks WHERE channel = ? AND ts = ?", (channel, ts)
+                ).fetchone()
+                if row is not None:
+                    found[(channel, ts)] = (row[0], json.loads(row[1]))
+        return found
+
+    def toggle_messages(self, page_id: str, date: str, toggle_id: str) -> set[tuple[str, str]]:
+        """トグルに段落を書き込んだメッセージ (チャンネル, ts)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT channel, ts FROM message_blocks WHERE page_id = ? AND date = ? AND toggle_id = ?",
+                (page_id, date, toggle_id),
+            ).fetchall()
+        return {(channel, ts) for channel, ts in rows}
+
+    def drop_toggle(self, page_id: str, date: str):
+        """日付トグルをアーカイブしたときに、その日の記録をすべて消す"""
+        with self.lock, self.conn:
+            for table in ("ledger_lines", "ledger_toggles", "message_blocks"):
+                self.conn.execute(f"DELETE FROM {table} WHERE page_id = ? AND date = ?", (page_id, date))
+
+    def message_page(self, channel: str, ts: str) -> tuple[str, str, int, str] | None:
+        """メッセージを書き込んだ (DB, メンバー名, 評価年度, 日付)"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT db_id, person, year, date FROM message_blocks WHERE channel = ? AND ts = ?", (channel, ts)
+            ).fetchone()
+
+    def mapped_messages(self, channel: str, oldest: float, latest: float) -> list[tuple[str, str]]:
+        """期間内に書き込んだメッセージの (ts, 親スレッドの ts)"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT ts, thread_ts FROM message_blocks WHERE channel = ?"
+                " AND CAST(ts AS REAL) >= ? AND CAST(ts AS REAL) < ?",
+                (channel, oldest, latest),
+            ).fetchall()
+
+    def record_messages(self, page_key: tuple[str, str, int], page_id: str, date: str, toggle_id: str, messages):
+        """
+        メッセージごとの段落を1トランザクションで記録する。messages は (チャンネル, ts, 親スレッドの ts, blocks)。
+        blocks が空のメッセージは記録を消す
+        """
+        db_id, person, year = page_key
+        rows = [(channel, ts, thread_ts, db_id, person, year, page_id, date, toggle_id, json.dumps(blocks))
+                for channel, ts, thread_ts, blocks in messages if blocks]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM message_blocks WHERE channel = ? AND ts = ?",
+                [(channel, ts) for channel, ts, _, blocks in messages if not blocks],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO message_blocks"
+                " (channel, ts, thread_ts, db_id, person, year, page_id, date, toggle_id, blocks)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def replace_lines(self, page_id: str, date: str, toggle_id: str, removed: set[str], lines):
+        """
+        メッセージの編集を反映する。removed（消した行のハッシュ）は、同じ日の他のメッセージが
+        書いた行でなければ台帳から除き、lines（新しく書いた行）を追加する
+        """
+        with self.lock, self.conn:
+            if removed:
+                still_used = {
+                    h for (blocks,) in self.conn.execute(
+                        "SELECT blocks FROM message_blocks WHERE page_id = ? AND date = ?", (page_id, date))
+                    for _, h in json.loads(blocks)
+                }
+                self.conn.executemany(
+                    "DELETE FROM ledger_lines WHERE page_id = ? AND date = ? AND line_hash = ?",
+                    [(page_id, date, h) for h in removed - still_used],
+                )
+            self._insert(page_id, date, toggle_id, lines)
+
+    def move_toggle(self, page_id: str, date: str, toggle_id: str, texts):
+        """
+        日付トグルを作り直した（レイアウトの移行）ときに、台帳を新しいトグルの段落で作り直す。
+        メッセージの段落はブロックIDが変わるので未取得（null）に戻し、編集時に一覧から対応付ける
+        """
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM ledger_lines WHERE page_id = ? AND date = ?", (page_id, date))
+            self._insert(page_id, date, toggle_id, texts)
+            rows = self.conn.execute(
+                "SELECT channel, ts, blocks FROM message_blocks WHERE page_id = ? AND date = ?", (page_id, date)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE message_blocks SET toggle_id = ?, blocks = ? WHERE channel = ? AND ts = ?",
+                [(toggle_id, json.dumps([[None, h] for _, h in json.loads(blocks)]), channel, ts)
+                 for channel, ts, blocks in rows],
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class NotionMirror:
+    """
+    Notionの日報データベースの写し（SQLite、台帳と同じファイル）。
+      mirror_pages:   (DB, メンバー名, 評価年度) → ページID、ページの last_edited_time、子ブロックを最後に確認した時刻
+      mirror_toggles: ページID（または月のトグルID） → {タイトル → トグルID, last_edited_time}
+      mirror_containers: 月のトグルID → ページID、子ブロックを最後に確認した時刻（NOTION_LAYOUT=month）
+      mirror_queries: (DB, 評価年度) → 最後にDBを問い合わせた時刻と、全件を取り直した時刻
+    次回はDBを last_edited_time で絞って変わったページだけを取り、ページの last_edited_time が
+    子ブロックの確認時刻以下なら、子ブロック一覧を取り直さずに写しのトグルを使う。
+    月のトグルの中が編集されてもページの last_edited_time が進むので、月のトグルも同じ判定で扱う。
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS mirror_pages ("
+                " db_id TEXT NOT NULL, person TEXT NOT NULL, year INTEGER NOT NULL, page_id TEXT NOT NULL,"
+                " last_edited_time TEXT, children_synced_at TEXT,"
+                " PRIMARY KEY (db_id, person, year))"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS mirror_pages_page_id ON mirror_pages (page_id)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS mirror_toggles ("
+                " page_id TEXT NOT NULL, title TEXT NOT NULL, toggle_id TEXT NOT NULL, last_edited_time TEXT,"
+                " PRIMARY KEY (page_id, title))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS mirror_containers ("
+                " toggle_id TEXT PRIMARY KEY, page_id TEXT NOT NULL, children_synced_at TEXT NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS mirror_queries ("
+                " db_id TEXT NOT NULL, year INTEGER NOT NULL, queried_at TEXT NOT NULL, full_at TEXT NOT NULL,"
+                " PRIMARY KEY (db_id, year))"
+            )
+
+    def last_query(self, db_id: str, year: int) -> tuple[str, str] | None:
+        """(前回の問い合わせ時刻, 前回全件を取り直した時刻)"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT queried_at, full_at FROM mirror_queries WHERE db_id = ? AND year = ?", (db_id, year)
+            ).fetchone()
+
+    def update_pages(self, db_id: str, year: int, pages: list[tuple[str, str, str | None]],
+                     queried_at: str, full: bool):
+        """
+        問い合わせ結果 [(メンバー名, ページID, last_edited_time)] を反映する。
+        full なら該当年度の写しを置き換える。同じ人の重複ページは先に見つかった方を使う。
+        """
+        with self.lock, self.conn:
+            if full:
+                self.conn.execute("DELETE FROM mirror_pages WHERE db_id = ? AND year = ?", (db_id, year))
+                self.conn.execute("DELETE FROM mirror_containers WHERE page_id NOT IN (SELECT page_id FROM mirror_pages)")
+                self.conn.execute("DELETE FROM mirror_toggles WHERE page_id NOT IN (SELECT page_id FROM mirror_pages)"
+                                  " AND page_id NOT IN (SELECT toggle_id FROM mirror_containers)")
+            for person, page_id, last_edited_time in pages:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO mirror_pages (db_id, person, year, page_id) VALUES (?, ?, ?, ?)",
+                    (db_id, person, year, page_id),
+                )
+                self.conn.execute(
+                    "UPDATE mirror_pages SET last_edited_time = ? WHERE db_id = ? AND person = ? AND year = ? AND page_id = ?",
+                    (last_edited_time, db_id, person, year, page_id),
+                )
+            row = self.conn.execute(
+                "SELECT full_at FROM mirror_queries WHERE db_id = ? AND year = ?", (db_id, year)
+            ).fetchone()
+            full_at = queried_at if full or row is None else row[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO mirror_queries (db_id, year, queried_at, full_at) VALUES (?, ?, ?, ?)",
+                (db_id, year, queried_at, full_at),
+            )
+
+    def pages(self, db_id: str, years) -> dict[tuple[str, int], str]:
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT person, year, page_id FROM mirror_pages WHERE db_id = ?"
+                f" AND year IN ({','.join('?' * len(years))})",
+                (db_id, *years),
+            ).fetchall()
+        return {(person, year): page_id for person, year, page_id in rows}
+
+    def put_page(self, db_id: str, person: str, year: int, page_id: str, last_edited_time: str | None):
+        """この実行で作成したページ（子ブロックは空）"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO mirror_pages (db_id, person, year, page_id, last_edited_time, children_synced_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (db_id, person, year, page_id, last_edited_time, utc_now_iso()),
+            )
+
+    def is_trusted(self, block_id: str) -> bool:
+        """写しのトグル一覧がページ（または月のトグル）の現状と一致しているとみなせるか"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT last_edited_time, children_synced_at FROM mirror_pages WHERE page_id = ?", (block_id,)
+            ).fetchone() or self.conn.execute(
+                "SELECT p.last_edited_time, c.children_synced_at FROM mirror_containers c"
+                " JOIN mirror_pages p ON p.page_id = c.page_id WHERE c.toggle_id = ?", (block_id,)
+            ).fetchone()
+        if row is None or not row[0] or not row[1]:
+            return False
+        # last_edited_time は分単位に丸められるので、確認時刻以下なら確認後の編集なし（台帳と同じ判定）
+        return _parse_iso(row[0]) <= _parse_iso(row[1])
+
+    def toggles(self, page_id: str) -> dict[str, tuple[str, str | None]]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT title, toggle_id, last_edited_time FROM mirror_toggles WHERE page_id = ?", (page_id,)
+            ).fetchall()
+        return {title: (toggle_id, last_edited_time) for title, toggle_id, last_edited_time in rows}
+
+    def replace_toggles(self, block_id: str, toggles: dict[str, tuple[str, str | None]], synced_at: str,
+                        page_id: str | None = None):
+        """
+        子ブロック一覧を取り直した結果で置き換える（synced_at は一覧を取り始めた時刻）。
+        月のトグルの一覧なら page_id にそのページを渡す
+        """
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM mirror_toggles WHERE page_id = ?", (block_id,))
+            self.conn.executemany(
+                "INSERT INTO mirror_toggles (page_id, title, toggle_id, last_edited_time) VALUES (?, ?, ?, ?)",
+                [(block_id, title, toggle_id, let) for title, (toggle_id, let) in toggles.items()],
+            )
+            if page_id is None:
+                self.conn.execute("UPDATE mirror_pages SET children_synced_at = ? WHERE page_id = ?",
+                                  (synced_at, block_id))
+            else:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO mirror_containers (toggle_id, page_id, children_synced_at) VALUES (?, ?, ?)",
+                    (block_id, page_id, synced_at),
+                )
+
+    def put_toggle(self, page_id: str, title: str, toggle_id: str, last_edited_time: str | None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO mirror_toggles (page_id, title, toggle_id, last_edited_time) VALUES (?, ?, ?, ?)",
+                (page_id, title, toggle_id, last_edited_time),
+            )
+
+    def remove_toggle(self, toggle_id: str):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM mirror_toggles WHERE toggle_id = ?", (toggle_id,))
+
+    def mark_synced(self, page_id: str, containers=()):
+        """
+        自分で書き込んだ直後に呼ぶ（書き込みで進んだ last_edited_time を手動編集とみなさない）。
+        containers にはこの実行で一覧を確認した月のトグルを渡す
+        """
+        now = utc_now_iso()
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE mirror_pages SET children_synced_at = ? WHERE page_id = ?", (now, page_id))
+            self.conn.executemany("UPDATE mirror_containers SET children_synced_at = ? WHERE toggle_id = ?",
+                                  [(now, toggle_id) for toggle_id in containers])
+
+    def begin_write(self, block_id: str):
+        """
+        ページ（または月のトグル）にトグルを作る直前に呼ぶ。mark_synced までに止まったら、次回は子ブロック一覧を取り直させる
+        （作成のリクエストが反映されたのに記録できていない場合に、同じトグルを二重に作らないため）
+        """
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE mirror_pages SET children_synced_at = NULL WHERE page_id = ?", (block_id,))
+            self.conn.execute("UPDATE mirror_containers SET children_synced_at = ? WHERE toggle_id = ?",
+                              (datetime.fromtimestamp(0, timezone.utc).isoformat(), block_id))
+
+    def forget_children(self, page_id: str):
+        """ページのトグルを自分で作り直すときに呼ぶ（次回は子ブロック一覧を取り直させる）"""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE mirror_pages SET children_synced_at = NULL WHERE page_id = ?", (page_id,))
+            self.conn.execute("DELETE FROM mirror_containers WHERE page_id = ?", (page_id,))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+import requests
+
+from doctor import CheckResult, Doctor
+
+def _response(status: int, body: dict, headers: dict | None = None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = json.dumps(body).encode("utf-8")
+    resp.headers.update(headers or {})
+    return resp
+
+class StubSession:
+    """(メソッド, URL の末尾) ごとに決めた応答を返し、送ったリクエストを記録する"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.sent = []
+
+    def request(self, method, url, **kwargs):
+        self.sent.append((method, url))
+        for (route_method, suffix), resp in self.routes.items():
+            if method == route_method and url.split("?")[0].endswith(suffix):
+                return resp()
+        raise AssertionError(f"unexpected request: {method} {url}")
+
+    def close(self):
+        pass
+
+def _doctor(routes) -> Doctor:
+    doctor = Doctor("xoxb-test", "secret-test", "https://slack.test/api/", "https://notion.test")
+    doctor.http._pause = lambda service, seconds: None
+    doctor.http.session = StubSession(routes)
+    return doctor
+
+def test_write_probe_is_not_resent_on_5xx():
+    doctor = _doctor({("POST", "/v1/pages"): lambda: _response(502, {"code": "bad_gateway", "message": "Bad gateway."})})
+    result = doctor.check_notion_write(CheckResult("notion.write"), "db-test")
+    assert result.status == "fail"
+    assert doctor.http.session.sent == [("POST", "https://notion.test/v1/pages")]   # 確認用ページを二重に作らない
+
+@pytest.mark.parametrize("is_private, scopes, status", [
+    (False, "channels:history,users:read", "ok"),
+    (True, "channels:history,users:read", "fail"),    # プライベートチャンネルには groups:history が要る
+    (True, "groups:history,groups:read,users:read", "ok"),
+])
+def test_channel_history_scope(is_private, scopes, status):
+    channel = {"id": "C1", "name": "daily", "is_private": is_private, "is_member": True}
+    doctor = _doctor({("GET", "/conversations.info"):
+                      lambda: _response(200, {"ok": True, "channel": channel}, {"X-OAuth-Scopes": scopes})})
+    assert doctor.check_slack_channel(CheckResult("slack.channel"), "C1").status == status
@@ -0,0 +1,17 @@
+import pytest
+
+from event_receiver import event_message
+
+@pytest.mark.parametrize("event, expected_ts", [
+    ({"type": "message", "channel": "CTEST", "ts": "1.0", "text": "やったこと"}, "1.0"),
+    ({"type": "message", "subtype": "file_share", "channel": "CTEST", "ts": "2.0", "text": "やったこと"}, "2.0"),
+    ({"type": "message", "subtype": "bot_message", "channel": "CTEST", "ts": "3.0", "bot_id": "B1"}, "3.0"),
+    ({"type": "message", "subtype": "thread_broadcast", "channel": "CTEST", "ts": "5.0", "thread_ts": "4.0"}, "5.0"),
+    ({"type": "message", "subtype": "message_changed", "channel": "CTEST", "message": {"ts": "6.0"}}, "6.0"),
+    ({"type": "message", "subtype": "message_deleted", "channel": "CTEST", "deleted_ts": "7.0"}, "7.0"),
+    ({"type": "message", "subtype": "message_replied", "channel": "CTEST", "message": {"ts": "8.0"}}, None),
+    ({"type": "message", "channel": "COTHER", "ts": "9.0"}, None),
+])
+def test_event_message(event, expected_ts):
+    picked = event_message(event)
+    assert (picked[1]["ts"] if picked else None) == expected_ts
@@ -0,0 +1,68 @@
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from http_client import HttpClient, RetryPolicy, notion_idempotent
+
+@pytest.mark.parametrize("method, path, expected", [
+    ("GET", "blocks/b1/children", True),
+    ("DELETE", "blocks/b1", True),
+    ("POST", "databases/db1/query", True),
+    ("POST", "search", True),
+    ("PATCH", "blocks/b1", True),
+    ("PATCH", "pages/p1", True),
+    ("POST", "pages", False),                 # ページの作成
+    ("PATCH", "blocks/b1/children", False),   # 子ブロックの追記
+])
+def test_notion_idempotent(method, path, expected):
+    assert notion_idempotent(method, path) is expected
+
+def _response(status: int) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    return resp
+
+def _refused() -> requests.ConnectionError:
+    return requests.ConnectionError(MaxRetryError(None, "/", NewConnectionError(None, "refused")))
+
+class StubSession:
+    """outcomes（例外かステータス）を順に返し、送った回数を数える"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _response(outcome)
+
+    def close(self):
+        pass
+
+@pytest.mark.parametrize("idempotent, outcomes, calls, status", [
+    # 冪等なリクエストは 5xx もタイムアウトも再試行する
+    (True, [503, 200], 2, 200),
+    (True, [requests.ReadTimeout(), 200], 2, 200),
+    # 冪等でないリクエストは 429 と接続の確立前のエラーだけ再試行する
+    (False, [429, 200], 2, 200),
+    (False, [_refused(), 200], 2, 200),
+    (False, [requests.ConnectTimeout(), 200], 2, 200),
+    (False, [502, 200], 1, 502),
+    (False, [requests.ReadTimeout(), 200], 1, requests.ReadTimeout),
+])
+def test_retry(idempotent, outcomes, calls, status):
+    http = HttpClient(retry=RetryPolicy(max_retries=3, base_delay=0))
+    http._pause = lambda service, seconds: None
+    http.session = StubSession(outcomes)
+    if isinstance(status, int):
+        resp = http.request("PATCH", "https://api.notion.com/v1/blocks/b1/children", service="notion",
+                            idempotent=idempotent)
+        assert resp.status_code == status
+    else:
+        with pytest.raises(status):
+            http.request("PATCH", "https://api.notion.com/v1/blocks/b1/children", service="notion",
+                         idempotent=idempotent)
+    assert http.session.calls == calls
@@ -0,0 +1,16 @@
+import pytest
+
+from migrate_layout import month_anchors
+
+@pytest.mark.parametrize("titles, missing, expected", [
+    # 先頭の月は（先頭には挿入できないので）最初の日付トグルの直後、次の月は前の月の最後の日付トグルの直後
+    ([("2025-04-01", "a"), ("2025-04-02", "b"), ("2025-05-01", "c")], ["2025-04", "2025-05"],
+     [("a", ["2025-04"]), ("b", ["2025-05"])]),
+    # 既存の月のトグルの後ろ
+    ([("2025-04", "m4"), ("2025-06-01", "c")], ["2025-06"], [("m4", ["2025-06"])]),
+    # 同じ位置に入る月は1回の追加リクエストにまとめる（既存の月のトグルより前に入る）
+    ([("2025-04-01", "a"), ("2025-05-02", "b"), ("2025-06", "m6")], ["2025-04", "2025-05"],
+     [("a", ["2025-04", "2025-05"])]),
+])
+def test_month_anchors(titles, missing, expected):
+    assert month_anchors(titles, missing) == expected
@@ -0,0 +1,73 @@
+import re
+
+import pytest
+
+from report_parser import DEFAULT_TEMPLATES, ReportParser, message_text
+
+PARSER = ReportParser(DEFAULT_TEMPLATES)
+
+def legacy_items(text: str) -> list[str]:
+    """変更前の実装（sync_daily_reports.extract_done_section と行の分割）"""
+    m = re.search(r"やったこと[\t 　]*\n([\s\S]*?)(?:\n(?:次にやること|ひとこと)\b|$)", text, re.IGNORECASE)
+    if not m:
+        return []
+    done = re.sub(r"\n{3,}", "\n\n", m.group(1).strip())
+    return [s.strip(" ・-　") for s in re.split(r"\n+", done) if s.strip()]
+
+@pytest.mark.parametrize("text, expected", [
+    ("やったこと\n・設計\n・実装\n次にやること\n・テスト", ["設計", "実装"]),
+    ("*やったこと*\n・設計", ["設計"]),
+    ("【やったこと】\n・設計\nひとこと\n眠い", ["設計"]),
+    ("本日やったこと：\n・設計", ["設計"]),
+    # 変更前の実装が拾っていた、行頭に装飾以外の文字がある見出し
+    (":white_check_mark: やったこと\n・設計\n・実装", ["設計", "実装"]),
+    ("✅やったこと\n・設計", ["設計"]),
+    ("✅ *やったこと*\n・設計", ["設計"]),
+    ("今日のやったこと\n・設計\n次にやること\n・テスト", ["設計"]),
+    ("おはようございます。今日のやったこと\n・設計", ["設計"]),
+])
+def test_done_items(text, expected):
+    assert PARSER.parse(text).items() == expected
+
+@pytest.mark.parametrize("text", [
+    "やったこと\n・設計\n・実装\n次にやること\n・テスト",
+    ":white_check_mark: やったこと\n・設計\n・実装",
+    "✅やったこと\n・設計",
+    "今日のやったこと\n・設計\n次にやること\n・テスト",
+    "朝会\n今日のやったこと\n・A &amp; B\n・<https://example.com|PR>",
+])
+def test_matches_legacy(text):
+    assert PARSER.parse(text).items() == legacy_items(text)
+
+@pytest.mark.parametrize("text", [
+    "",
+    "今日は休みです",
+    "やったことはまだない",          # 見出しの直後に語が続く
+    "ひとことメモ\n・眠い",
+])
+def test_not_a_report(text):
+    assert PARSER.parse(text).template is None
+
+def test_inline_section_text():
+    report = PARSER.parse("やったこと\n・設計\nひとこと：眠い")
+    assert report.items("comment") == ["眠い"]
+
+def _section(*elements):
+    return {"type": "rich_text", "elements": [{"type": "rich_text_section", "elements": list(elements)}]}
+
+@pytest.mark.parametrize("blocks, text", [
+    # blocks から作る本文は text（Slack のフォールバック）と同じ表記にする（書き込み済みの行とハッシュがそろう）
+    ([_section({"type": "text", "text": "やったこと\n・A & B <x>"})], "やったこと\n・A &amp; B &lt;x&gt;"),
+    ([_section({"type": "text", "text": "やったこと\n・"}, {"type": "text", "text": "太字", "style": {"bold": True}})],
+     "やったこと\n・*太字*"),
+    ([_section({"type": "text", "text": "やったこと\n・"}, {"type": "link", "url": "https://example.com", "text": "PR"})],
+     "やったこと\n・<https://example.com|PR>"),
+    ([_section({"type": "emoji", "name": "white_check_mark"}, {"type": "text", "text": " やったこと\n・"},
+               {"type": "user", "user_id": "U1"})],
+     ":white_check_mark: やったこと\n・<@U1>"),
+])
+def test_message_text_matches_text_fallback(blocks, text):
+    assert message_text({"text": text, "blocks": blocks}) == text
+
+def test_message_text_without_blocks():
+    assert message_text({"text": "やったこと\n・設計"}) == "やったこと\n・設計"
@@ -0,0 +1,138 @@
+from datetime import datetime
+
+import pytest
+
+import sync_daily_reports as sync
+from sync_state import line_hash
+
+def _old(*lines):
+    return [(f"b{i}", line_hash(line)) for i, line in enumerate(lines)]
+
+@pytest.mark.parametrize("old, new_lines, steps, archives", [
+    # 変更なし
+    (_old("A", "B"), ["A", "B"], [("keep", "b0", "A"), ("keep", "b1", "B")], []),
+    # 途中の行の書き換えは、その段落だけ更新
+    (_old("A", "B", "C"), ["A", "X", "C"], [("keep", "b0", "A"), ("update", "b1", "X"), ("keep", "b2", "C")], []),
+    # 末尾・途中への追加は直前の段落の後ろに挿入
+    (_old("A", "B"), ["A", "B", "C"], [("keep", "b0", "A"), ("keep", "b1", "B"), ("insert", None, "C")], []),
+    (_old("A", "C"), ["A", "B", "C"], [("keep", "b0", "A"), ("insert", None, "B"), ("keep", "b1", "C")], []),
+    # 先頭への追加は「直後に追加」ではできないので、位置ごとの更新と末尾への追加にする
+    (_old("B", "C"), ["A", "B", "C"], [("update", "b0", "A"), ("update", "b1", "B"), ("insert", None, "C")], []),
+    # 行が減ったら余った段落をアーカイブ
+    (_old("A", "B", "C"), ["A", "C"], [("keep", "b0", "A"), ("keep", "b2", "C")], ["b1"]),
+    (_old("A", "B"), [], [], ["b0", "b1"]),
+    # まだ段落がなければすべて追加
+    ([], ["A", "B"], [("insert", None, "A"), ("insert", None, "B")], []),
+])
+def test_diff_message_blocks(old, new_lines, steps, archives):
+    assert sync.diff_message_blocks(old, new_lines) == (steps, archives)
+
+def _utf16_units(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+@pytest.mark.parametrize("text, sizes", [
+    ("", [0]),
+    ("a" * 2000, [2000]),
+    ("a" * 2001, [2000, 1]),
+    ("a" * 4001, [2000, 2000, 1]),
+    # 絵文字（サロゲートペア）は2単位で数え、途中で分けない
+    ("😀" * 1000, [2000]),
+    ("😀" * 1001, [2000, 2]),
+    ("a" + "😀" * 1000, [1999, 2]),
+    ("あ" * 2000 + "😀", [2000, 2]),
+])
+def test_rich_text_splits_at_utf16_limit(text, sizes):
+    chunks = [t["text"]["content"] for t in sync.rich_text(text)]
+    assert "".join(chunks) == text
+    assert [_utf16_units(chunk) for chunk in chunks] == sizes
+
+def _toggles(count: int, lines: int, line: str = "作業") -> list[tuple[str, list[str]]]:
+    return [(f"2025-04-{i + 1:02d}", [f"{line}{j}" for j in range(lines)]) for i in range(count)]
+
+@pytest.mark.parametrize("toggles, shape", [
+    # (トグル数, 段落数) → [[(作成時に入れる段落数, 追記する段落数), ...], ...]（リクエストごと）
+    (_toggles(3, 2), [[(2, 0)] * 3]),
+    # 1リクエストのトグルは 100 個まで
+    (_toggles(101, 1), [[(1, 0)] * 100, [(1, 0)]]),
+    # トグル内の段落は 100 個まで、残りは作成後に追記
+    (_toggles(1, 150), [[(100, 50)]]),
+    # ネストを含めて 1000 ブロックまで（101 ブロックのトグルは 9 個で 909）
+    (_toggles(10, 100), [[(100, 0)] * 9, [(100, 0)]]),
+    # 空行は書かない
+    ([("2025-04-01", ["A", " ", "", "B"])], [[(2, 0)]]),
+])
+def test_plan_toggle_batches_caps(toggles, shape):
+    batches = sync.plan_toggle_batches(toggles)
+    assert [[(len(inline), len(overflow)) for _, inline, overflow in batch] for batch in batches] == shape
+    assert [title for batch in batches for title, _, _ in batch] == [title for title, _ in toggles]
+
+def test_plan_toggle_batches_payload_budget():
+    # 1行 約6KB（UTF-8 で3バイトの文字 2000 個）× 100 行のトグルは、本文の上限を超える分を作成後に追記する
+    toggles = _toggles(3, 100, line="あ" * 1990)
+    batches = sync.plan_toggle_batches(toggles)
+    for batch in batches:
+        size = sum(sync.block_bytes(sync.toggle_block(title, inline)) for title, inline, _ in batch)
+        assert size <= sync.NOTION_PAYLOAD_BUDGET
+        assert sum(1 + len(inline) for _, inline, _ in batch) <= sync.NOTION_MAX_BLOCKS_PER_REQUEST
+    planned = {title: inline + overflow for batch in batches for title, inline, overflow in batch}
+    assert planned == dict(toggles)
+    assert all(overflow for batch in batches for _, _, overflow in batch)
+
+# 2025-03-30 12:00 JST 〜 2025-04-02 06:00 JST（評価年度の境目をまたぐ）
+TABLE_OLDEST = sync.jst_day_start("2025-03-30") + 12 * 3600
+TABLE_LATEST = sync.jst_day_start("2025-04-02") + 6 * 3600
+
+@pytest.mark.parametrize("ts_sec", [
+    TABLE_OLDEST,
+    TABLE_OLDEST - 1,                               # 表の範囲外（前）
+    sync.jst_day_start("2025-03-31") - 0.000001,    # 日付の境目の直前・直後
+    sync.jst_day_start("2025-03-31"),
+    sync.jst_day_start("2025-04-01") - 1,
+    sync.jst_day_start("2025-04-01"),
+    sync.jst_day_start("2025-04-01") + 0.5,
+    TABLE_LATEST - 0.000001,
+    TABLE_LATEST,                                   # 表の範囲外（後ろ）
+    sync.jst_day_start("2026-01-01"),
+])
+def test_jst_day_table_matches_conversion(ts_sec):
+    table = sync.JstDayTable(TABLE_OLDEST, TABLE_LATEST)
+    assert table.date_of(ts_sec) == sync.jst_date_str_from_ts(f"{ts_sec:.6f}")
+
+@pytest.mark.parametrize("date_str", ["2025-03-31", "2025-04-01", "2025-12-31", "2026-01-01", "2026-03-31"])
+def test_evaluation_year_of(date_str):
+    expected = sync.get_evaluation_year(datetime.strptime(date_str, "%Y-%m-%d"))
+    assert sync.evaluation_year_of(date_str) == expected
+
+class StubDatabases:
+    """databases.query の結果を返し、問い合わせた回数を数える"""
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = 0
+
+    def query(self, **kwargs):
+        self.calls += 1
+        return {"results": self.results, "has_more": False}
+
+def test_person_page_requeried_after_failed_create(tmp_path, monkeypatch):
+    mirror = sync.NotionMirror(str(tmp_path / "state.sqlite"))
+    index = sync.PersonPageIndex("db-test", mirror)
+    index.years.add(2026)
+    databases = StubDatabases([{"id": "p1"}])
+    monkeypatch.setattr(sync.notion, "databases", databases)
+    assert sync.find_person_page("db-test", "山田", 2026, index) is None   # 索引を引くだけ
+    # 作成の応答が失われたら、次は DB に問い合わせ直して作られていたページを使う
+    index.forget("山田", 2026)
+    assert sync.find_person_page("db-test", "山田", 2026, index) == "p1"
+    assert sync.find_person_page("db-test", "山田", 2026, index) == "p1"
+    assert databases.calls == 1
+    mirror.close()
+
+@pytest.mark.parametrize("channel_ids, expected", [
+    ("C1", {"C1": "db-default"}),
+    ("C1, C2:db-2", {"C1": "db-default", "C2": "db-2"}),
+    ("C1:db-1,,", {"C1": "db-1"}),
+    (None, {}),
+])
+def test_parse_channel_db_map(channel_ids, expected):
+    assert sync.parse_channel_db_map(channel_ids, "db-default") == expected
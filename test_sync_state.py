@@ -0,0 +1,29 @@
+import json
+
+from sync_state import CheckpointStore
+
+def test_checkpoint_save_merges_other_writers(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    cron, receiver = CheckpointStore(path), CheckpointStore(path)
+    cron.record("C1", "100.0", "")
+    cron.advance("C1", "100.0", keep_since=0)
+    receiver.record("C1", "200.0", "")
+    receiver.record_thread("C1", "150.0", "160.0")
+    cron.save()
+    receiver.save()   # 読み込んだ後に定期同期が書いた分を上書きしない
+    channel = json.load(open(path, encoding="utf-8"))["channels"]["C1"]
+    assert channel["latest_ts"] == "100.0"
+    assert channel["seen"] == {"100.0": "", "200.0": ""}
+    assert channel["threads"] == {"150.0": "160.0"}
+    assert receiver.is_unchanged("C1", "100.0", "")   # 保存後は相手の変更も見える
+
+def test_checkpoint_advance_prunes_without_moving_latest(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoint.json"))
+    store.advance("C1", "300.0", keep_since=0)
+    for ts in ("100.0", "200.0", "300.0"):
+        store.record("C1", ts, "")
+    store.forget("C1", "300.0")
+    store.advance("C1", None, keep_since=150)
+    store.save()
+    assert store.latest_ts("C1") == "300.0"
+    assert store.data["channels"]["C1"]["seen"] == {"200.0": ""}